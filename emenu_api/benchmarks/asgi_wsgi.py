@@ -0,0 +1,134 @@
+"""
+Requests per second and latency of cached menu and dish reads with one server process: gunicorn (WSGI, gthread)
+against uvicorn (ASGI), with and without the async read views, under the same number of concurrent keep-alive
+connections. Uses the "data" cache of the settings, which should be Redis for the ASGI numbers to mean anything.
+
+Run with: python -m benchmarks.asgi_wsgi
+"""
+
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from benchmarks.utils import setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.db import connection  # noqa: E402
+from menu.models import Menu  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+DISHES = 400
+MENUS = 20
+DISHES_PER_MENU = 20
+CONCURRENCY = 64
+DURATION = 10
+THREADS = 8
+PORT = 8765
+SERVERS = {
+    "gunicorn (WSGI)": ["gunicorn", "emenu_api.wsgi:application", "--workers", "1", "--worker-class", "gthread", "--threads", str(THREADS)],
+    "uvicorn (ASGI)": ["uvicorn", "emenu_api.asgi:application", "--workers", "1", "--no-access-log", "--log-level", "warning"],
+    "uvicorn (ASGI, async reads)": ["uvicorn", "emenu_api.asgi:async_read_application", "--workers", "1", "--no-access-log", "--log-level", "warning"],
+}
+
+
+@contextmanager
+def server(command, port):
+    env = {**os.environ, "POSTGRES_DB": connection.settings_dict["NAME"]}
+    bind = ["--bind", f"127.0.0.1:{port}"] if command[0] == "gunicorn" else ["--host", "127.0.0.1", "--port", str(port)]
+    process = subprocess.Popen([sys.executable, "-m", *command, *bind], env=env, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"{command[0]} did not start")
+                time.sleep(0.1)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def fetch(reader, writer, request):
+    writer.write(request)
+    headers = await reader.readuntil(b"\r\n\r\n")
+    status = int(headers.split(b" ", 2)[1])
+    length = next((int(line.split(b":", 1)[1]) for line in headers.split(b"\r\n") if line.lower().startswith(b"content-length:")), 0)
+    await reader.readexactly(length)
+    return status
+
+
+async def load(port, path, headers, concurrency, duration):
+    lines = [f"GET {path} HTTP/1.1", "Host: 127.0.0.1", *[f"{name}: {value}" for name, value in headers.items()]]
+    request = ("\r\n".join(lines) + "\r\n\r\n").encode()
+    timings = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                if await fetch(reader, writer, request) != 200:
+                    errors += 1
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            writer.close()
+
+    start = time.monotonic()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return timings, errors, time.monotonic() - start
+
+
+def report(label, timings, errors, elapsed):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<40} {len(timings) / elapsed:8.0f} req/s   p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   ({errors} errors)")
+
+
+def main():
+    with test_database():
+        dishes = Dish.objects.bulk_create(
+            Dish(name=f"Dish {i}", description="Opis dania " * 20, price=f"{10 + i % 50}.99", preparation_time=15 + i % 30, is_vegetarian=i % 2 == 0)
+            for i in range(DISHES)
+        )
+        for i in range(MENUS):
+            menu = Menu.objects.create(name=f"Menu {i}", description="Benchmark Menu")
+            menu.dishes.set(dishes[i * DISHES_PER_MENU : (i + 1) * DISHES_PER_MENU])
+        user = User.objects.create_user(username="benchmark", password="password123")
+        auth = {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+        endpoints = {
+            "menu list, anonymous": ("/api/menu/", {}),
+            "menu detail, anonymous": (f"/api/menu/{menu.id}/", {}),
+            "dish list, authenticated": ("/api/dish/?ordering=name", auth),
+            "dish detail, authenticated": (f"/api/dish/{dishes[0].id}/", auth),
+        }
+
+        print(f"{CONCURRENCY} connections, {DURATION} s per endpoint")
+        for label, command in SERVERS.items():
+            caches["data"].clear()
+            with server(command, PORT):
+                print(label)
+                for endpoint, (path, headers) in endpoints.items():
+                    # the first request builds the entry, the load is served from the cache
+                    asyncio.run(load(PORT, path, headers, 1, 0.5))
+                    report(f"  {endpoint}", *asyncio.run(load(PORT, path, headers, CONCURRENCY, DURATION)))
+
+
+if __name__ == "__main__":
+    main()
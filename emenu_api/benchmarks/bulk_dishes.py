@@ -0,0 +1,59 @@
+"""
+Onboarding 300 dishes: one request per dish vs the /api/dish/bulk/ endpoints, for creates and updates.
+
+Run with: python -m benchmarks.bulk_dishes
+"""
+
+import statistics
+
+from benchmarks.utils import measure, report, setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+DISHES = 300
+ITERATIONS = 10
+
+
+def dish_data(i):
+    return {"name": f"Dish {i}", "description": "Opis dania " * 20, "price": f"{10 + i % 50}.99", "preparation_time": 15 + i % 30, "is_vegetarian": i % 2 == 0}
+
+
+def main():
+    with test_database():
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="benchmark", password="benchmark"))
+        data = [dish_data(i) for i in range(DISHES)]
+
+        def create_per_item():
+            for item in data:
+                client.post(reverse("dish-list"), item, format="json")
+
+        def create_bulk():
+            client.post(reverse("dish-bulk"), data, format="json")
+
+        def update_per_item():
+            for dish_id in Dish.objects.values_list("id", flat=True)[:DISHES]:
+                client.patch(reverse("dish-detail", kwargs={"pk": dish_id}), {"price": "19.99"}, format="json")
+
+        def update_bulk():
+            items = [{"id": dish_id, "price": "19.99"} for dish_id in Dish.objects.values_list("id", flat=True)[:DISHES]]
+            client.patch(reverse("dish-bulk"), items, format="json")
+
+        for label, func in [
+            ("create, per item", create_per_item),
+            ("create, bulk", create_bulk),
+            ("update, per item", update_per_item),
+            ("update, bulk", update_bulk),
+        ]:
+            timings = measure(func, ITERATIONS, warmup=1)
+            report(f"{label} ({DISHES} dishes)", timings)
+            print(f"{'':<40} {DISHES / statistics.median(timings) * 1000:8.0f} dishes/s")
+
+
+if __name__ == "__main__":
+    main()
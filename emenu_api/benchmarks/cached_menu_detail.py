@@ -0,0 +1,47 @@
+"""
+Cached menu detail latency with a 100-dish menu: pickled response.data vs rendered JSON bytes.
+
+Run with: python -m benchmarks.cached_menu_detail
+"""
+
+from benchmarks.utils import measure, report, setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from menu.models import Menu  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+DISHES = 100
+ITERATIONS = 1000
+MODES = {
+    "response.data (pickled)": {**settings.DATA_CACHE, "RENDERED_RESPONSES": False, "COMPRESS_MIN_SIZE": None},
+    "rendered bytes": {**settings.DATA_CACHE, "RENDERED_RESPONSES": True, "COMPRESS_MIN_SIZE": None},
+    "rendered bytes, compressed": {**settings.DATA_CACHE, "RENDERED_RESPONSES": True, "COMPRESS_MIN_SIZE": 0},
+}
+
+
+def main():
+    with test_database():
+        dishes = Dish.objects.bulk_create(
+            Dish(name=f"Dish {i}", description="Opis dania " * 20, price=f"{10 + i}.99", preparation_time=15 + i % 30, is_vegetarian=i % 2 == 0)
+            for i in range(DISHES)
+        )
+        menu = Menu.objects.create(name="Benchmark Menu", description="Menu with many dishes")
+        menu.dishes.set(dishes)
+
+        client = APIClient()
+        url = reverse("menu-detail", kwargs={"pk": menu.id})
+        for label, data_cache in MODES.items():
+            with override_settings(DATA_CACHE=data_cache):
+                caches["data"].clear()
+                client.get(url)
+                report(label, measure(lambda: client.get(url), ITERATIONS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Catalog import and export time at two catalog sizes, with the peak resident memory of the process after each
+step. The peak should stay flat as the catalog grows.
+
+Run with: python -m benchmarks.catalog
+"""
+
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.utils import setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from emenu_api.catalog import CATALOG_WRITERS  # noqa: E402
+from menu.models import Menu  # noqa: E402
+
+SIZES = [10000, 50000]
+DISHES_PER_MENU = 50
+
+
+def records(dishes, description):
+    for i in range(dishes):
+        yield {"type": "dish", "name": f"Dish {i}", "description": description * 20, "price": f"{10 + i % 50}.99", "preparation_time": 15, "is_vegetarian": i % 2 == 0, "image": ""}
+    for i in range(dishes // DISHES_PER_MENU):
+        yield {"type": "menu", "name": f"Menu {i}", "description": "Menu", "dishes": [f"Dish {i * DISHES_PER_MENU + j}" for j in range(DISHES_PER_MENU)]}
+
+
+def run(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{label:<40} {elapsed:8.2f} s   peak RSS {peak / 1024:8.1f} MiB")
+
+
+def main():
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            Menu.objects.all().delete()
+            Dish.objects.all().delete()
+            for catalog_format in CATALOG_WRITERS:
+                path = os.path.join(directory, f"catalog.{catalog_format}")
+                with open(path, "w", encoding="utf-8", newline="") as catalog:
+                    # the second import updates every dish
+                    catalog.writelines(CATALOG_WRITERS[catalog_format](records(size, "Opis dania " if catalog_format == "ndjson" else "Nowy opis dania ")))
+
+                run(f"import {catalog_format}, {size} dishes", lambda: call_command("import_catalog", path, stdout=open(os.devnull, "w")))
+                run(f"export {catalog_format}, {size} dishes", lambda: call_command("export_catalog", path))
+
+
+if __name__ == "__main__":
+    main()
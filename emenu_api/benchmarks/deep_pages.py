@@ -0,0 +1,54 @@
+"""
+Dish list page latency by depth: page number (COUNT(*) plus OFFSET) vs keyset cursor on -updated_at.
+
+Run with: python -m benchmarks.deep_pages
+"""
+
+from benchmarks.utils import measure, report, setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from dish.views import DishViewSet  # noqa: E402
+from emenu_api.pagination import KeysetPagination, OptionalKeysetPagination  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+DISHES = 100000
+PAGES = [1, 100, 1000, 5000, 9000]
+ITERATIONS = 50
+
+
+def fetch(params):
+    request = Request(APIRequestFactory().get("/api/dish/", params))
+    paginator = OptionalKeysetPagination()
+    queryset = DishViewSet.queryset.all()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response([dish.id for dish in page])
+
+
+def cursor_before(page):
+    if page == 1:
+        return {"pagination": "cursor"}
+    keyset = KeysetPagination()
+    keyset.request = Request(APIRequestFactory().get("/api/dish/"))
+    keyset.field, keyset.descending = "updated_at", True
+    offset = (page - 1) * keyset.page_size - 1
+    link = keyset.encode_cursor(Dish.objects.order_by("-updated_at", "-id")[offset], reverse=False)
+    return {"pagination": "cursor", "cursor": link.split("cursor=")[1]}
+
+
+def main():
+    with test_database():
+        Dish.objects.bulk_create(
+            (Dish(name=f"Dish {i}", description="Opis dania", price=f"{10 + i % 90}.99", preparation_time=15 + i % 30) for i in range(DISHES)), batch_size=5000
+        )
+
+        for page in PAGES:
+            report(f"page={page}", measure(lambda: fetch({"page": page}), ITERATIONS, warmup=2))
+            params = cursor_before(page)
+            report(f"cursor at page {page}", measure(lambda: fetch(params), ITERATIONS, warmup=2))
+
+
+if __name__ == "__main__":
+    main()
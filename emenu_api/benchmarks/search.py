@@ -0,0 +1,50 @@
+"""
+Ranked dish search latency on a million-dish catalog, for rare and very common words.
+
+Run with: python -m benchmarks.search
+"""
+
+import random
+
+from benchmarks.utils import measure, report, setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.db import connection  # noqa: E402
+from emenu_api.search import ranked_search  # noqa: E402
+
+DISHES = 1000000
+RARE_WORDS = 20000
+ITERATIONS = 100
+COMMON_WORDS = (
+    "zupa pierogi kotlet schabowy bigos żurek barszcz gulasz placki ziemniaczane kopytka gołąbki rosół kaszanka kiełbasa "
+    "pstrąg dorsz łosoś sałatka surówka buraczki ogórki kapusta grzyby pieczarki cebula czosnek pomidory bazylia mozzarella "
+    "ser twaróg śmietana masło boczek kurczak wołowina wieprzowina indyk kaczka jabłka śliwki wiśnie truskawki miód z na i"
+).split()
+QUERIES = ["przyprawa123", "pierogi przyprawa123", "żurek", "zupa z grzybami", "pomid"]
+
+
+def main():
+    rng = random.Random(0)
+    with test_database():
+        for start in range(0, DISHES, 50000):
+            Dish.objects.bulk_create(
+                Dish(
+                    name=" ".join(rng.choices(COMMON_WORDS, k=2)).capitalize() + f" {i}",
+                    description=" ".join(rng.choices(COMMON_WORDS, k=10) + [f"przyprawa{rng.randrange(RARE_WORDS)}"]),
+                    price="19.99",
+                    preparation_time=30,
+                )
+                for i in range(start, min(start + 50000, DISHES))
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE dish_dish")
+
+        queryset = Dish.objects.defer("search_vector")
+        for query in QUERIES:
+            report(f"search {query!r}", measure(lambda: list(ranked_search(queryset, query)[:11]), ITERATIONS, warmup=3))
+
+
+if __name__ == "__main__":
+    main()
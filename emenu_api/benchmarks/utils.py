@@ -0,0 +1,44 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "emenu_api.settings")
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, iterations, warmup=10):
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<40} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   ({len(timings)} runs)")
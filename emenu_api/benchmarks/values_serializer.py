@@ -0,0 +1,49 @@
+"""
+Uncached menu detail latency with a 500-dish menu: MenuSerializer vs MenuValuesSerializer.
+
+Run with: python -m benchmarks.values_serializer
+"""
+
+from unittest.mock import patch
+
+from benchmarks.utils import measure, report, setup, test_database
+
+setup()
+
+from dish.models import Dish  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from menu.models import Menu  # noqa: E402
+from menu.views import MenuViewSet  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+DISHES = 500
+ITERATIONS = 200
+MODES = {"MenuSerializer": None, "MenuValuesSerializer": MenuViewSet.values_serializer_class}
+
+
+def main():
+    with test_database():
+        dishes = Dish.objects.bulk_create(
+            Dish(name=f"Dish {i}", description="Opis dania " * 20, price=f"{10 + i}.99", preparation_time=15 + i % 30, is_vegetarian=i % 2 == 0)
+            for i in range(DISHES)
+        )
+        menu = Menu.objects.create(name="Benchmark Menu", description="Menu with many dishes")
+        menu.dishes.set(dishes)
+
+        client = APIClient()
+        url = reverse("menu-detail", kwargs={"pk": menu.id})
+
+        def get():
+            MenuViewSet.cache.clear()
+            return client.get(url)
+
+        contents = set()
+        for label, values_serializer_class in MODES.items():
+            with patch.object(MenuViewSet, "values_serializer_class", values_serializer_class):
+                contents.add(get().content)
+                report(label, measure(get, ITERATIONS))
+        print(f"identical responses: {len(contents) == 1}")
+
+
+if __name__ == "__main__":
+    main()
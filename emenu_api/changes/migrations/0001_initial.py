@@ -0,0 +1,104 @@
+# Generated by Django 4.2 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+# Statement-level triggers: a bulk write records its rows with one INSERT ... SELECT from the transition table.
+# Adding or removing dishes of a menu is a change of the menu.
+TRIGGER_SQL = """
+CREATE FUNCTION changes_record() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+        SELECT txid_current(), TG_ARGV[0], id, 'delete', now() FROM old_rows ORDER BY id;
+    ELSE
+        INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+        SELECT txid_current(), TG_ARGV[0], id, 'upsert', now() FROM new_rows ORDER BY id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION changes_record_menu_dishes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+        SELECT DISTINCT txid_current(), 'menu', menu_id, 'upsert', now() FROM old_rows ORDER BY 3;
+    ELSE
+        INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+        SELECT DISTINCT txid_current(), 'menu', menu_id, 'upsert', now() FROM new_rows ORDER BY 3;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER changes_dish_insert AFTER INSERT ON dish_dish REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('dish');
+CREATE TRIGGER changes_dish_update AFTER UPDATE ON dish_dish REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('dish');
+CREATE TRIGGER changes_dish_delete AFTER DELETE ON dish_dish REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('dish');
+
+CREATE TRIGGER changes_menu_insert AFTER INSERT ON menu_menu REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('menu');
+CREATE TRIGGER changes_menu_update AFTER UPDATE ON menu_menu REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('menu');
+CREATE TRIGGER changes_menu_delete AFTER DELETE ON menu_menu REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record('menu');
+
+CREATE TRIGGER changes_menu_dishes_insert AFTER INSERT ON menu_menu_dishes REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record_menu_dishes();
+CREATE TRIGGER changes_menu_dishes_delete AFTER DELETE ON menu_menu_dishes REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION changes_record_menu_dishes();
+
+-- the catalog as it is, so that reading the feed from the start is a full sync
+INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+SELECT txid_current(), 'dish', id, 'upsert', now() FROM dish_dish ORDER BY id;
+INSERT INTO changes_change (xid, object_type, object_id, action, created_at)
+SELECT txid_current(), 'menu', id, 'upsert', now() FROM menu_menu ORDER BY id;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER changes_dish_insert ON dish_dish;
+DROP TRIGGER changes_dish_update ON dish_dish;
+DROP TRIGGER changes_dish_delete ON dish_dish;
+DROP TRIGGER changes_menu_insert ON menu_menu;
+DROP TRIGGER changes_menu_update ON menu_menu;
+DROP TRIGGER changes_menu_delete ON menu_menu;
+DROP TRIGGER changes_menu_dishes_insert ON menu_menu_dishes;
+DROP TRIGGER changes_menu_dishes_delete ON menu_menu_dishes;
+DROP FUNCTION changes_record();
+DROP FUNCTION changes_record_menu_dishes();
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('dish', '0005_search_vector'),
+        ('menu', '0005_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('xid', models.BigIntegerField()),
+                ('object_type', models.CharField(choices=[('dish', 'Dish'), ('menu', 'Menu')], max_length=4)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=6)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['xid', 'id'], name='change_xid_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['object_type', 'object_id', 'xid', 'id'], name='change_object_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class Change(models.Model):
+    """
+    One row per dish or menu written, filled by the triggers of migration 0001 for every INSERT, UPDATE and
+    DELETE, including bulk writes, cascades and the links between menus and dishes (recorded as a change of the
+    menu). Rows are only ever inserted, compact_changes() deletes the ones a later change of the same object
+    makes redundant.
+    """
+
+    DISH = "dish"
+    MENU = "menu"
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+    # the writing transaction, txid_current()
+    xid = models.BigIntegerField()
+    object_type = models.CharField(max_length=4, choices=[(DISH, "Dish"), (MENU, "Menu")])
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=[(UPSERT, "Upsert"), (DELETE, "Delete")])
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.action} {self.object_type} {self.object_id}"
+
+    class Meta:
+        indexes = [
+            # the feed reads in (xid, id) order
+            models.Index(fields=["xid", "id"], name="change_xid_id_idx"),
+            models.Index(fields=["object_type", "object_id", "xid", "id"], name="change_object_idx"),
+        ]
@@ -0,0 +1,7 @@
+from menu.serializers import MenuSerializer
+from rest_framework import serializers
+
+
+class ChangeMenuSerializer(MenuSerializer):
+    # the feed sends the dishes on their own
+    dishes = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Change
+
+CHANGES_COMPACT_AFTER = timedelta(days=1)
+# feed cursors expire after this, clients that have not synced for as long start over with a full sync
+CHANGES_RESYNC_AFTER = timedelta(days=30)
+# tombstones outlive the cursors that may still need them by a day, a change is dated when its transaction starts
+TOMBSTONES_KEPT = CHANGES_RESYNC_AFTER + timedelta(days=1)
+
+
+@shared_task
+def compact_changes():
+    """
+    Deletes the changes older than CHANGES_COMPACT_AFTER that a later change of the same object supersedes.
+    The feed returns the current state of an object whichever of its changes it reads, so a client anywhere in
+    the feed still gets every object it needs, only fewer times. The last change of every object is kept, the
+    tombstones of deleted objects until TOMBSTONES_KEPT, when no cursor that could miss them is accepted.
+    """
+    now = timezone.now()
+    later = Change.objects.filter(object_type=OuterRef("object_type"), object_id=OuterRef("object_id")).filter(
+        Q(xid__gt=OuterRef("xid")) | Q(xid=OuterRef("xid"), id__gt=OuterRef("id"))
+    )
+    deleted, _ = Change.objects.filter(created_at__lt=now - CHANGES_COMPACT_AFTER).filter(Exists(later)).delete()
+    tombstones, _ = Change.objects.filter(action=Change.DELETE, created_at__lt=now - TOMBSTONES_KEPT).delete()
+    return deleted + tombstones
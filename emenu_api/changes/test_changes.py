@@ -0,0 +1,158 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import timedelta
+
+from dish.models import Dish
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from menu.models import Menu
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Change
+from .tasks import TOMBSTONES_KEPT, compact_changes
+
+
+# the feed only returns changes of finished transactions, TestCase would hold every change back
+class ChangeFeedTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def read_feed(self, since=None):
+        results = []
+        while True:
+            response = self.client.get(reverse("changes"), {"since": since} if since else {})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results += response.data["results"]
+            since = response.data["next"]
+            if not response.data["has_more"]:
+                return results, since
+
+    def create_dish(self, name):
+        return Dish.objects.create(name=name, price=10.50, description="Test Description", preparation_time=15, is_vegetarian=True)
+
+    def test_full_sync(self):
+        dish = self.create_dish("Test Dish 1")
+        menu = Menu.objects.create(name="Test Menu 1", description="Test Description")
+        menu.dishes.add(dish)
+
+        results, since = self.read_feed()
+        synced = {(result["type"], result["id"]): result for result in results}
+        self.assertEqual(len(synced), len(results))
+        self.assertEqual({key for key in synced if key[0] == "dish"}, {("dish", pk) for pk in Dish.objects.values_list("id", flat=True)})
+        self.assertEqual({key for key in synced if key[0] == "menu"}, {("menu", pk) for pk in Menu.objects.values_list("id", flat=True)})
+        self.assertEqual(synced["dish", dish.id]["data"]["name"], "Test Dish 1")
+        self.assertEqual(synced["menu", menu.id]["data"]["dishes"], [dish.id])
+        self.assertEqual(synced["menu", menu.id]["data"]["dishes_count"], 1)
+
+        # nothing new, the same position issued again
+        results, next_since = self.read_feed(since)
+        self.assertEqual(results, [])
+        self.assertEqual([json.loads(b64decode(cursor))["id"] for cursor in (next_since, since)], [json.loads(b64decode(since))["id"]] * 2)
+
+    def test_incremental_sync_with_tombstones(self):
+        dish1, dish2 = self.create_dish("Test Dish 1"), self.create_dish("Test Dish 2")
+        menu = Menu.objects.create(name="Test Menu 1", description="Test Description")
+        results, since = self.read_feed()
+
+        menu.dishes.add(dish1, dish2)
+        Dish.objects.filter(pk=dish2.pk).update(name="Renamed Dish")
+        dish1_id = dish1.id
+        dish1.delete()
+        results, since = self.read_feed(since)
+        self.assertEqual(
+            [(result["type"], result["id"], result["action"]) for result in results], [("dish", dish2.id, "upsert"), ("menu", menu.id, "upsert"), ("dish", dish1_id, "delete")]
+        )
+        self.assertEqual(results[0]["data"]["name"], "Renamed Dish")
+        self.assertEqual(results[1]["data"]["dishes"], [dish2.id])
+        self.assertIsNone(results[2]["data"])
+
+        menu_id = menu.id
+        menu.delete()
+        results, since = self.read_feed(since)
+        self.assertEqual(results, [{"type": "menu", "id": menu_id, "action": "delete", "data": None}])
+
+    def test_bulk_writes_are_recorded(self):
+        results, since = self.read_feed()
+        data = [{"name": f"Bulk Dish {i}", "price": "10.00", "description": "Bulk", "preparation_time": 10, "is_vegetarian": False} for i in range(3)]
+        response = self.client.post(reverse("dish-bulk"), data, format="json")
+        ids = [dish["id"] for dish in response.data]
+        self.client.patch(reverse("dish-bulk"), [{"id": ids[0], "price": "12.00"}], format="json")
+        self.client.delete(reverse("dish-bulk"), {"ids": ids[1:]}, format="json")
+
+        results, since = self.read_feed(since)
+        self.assertEqual([(result["id"], result["action"]) for result in results], [(ids[0], "upsert"), (ids[1], "delete"), (ids[2], "delete")])
+        self.assertEqual(results[0]["data"]["price"], "12.00")
+
+    def test_page_query_count(self):
+        for i in range(3):
+            Menu.objects.create(name=f"Test Menu {i}", description="Test Description").dishes.add(self.create_dish(f"Test Dish {i}"))
+        # user, changes, dishes, menus, dishes of the menus
+        with self.assertNumQueries(5):
+            self.client.get(reverse("changes"))
+
+    def test_running_transactions_hold_back_later_changes(self):
+        results, since = self.read_feed()
+        dish = self.create_dish("Test Dish 1")
+        with connection.cursor() as cursor:
+            # stands in for the change of a transaction that is still running
+            cursor.execute("SELECT txid_current() + 1000")
+            xid = cursor.fetchone()[0]
+        Change.objects.create(xid=xid, object_type=Change.MENU, object_id=0, action=Change.DELETE, created_at=timezone.now())
+        other = self.create_dish("Test Dish 2")
+
+        results, since = self.read_feed(since)
+        self.assertEqual([(result["id"], result["action"]) for result in results], [(dish.id, "upsert"), (other.id, "upsert")])
+        self.assertLess(json.loads(b64decode(since))["x"], xid)
+
+    def test_compact_changes(self):
+        dish = self.create_dish("Test Dish 1")
+        for price in [11, 12, 13]:
+            Dish.objects.filter(pk=dish.pk).update(price=price)
+        other = self.create_dish("Test Dish 2")
+        Change.objects.update(created_at=timezone.now() - timedelta(days=2))
+        Dish.objects.filter(pk=other.pk).update(price=20)
+        Dish.objects.filter(pk=other.pk).update(price=21)
+
+        compact_changes()
+        self.assertEqual(Change.objects.filter(object_type=Change.DISH, object_id=dish.id).count(), 1)
+        # the change of the other dish is superseded but recent
+        self.assertEqual(Change.objects.filter(object_type=Change.DISH, object_id=other.id).count(), 2)
+        results, since = self.read_feed()
+        self.assertIn(("dish", dish.id, "upsert"), [(result["type"], result["id"], result["action"]) for result in results])
+
+    def test_old_tombstones_and_cursors_expire(self):
+        old, recent = self.create_dish("Test Dish 1"), self.create_dish("Test Dish 2")
+        results, since = self.read_feed()
+        old_id, recent_id = old.id, recent.id
+        old.delete()
+        Change.objects.filter(object_type=Change.DISH, object_id=old_id).update(created_at=timezone.now() - TOMBSTONES_KEPT - timedelta(hours=1))
+        recent.delete()
+
+        compact_changes()
+        self.assertFalse(Change.objects.filter(object_type=Change.DISH, object_id=old_id).exists())
+        self.assertTrue(Change.objects.filter(object_type=Change.DISH, object_id=recent_id, action=Change.DELETE).exists())
+
+        # a client that has not synced since the tombstone was written must start over
+        cursor = json.loads(b64decode(since))
+        cursor["t"] -= int(TOMBSTONES_KEPT.total_seconds())
+        response = self.client.get(reverse("changes"), {"since": b64encode(json.dumps(cursor).encode()).decode()})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data["detail"].code, "cursor_expired")
+        results, since = self.read_feed(since)
+        self.assertEqual([(result["id"], result["action"]) for result in results], [(recent_id, "delete")])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("changes"), {"since": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_changes_unauthorized(self):
+        self.client.credentials()
+        response = self.client.get(reverse("changes"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
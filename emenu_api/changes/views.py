@@ -0,0 +1,113 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from dish.models import Dish
+from dish.serializers import DishSerializer, DishValuesSerializer
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from menu.models import Menu
+from menu.serializers import MenuValuesSerializer
+from rest_framework import permissions, status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Change
+from .serializers import ChangeMenuSerializer
+from .tasks import CHANGES_RESYNC_AFTER
+
+# the oldest transaction still running, every change of an older one is committed or rolled back
+SNAPSHOT_XMIN = RawSQL("txid_snapshot_xmin(txid_current_snapshot())", [])
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "The cursor has expired, start over with a full sync."
+    default_code = "cursor_expired"
+
+
+class ChangeFeedView(APIView):
+    """
+    The dishes and menus written after ?since=<cursor>, oldest first: an upsert with the current data of the
+    object, or a tombstone once it is deleted. An object written several times within a page is returned once,
+    at the position of its last change. Without ?since= the feed starts from the beginning, a full sync.
+
+    Change ids are taken when rows are written, not when they commit, so a transaction may commit changes below
+    ids a client already read. The feed is ordered by (transaction id, id) instead and only returns the changes
+    of transactions older than every transaction still running, which can no longer gain changes.
+
+    Cursors carry the time they were issued and expire after CHANGES_RESYNC_AFTER, compact_changes deletes the
+    tombstones clients holding older ones could still need.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    since_query_param = "since"
+    page_size = 500
+    invalid_cursor_message = "Invalid cursor"
+    # object type: ModelSerializer, its ValuesSerializer and the queryset they read
+    object_serializers = {
+        Change.DISH: (DishSerializer, DishValuesSerializer, lambda: Dish.objects.all()),
+        Change.MENU: (ChangeMenuSerializer, MenuValuesSerializer, lambda: Menu.objects.annotate(dishes_count=Count("dishes"))),
+    }
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.since_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True))
+            position, issued_at = (int(cursor["x"]), int(cursor["id"])), int(cursor["t"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if issued_at < (timezone.now() - CHANGES_RESYNC_AFTER).timestamp():
+            raise CursorExpired()
+        return position
+
+    def encode_cursor(self, xid, change_id):
+        cursor = {"x": xid, "id": change_id, "t": int(timezone.now().timestamp())}
+        return b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode()
+
+    def get_objects(self, request, ids):
+        objects = {}
+        for object_type, (serializer_class, values_serializer_class, get_queryset) in self.object_serializers.items():
+            if not ids[object_type]:
+                continue
+            serializer = values_serializer_class(serializer_class(context={"request": request, "view": self}))
+            for data in serializer.serialize(list(serializer.get_queryset(get_queryset().filter(pk__in=ids[object_type])))):
+                objects[object_type, data["id"]] = data
+        return objects
+
+    def get(self, request):
+        cursor = self.decode_cursor(request)
+        changes = Change.objects.filter(xid__lt=SNAPSHOT_XMIN)
+        if cursor is not None:
+            xid, change_id = cursor
+            changes = changes.filter(xid__gte=xid).filter(Q(xid__gt=xid) | Q(id__gt=change_id))
+        page = list(changes.order_by("xid", "id").values_list("xid", "id", "object_type", "object_id", "action")[: self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[: self.page_size]
+
+        actions = {}
+        for xid, change_id, object_type, object_id, action in page:
+            # re-inserted so that the object keeps the position of its last change
+            actions.pop((object_type, object_id), None)
+            actions[object_type, object_id] = action
+        ids = {object_type: [] for object_type in self.object_serializers}
+        for (object_type, object_id), action in actions.items():
+            if action == Change.UPSERT:
+                ids[object_type].append(object_id)
+        objects = self.get_objects(request, ids)
+
+        results = []
+        for key, action in actions.items():
+            data = objects.get(key)
+            # deleted since, its tombstone is further down the feed
+            action = Change.UPSERT if data is not None else Change.DELETE
+            results.append(OrderedDict([("type", key[0]), ("id", key[1]), ("action", action), ("data", data)]))
+
+        # an empty page issues the cursor again, a client polling a quiet feed keeps a valid one
+        position = page[-1][:2] if page else cursor
+        next_cursor = self.encode_cursor(*position) if position is not None else None
+        return Response(OrderedDict([("next", next_cursor), ("has_more", has_more), ("results", results)]))
@@ -0,0 +1,65 @@
+import logging
+import posixpath
+
+from azure.core.exceptions import AzureError
+from storages.backends.azure_storage import AzureStorage
+
+from .models import Blob
+
+logger = logging.getLogger(__name__)
+
+
+def referenced_blobs(names=None):
+    """
+    The names among names, or all names, of the images and renditions some dish refers to.
+    """
+    blobs = Blob.objects.filter(reference_count__gt=0)
+    if names is not None:
+        blobs = blobs.filter(name__in=names)
+    return set(blobs.values_list("name", flat=True))
+
+
+def delete_stored(storage, names):
+    """
+    Deletes the files from storage and returns the names that are gone, deleted now or missing already. On Azure
+    one blob batch request deletes all of them over the storage's own client.
+    """
+    if not names:
+        return set()
+    if isinstance(storage, AzureStorage):
+        try:
+            responses = storage.client.delete_blobs(*[storage._get_valid_path(name) for name in names], raise_on_any_failure=False)
+        except AzureError:
+            logger.warning("Deleting %d blobs failed", len(names), exc_info=True)
+            return set()
+        return {name for name, response in zip(names, responses) if response.status_code in (202, 404)}
+
+    deleted = set()
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning("Deleting %s failed", name, exc_info=True)
+        else:
+            deleted.add(name)
+    return deleted
+
+
+def list_stored(storage, directory):
+    """
+    Yields the name and the last modified time of every file in directory and its subdirectories.
+    """
+    if isinstance(storage, AzureStorage):
+        location = f"{storage.location}/" if storage.location else ""
+        for blob in storage.client.list_blobs(name_starts_with=storage._get_valid_path(directory) + "/"):
+            yield blob.name[len(location) :], blob.last_modified
+        return
+
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for file in files:
+        name = posixpath.join(directory, file)
+        yield name, storage.get_modified_time(name)
+    for subdirectory in directories:
+        yield from list_stored(storage, posixpath.join(directory, subdirectory))
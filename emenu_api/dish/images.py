@@ -0,0 +1,57 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import claim_blobs, is_content_name
+
+# name: (width, height, crop to fill), without crop the image is fitted inside the box
+RENDITION_SIZES = {"thumbnail": (200, 200, True), "medium": (640, 640, False), "large": (1280, 1280, False)}
+# extension: (Pillow format, save options), formats the installed Pillow cannot write are skipped
+RENDITION_FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "avif": ("AVIF", {"quality": 60})}
+
+
+def rendition_formats():
+    Image.init()
+    return {extension: options for extension, options in RENDITION_FORMATS.items() if options[0] in Image.SAVE}
+
+
+def make_renditions(storage, name):
+    """
+    Renders the image stored under name at every RENDITION_SIZES size and stores the renditions next to it,
+    returning {size: {extension: stored name}}. EXIF and XMP metadata, the GPS position of phone photos
+    included, are left out; the orientation EXIF held is applied to the pixels and the color profile is kept.
+    Run it in the transaction that records the renditions on a dish.
+    """
+    with storage.open(name) as file:
+        image = Image.open(file)
+        # JPEGs decode straight at the smallest scale that is still larger than the largest rendition
+        image.draft("RGB", max((width, height) for width, height, crop in RENDITION_SIZES.values()))
+        image.load()
+    icc_profile = image.info.get("icc_profile")
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    formats = rendition_formats()
+    paths = {size: {extension: posixpath.join(directory, "renditions", f"{stem}_{size}.{extension}") for extension in formats} for size in RENDITION_SIZES}
+    # named after the content of the image, a stored rendition of the same name is the same rendition
+    if is_content_name(name):
+        claim_blobs([path for names in paths.values() for path in names.values()])
+    renditions = {}
+    for size, (width, height, crop) in RENDITION_SIZES.items():
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.LANCZOS)
+        for extension, (image_format, options) in formats.items():
+            path = paths[size][extension]
+            if not is_content_name(name) or not storage.exists(path):
+                buffer = BytesIO()
+                resized.save(buffer, image_format, icc_profile=icc_profile, **options)
+                path = storage.save(path, ContentFile(buffer.getvalue()))
+            renditions.setdefault(size, {})[extension] = path
+    return renditions
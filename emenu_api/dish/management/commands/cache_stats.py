@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from emenu_api.cache import CACHED_ENDPOINTS, TaggedCache
+
+
+class Command(BaseCommand):
+    help = "Prints hit rate of the cached dish and menu endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset counters after printing them")
+
+    def handle(self, *args, **options):
+        cache = TaggedCache("data")
+        for endpoint in CACHED_ENDPOINTS:
+            stats = cache.get_stats(endpoint)
+            total = stats["hits"] + stats["misses"]
+            hit_rate = stats["hits"] / total * 100 if total else 0
+            self.stdout.write(f"{endpoint}: {stats['hits']} hits, {stats['misses']} misses, hit rate {hit_rate:.1f}%")
+            if options["reset"]:
+                cache.reset_stats(endpoint)
@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from emenu_api.catalog import CATALOG_WRITERS, CHUNK_SIZE, export_records
+
+
+class Command(BaseCommand):
+    help = "Writes every dish and menu as NDJSON or CSV, one record at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, - for standard output")
+        parser.add_argument("--format", choices=CATALOG_WRITERS, help="Defaults to the extension of path, or ndjson")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        catalog_format = options["format"] or ("csv" if options["path"].endswith(".csv") else "ndjson")
+        lines = CATALOG_WRITERS[catalog_format](export_records(options["chunk_size"]))
+        if options["path"] == "-":
+            sys.stdout.writelines(lines)
+            return
+        with open(options["path"], "w", encoding="utf-8", newline="") as catalog:
+            catalog.writelines(lines)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from emenu_api.catalog import CATALOG_READERS, CHUNK_SIZE, CatalogError, CatalogImport
+
+
+class Command(BaseCommand):
+    help = "Upserts dishes and menus from an NDJSON or CSV catalog written by export_catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=CATALOG_READERS, help="Defaults to the extension of path, or ndjson")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        catalog_format = options["format"] or ("csv" if options["path"].endswith(".csv") else "ndjson")
+        with open(options["path"], encoding="utf-8", newline="") as catalog:
+            try:
+                stats = CatalogImport(options["chunk_size"]).run(CATALOG_READERS[catalog_format](catalog))
+            except CatalogError as exc:
+                raise CommandError(str(exc))
+        self.stdout.write(", ".join(f"{count} {name.replace('_', ' ')}" for name, count in stats.items()))
@@ -1,9 +1,23 @@
-from django.core.management import call_command
+import json
+import os
+
+from django.core.management.color import no_style
 from django.db import migrations
 
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dishes.json")
+
 
 def load_dish_data(apps, schema_editor):
-    call_command("loaddata", "dish/dishes.json")
+    # historical model instead of loaddata, which saves through the current model and breaks once Dish gains columns
+    Dish = apps.get_model("dish", "Dish")
+    with open(FIXTURE, encoding="utf-8") as fixture:
+        for item in json.load(fixture):
+            Dish(pk=item["pk"], **item["fields"]).save_base(raw=True)
+
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Dish]):
+            cursor.execute(sql)
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0002_loading_dishes_to_db'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['updated_at', 'id'], name='dish_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['name', 'id'], name='dish_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['price', 'id'], name='dish_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['preparation_time', 'id'], name='dish_preparation_time_id_idx'),
+        ),
+    ]
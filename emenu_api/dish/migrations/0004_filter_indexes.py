@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 19:05
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['created_at'], name='dish_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(condition=models.Q(('is_vegetarian', True)), fields=['updated_at', 'id'], name='dish_vegetarian_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), fastupdate=False, name='dish_name_trgm_idx'),
+        ),
+    ]
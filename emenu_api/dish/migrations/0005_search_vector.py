@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-18 19:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations
+
+# PostgreSQL ships no Polish configuration, a copy of simple that also folds diacritics lets "zurek" find "Żurek".
+# An existing polish configuration, e.g. one built on an ispell dictionary, is left alone.
+CONFIG_SQL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'polish') THEN
+        CREATE TEXT SEARCH CONFIGURATION polish (COPY = simple);
+        ALTER TEXT SEARCH CONFIGURATION polish ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+    END IF;
+END
+$$;
+"""
+
+TRIGGER_SQL = """
+CREATE FUNCTION dish_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('polish', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('polish', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dish_search_vector_update BEFORE INSERT OR UPDATE OF name, description, search_vector ON dish_dish
+FOR EACH ROW EXECUTE FUNCTION dish_search_vector_update();
+
+-- fires the trigger for existing rows
+UPDATE dish_dish SET search_vector = NULL;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER dish_search_vector_update ON dish_dish;
+DROP FUNCTION dish_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0004_filter_indexes'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunSQL(CONFIG_SQL, migrations.RunSQL.noop),
+        migrations.AddField(
+            model_name='dish',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='dish_search_vector_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
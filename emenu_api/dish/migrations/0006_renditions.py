@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0005_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
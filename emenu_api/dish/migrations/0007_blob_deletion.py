@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-18 21:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Every file a dish refers to, its image and the renditions of it.
+# Statement-level triggers: deleting or replacing the images of many dishes queues their files with one INSERT ... SELECT.
+TRIGGER_SQL = """
+CREATE FUNCTION dish_blob_names(image varchar, renditions jsonb) RETURNS SETOF text AS $$
+    SELECT image WHERE image <> ''
+    UNION ALL
+    SELECT files.value FROM jsonb_each(renditions) sizes, jsonb_each_text(sizes.value) files
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION dish_blob_deletion() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO dish_blobdeletion (name, attempts, next_attempt_at, created_at)
+        SELECT DISTINCT blob, 0, now(), now() FROM old_rows, dish_blob_names(old_rows.image, old_rows.renditions) blob;
+    ELSE
+        INSERT INTO dish_blobdeletion (name, attempts, next_attempt_at, created_at)
+        SELECT DISTINCT blob, 0, now(), now()
+        FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id, dish_blob_names(old_rows.image, old_rows.renditions) blob
+        WHERE (old_rows.image IS DISTINCT FROM new_rows.image OR old_rows.renditions <> new_rows.renditions)
+        AND blob NOT IN (SELECT dish_blob_names(new_rows.image, new_rows.renditions));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dish_blob_deletion_update AFTER UPDATE ON dish_dish REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_deletion();
+CREATE TRIGGER dish_blob_deletion_delete AFTER DELETE ON dish_dish REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_deletion();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER dish_blob_deletion_update ON dish_dish;
+DROP TRIGGER dish_blob_deletion_delete ON dish_dish;
+DROP FUNCTION dish_blob_deletion();
+DROP FUNCTION dish_blob_names(varchar, jsonb);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0006_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='blobdeletion',
+            index=models.Index(fields=['next_attempt_at', 'id'], name='blobdeletion_next_attempt_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2 on 2026-10-18 21:21
+
+from django.db import migrations, models
+
+
+# Statement-level triggers count the references of the dishes a statement inserts, updates or deletes with one
+# upsert per statement, in name order so that concurrent statements lock shared blobs in the same order. The
+# deletion of a blob is queued in the transaction that drops its last reference.
+TRIGGER_SQL = """
+DROP TRIGGER dish_blob_deletion_update ON dish_dish;
+DROP TRIGGER dish_blob_deletion_delete ON dish_dish;
+DROP FUNCTION dish_blob_deletion();
+
+CREATE FUNCTION dish_blob_references() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO dish_blob (name, reference_count)
+        SELECT blob, count(*) FROM new_rows, dish_blob_names(new_rows.image, new_rows.renditions) blob GROUP BY blob ORDER BY blob
+        ON CONFLICT (name) DO UPDATE SET reference_count = dish_blob.reference_count + EXCLUDED.reference_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO dish_blob (name, reference_count)
+        SELECT blob, -count(*) FROM old_rows, dish_blob_names(old_rows.image, old_rows.renditions) blob GROUP BY blob ORDER BY blob
+        ON CONFLICT (name) DO UPDATE SET reference_count = dish_blob.reference_count + EXCLUDED.reference_count;
+    ELSE
+        INSERT INTO dish_blob (name, reference_count)
+        SELECT blob, sum(delta) FROM (
+            SELECT blob, 1 AS delta FROM new_rows, dish_blob_names(new_rows.image, new_rows.renditions) blob
+            UNION ALL
+            SELECT blob, -1 AS delta FROM old_rows, dish_blob_names(old_rows.image, old_rows.renditions) blob
+        ) references_delta GROUP BY blob HAVING sum(delta) <> 0 ORDER BY blob
+        ON CONFLICT (name) DO UPDATE SET reference_count = dish_blob.reference_count + EXCLUDED.reference_count;
+    END IF;
+
+    WITH unreferenced AS (DELETE FROM dish_blob WHERE reference_count <= 0 RETURNING name)
+    INSERT INTO dish_blobdeletion (name, attempts, next_attempt_at, created_at)
+    SELECT name, 0, now(), now() FROM unreferenced ORDER BY name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dish_blob_references_insert AFTER INSERT ON dish_dish REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_references();
+CREATE TRIGGER dish_blob_references_update AFTER UPDATE ON dish_dish REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_references();
+CREATE TRIGGER dish_blob_references_delete AFTER DELETE ON dish_dish REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_references();
+
+INSERT INTO dish_blob (name, reference_count)
+SELECT blob, count(*) FROM dish_dish, dish_blob_names(dish_dish.image, dish_dish.renditions) blob GROUP BY blob;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER dish_blob_references_insert ON dish_dish;
+DROP TRIGGER dish_blob_references_update ON dish_dish;
+DROP TRIGGER dish_blob_references_delete ON dish_dish;
+DROP FUNCTION dish_blob_references();
+DELETE FROM dish_blob;
+
+CREATE FUNCTION dish_blob_deletion() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO dish_blobdeletion (name, attempts, next_attempt_at, created_at)
+        SELECT DISTINCT blob, 0, now(), now() FROM old_rows, dish_blob_names(old_rows.image, old_rows.renditions) blob;
+    ELSE
+        INSERT INTO dish_blobdeletion (name, attempts, next_attempt_at, created_at)
+        SELECT DISTINCT blob, 0, now(), now()
+        FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id, dish_blob_names(old_rows.image, old_rows.renditions) blob
+        WHERE (old_rows.image IS DISTINCT FROM new_rows.image OR old_rows.renditions <> new_rows.renditions)
+        AND blob NOT IN (SELECT dish_blob_names(new_rows.image, new_rows.renditions));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dish_blob_deletion_update AFTER UPDATE ON dish_dish REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_deletion();
+CREATE TRIGGER dish_blob_deletion_delete AFTER DELETE ON dish_dish REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION dish_blob_deletion();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0007_blob_deletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('reference_count', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(condition=models.Q(('reference_count__lte', 0)), fields=['name'], name='blob_unreferenced_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -1,9 +1,31 @@
-import os
-from datetime import datetime
+import hashlib
+import posixpath
+import re
 
-from django.db import models
-from django.dispatch import receiver
-from storages.backends.azure_storage import AzureStorage
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+# hex digits of the SHA-256 of an image in its stored name, 128 bits
+IMAGE_HASH_LENGTH = 32
+CONTENT_NAME_RE = re.compile(rf"^[0-9a-f]{{{IMAGE_HASH_LENGTH}}}(\.[a-z0-9]+)?$")
+
+
+def content_name(file):
+    """
+    The name of file after its content, the SHA-256 read in chunks so a large upload is never held in memory,
+    and its lowercased extension. Stored files under such names never change, whoever uploaded them.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()[:IMAGE_HASH_LENGTH] + posixpath.splitext(file.name)[1].lower()
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME_RE.match(posixpath.basename(name)))
 
 
 class Dish(models.Model):
@@ -15,25 +37,107 @@ class Dish(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_vegetarian = models.BooleanField(default=False)
     image = models.FileField(upload_to="dish_images/", null=True, blank=True)
+    # {size: {extension: stored name}} of the image renditions, filled by dish.tasks.process_dish_image
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # weighted name (A) and description (B), kept up to date by the dish_search_vector_update trigger
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if self.image:
-            ext = self.image.name.split(".")[-1]
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            new_name = f"dish_{timestamp}.{ext}"
-            self.image.name = new_name
+        # only a new upload is renamed, renaming a stored image would point the dish at a file that does not exist
+        if not self.image or self.image._committed:
+            if not self.image:
+                self.renditions = {}
+            return super().save(*args, **kwargs)
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            name = self.image.field.generate_filename(self, content_name(self.image))
+            # uploading the photo the dish shows already keeps its renditions
+            if self.pk is None or not Dish.objects.filter(pk=self.pk, image=name).exists():
+                self.renditions = {}
+            claim_blobs([name])
+            if self.image.storage.exists(name):
+                # the same photo is stored already, the dish refers to it instead of uploading it again
+                self.image = name
+            else:
+                self.image.name = posixpath.basename(name)
+            super().save(*args, **kwargs)
 
     class Meta:
         ordering = ["-updated_at"]
+        # (field, id) pairs serve keyset pagination on the default ordering and DishViewSet.ordering_fields as
+        # well as the DishFilter ranges on the same fields
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="dish_updated_at_id_idx"),
+            models.Index(fields=["name", "id"], name="dish_name_id_idx"),
+            models.Index(fields=["price", "id"], name="dish_price_id_idx"),
+            models.Index(fields=["preparation_time", "id"], name="dish_preparation_time_id_idx"),
+            models.Index(fields=["created_at"], name="dish_created_at_idx"),
+            models.Index(fields=["updated_at", "id"], condition=models.Q(is_vegetarian=True), name="dish_vegetarian_updated_at_idx"),
+            # name__icontains compiles to UPPER("name") LIKE UPPER('%...%'), fastupdate off keeps new names off the
+            # pending list so the planner keeps choosing the index right after bulk imports
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="dish_name_trgm_idx", fastupdate=False),
+            GinIndex(fields=["search_vector"], name="dish_search_vector_idx"),
+        ]
+
+
+class Blob(models.Model):
+    """
+    A stored dish image or rendition and the number of references dishes hold to it, kept by the
+    dish_blob_references triggers. A blob no dish refers to any more is removed and its deletion queued.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    reference_count = models.IntegerField()
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        indexes = [models.Index(fields=["name"], condition=models.Q(reference_count__lte=0), name="blob_unreferenced_idx")]
+
+
+class BlobDeletion(models.Model):
+    """
+    A stored dish image or rendition to delete. The dish_blob_references triggers write these in the transaction
+    that drops the last reference to it, dish.tasks.drain_blob_deletions deletes the files.
+    """
+
+    name = models.CharField(max_length=255)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        indexes = [models.Index(fields=["next_attempt_at", "id"], name="blobdeletion_next_attempt_idx")]
+
+
+def lock_blobs(names):
+    """
+    Locks the dish_blob rows of names until the transaction ends and returns the names some dish refers to. Missing
+    rows are inserted unreferenced, so this also waits for a transaction that drops the last reference to a name or
+    claims it. Rows are locked in name order, as the dish_blob_references triggers do.
+    """
+    names = sorted(names)
+    Blob.objects.bulk_create([Blob(name=name, reference_count=0) for name in names], ignore_conflicts=True)
+    blobs = Blob.objects.filter(name__in=names).order_by("name").select_for_update()
+    return {name for name, reference_count in blobs.values_list("name", "reference_count") if reference_count > 0}
 
 
-@receiver(models.signals.post_delete, sender=Dish)
-def delete_file(sender, instance, **kwargs):
-    if instance.image:
-        azure_storage = AzureStorage(account_name=os.getenv("AZURE_ACCOUNT_NAME"), account_key=os.getenv("AZURE_ACCOUNT_KEY"))
-        azure_storage.delete(instance.image.name)
+def claim_blobs(names):
+    """
+    Keeps the stored files a dish is about to refer to from being deleted: locks their dish_blob rows and drops the
+    deletions queued for them. Call it in the transaction that adds the references, before checking that the files
+    are stored; one a drain_blob_deletions worker deleted meanwhile is missing and gets stored again. Returns the
+    names some dish refers to already.
+    """
+    referenced = lock_blobs(names)
+    # a worker holding a deletion locks the rows as well, it waits for this transaction and keeps the file
+    queued = BlobDeletion.objects.filter(name__in=names).select_for_update(skip_locked=True)
+    BlobDeletion.objects.filter(pk__in=list(queued.values_list("pk", flat=True))).delete()
+    return referenced
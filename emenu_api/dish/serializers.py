@@ -1,9 +1,109 @@
+import mimetypes
+
+from django.utils import timezone
+from emenu_api.serializers import SparseFieldsMixin
+from emenu_api.values import ValuesSerializer
 from rest_framework import serializers
+from rest_framework.fields import empty
 
 from .models import Dish
+from .uploads import UPLOAD_MAX_SIZE
+
+
+class DishListSerializer(serializers.ListSerializer):
+    """
+    Writes a list of dishes with one bulk_create, or with one bulk_update when instance is the in_bulk() map of
+    the dishes the items refer to by id. Errors are reported per item, in the order the items were sent.
+    """
+
+    def to_internal_value(self, data):
+        if self.instance is None or not isinstance(data, list):
+            return super().to_internal_value(data)
+
+        ids, id_errors = [], []
+        for item in data:
+            try:
+                dish_id = serializers.IntegerField().run_validation(item.get("id", empty) if isinstance(item, dict) else empty)
+                if dish_id not in self.instance:
+                    raise serializers.ValidationError("Not found.", code="not_found")
+            except serializers.ValidationError as exc:
+                ids.append(None)
+                id_errors.append({"id": exc.detail})
+            else:
+                ids.append(dish_id)
+                id_errors.append({})
+
+        try:
+            validated_data = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            raise serializers.ValidationError([{**id_error, **item_errors} for id_error, item_errors in zip(id_errors, exc.detail)])
+        if any(id_errors):
+            raise serializers.ValidationError(id_errors)
+        return [{**item, "id": dish_id} for item, dish_id in zip(validated_data, ids)]
+
+    def create(self, validated_data):
+        return Dish.objects.bulk_create([Dish(**item) for item in validated_data])
+
+    def update(self, instance, validated_data):
+        # bulk_update() skips auto_now
+        now = timezone.now()
+        dishes, fields = [], {"updated_at"}
+        for item in validated_data:
+            dish = instance[item.pop("id")]
+            for attr, value in item.items():
+                setattr(dish, attr, value)
+            dish.updated_at = now
+            fields.update(item)
+            dishes.append(dish)
+        Dish.objects.bulk_update(list({dish.id: dish for dish in dishes}.values()), fields)
+        return dishes
+
+
+class RenditionsField(serializers.Field):
+    """
+    The URLs of the image renditions of a dish by size and format, {} until process_dish_image has made them.
+    """
 
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Dish._meta.get_field("image").storage
+        request = self.context.get("request")
+        urls = {}
+        for size, names in value.items():
+            urls[size] = {extension: storage.url(name) for extension, name in names.items()}
+            if request is not None:
+                urls[size] = {extension: request.build_absolute_uri(url) for extension, url in urls[size].items()}
+        return urls
+
+
+class DishSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    renditions = RenditionsField()
 
-class DishSerializer(serializers.ModelSerializer):
     class Meta:
         model = Dish
-        fields = "__all__"
+        exclude = ["search_vector"]
+        list_serializer_class = DishListSerializer
+
+
+class DishValuesSerializer(ValuesSerializer):
+    pass
+
+
+class DishImageUploadSerializer(serializers.Serializer):
+    filename = serializers.RegexField(r"^[^/\\]*\.[A-Za-z0-9]{1,10}$", max_length=255)
+    content_type = serializers.CharField(max_length=255, required=False)
+    size = serializers.IntegerField(min_value=1, max_value=UPLOAD_MAX_SIZE)
+
+    def validate(self, attrs):
+        if "content_type" not in attrs:
+            attrs["content_type"] = mimetypes.guess_type(attrs["filename"])[0] or "application/octet-stream"
+        return attrs
+
+
+class DishImageCompleteSerializer(serializers.Serializer):
+    token = serializers.CharField()
@@ -1,52 +1,253 @@
-import os
-import time
+import logging
 from datetime import timedelta
-from smtplib import SMTPException
+from functools import partial
+from smtplib import SMTPRecipientsRefused
 
-from celery import shared_task
+from celery import group, shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
 from django.utils import timezone
+from emenu_api.cache import DISH_LIST, CachedViewMixin, dish_tag
+from kombu.exceptions import OperationalError
+from PIL import Image, UnidentifiedImageError
 
-from .models import Dish
+from .blobs import delete_stored, list_stored, referenced_blobs
+from .images import make_renditions
+from .models import Blob, BlobDeletion, Dish, claim_blobs, content_name, is_content_name, lock_blobs
+
+REPORT_CHUNK_SIZE = 100
+REPORT_MAX_RETRIES = 5
+# seconds, the first retry of a chunk waits up to REPORT_RETRY_BACKOFF, every next one up to twice as long
+REPORT_RETRY_BACKOFF = 3
+REPORT_RETRY_BACKOFF_MAX = 10 * 60
+# the most blobs one Azure blob batch request deletes
+BLOB_DELETION_BATCH_SIZE = 256
+BLOB_DELETION_MAX_ATTEMPTS = 8
+# seconds, a file that could not be deleted is tried again after up to BLOB_DELETION_BACKOFF, then twice as long
+BLOB_DELETION_BACKOFF = 60
+BLOB_DELETION_BACKOFF_MAX = 6 * 60 * 60
+# presigned uploads are completed and renditions recorded well before this
+ORPHAN_BLOBS_AFTER = timedelta(days=1)
+# a dish image without renditions this long after its last change is queued again, until ORPHAN_BLOBS_AFTER
+PENDING_IMAGES_AFTER = timedelta(minutes=30)
+
+logger = logging.getLogger(__name__)
+
+
+def dish_details(dish):
+    return (
+        f"- {dish.name}, Opis: {dish.description}, Cena: {dish.price}, "
+        f"Czas przygotowania: {dish.preparation_time} min, "
+        f"Wegetariańskie: {'Tak' if dish.is_vegetarian else 'Nie'}, "
+        f"Zdjęcie: {dish.image.url if dish.image else 'Brak'}"
+    )
+
+
+def build_dish_report(start_of_day):
+    modified_dishes = Dish.objects.filter(updated_at__gte=start_of_day, updated_at__lt=start_of_day + timedelta(days=1)).defer("search_vector")
+    email_subject = f"Przepisy z dnia {start_of_day.strftime('%Y-%m-%d')}"
+    email_message = f"Przepisy z dnia {start_of_day.strftime('%Y-%m-%d')}:\n\nOstatnio zmodyfikowane przepisy:\n" + "\n".join(
+        [dish_details(dish) for dish in modified_dishes]
+    )
+    return email_subject, email_message
 
 
 @shared_task
 def send_dish_report():
+    """
+    Builds the report of the dishes modified yesterday once and sends it to every user with an email address,
+    REPORT_CHUNK_SIZE users per send_dish_report_chunk task so that the workers send the chunks in parallel.
+    """
     start_of_yesterday = timezone.now() - timedelta(days=1)
     start_of_yesterday = start_of_yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_yesterday = start_of_yesterday + timedelta(days=1)
+    email_subject, email_message = build_dish_report(start_of_yesterday)
+
+    emails = list(User.objects.exclude(email="").exclude(email__isnull=True).order_by("id").values_list("email", flat=True))
+    chunks = [emails[i : i + REPORT_CHUNK_SIZE] for i in range(0, len(emails), REPORT_CHUNK_SIZE)]
+    group(send_dish_report_chunk.s(email_subject, email_message, chunk) for chunk in chunks).apply_async()
+    return len(chunks)
 
-    modified_dishes = Dish.objects.filter(updated_at__gte=start_of_yesterday, updated_at__lt=end_of_yesterday)
 
-    def dish_details(dish):
-        return (
-            f"- {dish.name}, Opis: {dish.description}, Cena: {dish.price}, "
-            f"Czas przygotowania: {dish.preparation_time} min, "
-            f"Wegetariańskie: {'Tak' if dish.is_vegetarian else 'Nie'}, "
-            f"Zdjęcie: {dish.image.url if dish.image else 'Brak'}"
+@shared_task(bind=True, max_retries=REPORT_MAX_RETRIES)
+def send_dish_report_chunk(self, email_subject, email_message, recipients):
+    """
+    Sends the report to each recipient over one SMTP connection. A refused address is skipped, any other error
+    retries the task, with exponential backoff, for the recipients that did not get the report yet. A recipient
+    failing on the last retry is given up on and the rest of the chunk goes to a new task.
+    """
+    done = 0
+    try:
+        with get_connection() as connection:
+            for recipient in recipients:
+                # one message per send_messages() call, so that a retry knows who already got the report
+                try:
+                    message = EmailMessage(email_subject, email_message, settings.EMAIL_HOST_USER, [recipient])
+                    connection.send_messages([message])
+                except SMTPRecipientsRefused:
+                    logger.warning("Dish report refused for %s", recipient)
+                except OSError:
+                    if self.request.retries < self.max_retries:
+                        raise
+                    logger.exception("Giving up sending the dish report to %s", recipient)
+                    if recipients[done + 1 :]:
+                        send_dish_report_chunk.delay(email_subject, email_message, recipients[done + 1 :])
+                    return done
+                done += 1
+    # SMTPException is an OSError, as are the socket errors of a lost connection
+    except OSError as exc:
+        countdown = get_exponential_backoff_interval(
+            REPORT_RETRY_BACKOFF, self.request.retries, REPORT_RETRY_BACKOFF_MAX, full_jitter=True
         )
+        raise self.retry(args=(email_subject, email_message, recipients[done:]), exc=exc, countdown=countdown)
+    return done
 
-    email_subject = f"Przepisy z dnia {start_of_yesterday.strftime('%Y-%m-%d')}"
-    email_message = f"Przepisy z dnia {start_of_yesterday.strftime('%Y-%m-%d')}:\n\nOstatnio zmodyfikowane przepisy:\n" + "\n".join(
-        [dish_details(dish) for dish in modified_dishes]
-    )
 
-    users = User.objects.filter(email__isnull=False)
-    for user in users:
-        attempts = 3
-        while attempts > 0:
+@shared_task
+def process_dish_image(dish_id, image_name):
+    """
+    Makes the renditions of a newly uploaded dish image and records them on the dish, unless the dish has been
+    deleted or given another image in the meantime. A presigned upload is first moved to the content name of the
+    image, and an image other dishes show already gets their renditions.
+    """
+    if not Dish.objects.filter(pk=dish_id, image=image_name).exists():
+        return
+    storage = Dish._meta.get_field("image").storage
+    if not is_content_name(image_name):
+        with storage.open(image_name) as file, transaction.atomic():
+            name = Dish._meta.get_field("image").generate_filename(None, content_name(file))
+            claim_blobs([name])
+            if not storage.exists(name):
+                name = storage.save(name, file)
+            # the temporary upload loses its reference and is deleted, a name saved for a dish gone since is an orphan
+            if not Dish.objects.filter(pk=dish_id, image=image_name).update(image=name, updated_at=timezone.now()):
+                return
+            schedule_blob_deletions()
+        clear_dish_cache(dish_id)
+        image_name = name
+
+    with transaction.atomic():
+        renditions = Dish.objects.filter(image=image_name).exclude(renditions={}).values_list("renditions", flat=True).first()
+        # unless the dish showing them has been deleted since and took them along
+        if renditions is not None:
+            names = {name for names in renditions.values() for name in names.values()}
+            if claim_blobs(names) != names:
+                renditions = None
+        if renditions is None:
             try:
-                send_mail(
-                    email_subject,
-                    email_message,
-                    os.getenv("EMAIL_HOST_USER"),
-                    [user.email],
-                    fail_silently=False,
-                )
-                break
-            except SMTPException as e:
-                attempts -= 1
-                time.sleep(3)
-                if attempts == 0:
-                    raise e
+                renditions = make_renditions(storage, image_name)
+            except (UnidentifiedImageError, Image.DecompressionBombError):
+                logger.warning("Dish %s image %s cannot be processed", dish_id, image_name)
+                return
+
+        if not Dish.objects.filter(pk=dish_id, image=image_name).update(renditions=renditions, updated_at=timezone.now()):
+            # renditions other dishes refer to are kept
+            BlobDeletion.objects.bulk_create([BlobDeletion(name=name) for names in renditions.values() for name in names.values()])
+            schedule_blob_deletions()
+            return
+    clear_dish_cache(dish_id)
+
+
+@shared_task
+def process_pending_dish_images():
+    """
+    Queues process_dish_image again for the dish images that got no renditions, e.g. when the broker was down as
+    the upload was committed. Images that cannot be processed are given up on after ORPHAN_BLOBS_AFTER.
+    """
+    now = timezone.now()
+    pending = Dish.objects.filter(renditions={}, updated_at__gte=now - ORPHAN_BLOBS_AFTER, updated_at__lt=now - PENDING_IMAGES_AFTER)
+    pending = list(pending.exclude(image="").exclude(image__isnull=True).values_list("id", "image"))
+    for dish_id, image_name in pending:
+        process_dish_image.delay(dish_id, image_name)
+    return len(pending)
+
+
+def schedule_dish_image(dish_id, image_name):
+    transaction.on_commit(partial(start_dish_image, dish_id, image_name))
+
+
+def start_dish_image(dish_id, image_name):
+    # the dish is committed already, process_pending_dish_images queues its image later
+    try:
+        process_dish_image.delay(dish_id, image_name)
+    except OperationalError:
+        logger.exception("Could not schedule processing dish %s image %s", dish_id, image_name)
+
+
+def clear_dish_cache(dish_id):
+    CachedViewMixin.cache.bump_generation(DISH_LIST)
+    CachedViewMixin.cache.invalidate(dish_tag(dish_id))
+
+
+def schedule_blob_deletions():
+    transaction.on_commit(start_blob_deletions)
+
+
+def start_blob_deletions():
+    # the deletions are committed to the outbox already, the periodic drain gets to them without the broker
+    try:
+        drain_blob_deletions.delay()
+    except OperationalError:
+        logger.exception("Could not schedule draining the blob deletions")
+
+
+@shared_task
+def drain_blob_deletions():
+    """
+    Deletes the files of up to BLOB_DELETION_BATCH_SIZE due blob deletions, and queues itself again while more are
+    due. A file some dish refers to again is kept. A failed deletion is retried with exponential backoff, after
+    BLOB_DELETION_MAX_ATTEMPTS it is dropped and collect_orphan_blobs finds the file later.
+    """
+    storage = Dish._meta.get_field("image").storage
+    now = timezone.now()
+    with transaction.atomic():
+        # workers draining at the same time take different batches
+        due = BlobDeletion.objects.filter(next_attempt_at__lte=now).order_by("next_attempt_at", "id")
+        deletions = list(due.select_for_update(skip_locked=True)[:BLOB_DELETION_BATCH_SIZE])
+        names = {deletion.name for deletion in deletions}
+        # waits for the transactions claiming any of the files for a dish, see claim_blobs
+        kept = lock_blobs(names) if names else set()
+        done = kept | delete_stored(storage, sorted(names - kept))
+        # the rows lock_blobs inserted, no dish refers to them
+        Blob.objects.filter(name__in=names - kept, reference_count__lte=0).delete()
+
+        failed = [deletion for deletion in deletions if deletion.name not in done]
+        for deletion in failed:
+            deletion.attempts += 1
+            backoff = get_exponential_backoff_interval(BLOB_DELETION_BACKOFF, deletion.attempts - 1, BLOB_DELETION_BACKOFF_MAX)
+            deletion.next_attempt_at = now + timedelta(seconds=backoff)
+            if deletion.attempts >= BLOB_DELETION_MAX_ATTEMPTS:
+                logger.error("Giving up deleting %s", deletion.name)
+        retried = [deletion for deletion in failed if deletion.attempts < BLOB_DELETION_MAX_ATTEMPTS]
+        finished = [deletion.pk for deletion in deletions if deletion not in retried]
+        BlobDeletion.objects.filter(pk__in=finished).delete()
+        BlobDeletion.objects.bulk_update(retried, ["attempts", "next_attempt_at"])
+
+    if len(deletions) == BLOB_DELETION_BATCH_SIZE:
+        drain_blob_deletions.delay()
+    return len(done - kept)
+
+
+@shared_task
+def collect_orphan_blobs():
+    """
+    Queues the deletion of the stored dish images and renditions older than ORPHAN_BLOBS_AFTER that no dish refers
+    to: uploads of rolled back requests, presigned uploads never completed and deletions given up on.
+    """
+    storage = Dish._meta.get_field("image").storage
+    directory = Dish._meta.get_field("image").upload_to.rstrip("/")
+    modified_before = timezone.now() - ORPHAN_BLOBS_AFTER
+    referenced = referenced_blobs()
+    queued = set(BlobDeletion.objects.values_list("name", flat=True))
+
+    orphans = [
+        BlobDeletion(name=name)
+        for name, modified in list_stored(storage, directory)
+        if modified < modified_before and name not in referenced and name not in queued
+    ]
+    BlobDeletion.objects.bulk_create(orphans, batch_size=BLOB_DELETION_BATCH_SIZE)
+    if orphans:
+        drain_blob_deletions.delay()
+    return len(orphans)
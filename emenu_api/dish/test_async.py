@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Dish
+from .views import DishViewSet
+
+
+@override_settings(ROOT_URLCONF="emenu_api.asgi_urls")
+class AsyncDishReadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+        self.dish = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+        DishViewSet.cache.clear()
+
+    def test_cache_hit(self):
+        url = reverse("dish-detail", kwargs={"pk": self.dish.id})
+        response = self.client.get(url, {"fields": "id,name"})
+        self.assertEqual(response.json(), {"id": self.dish.id, "name": "Test Dish 1"})
+
+        # the user, nothing else
+        with patch.object(DishViewSet, "retrieve", side_effect=AssertionError), self.assertNumQueries(1):
+            cached = self.client.get(url, {"fields": "id,name"})
+        self.assertEqual(cached.content, response.content)
+        with patch.object(DishViewSet, "retrieve", side_effect=AssertionError), self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {"fields": "id,name"}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # the browsable API is not cached
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT="text/html").status_code, status.HTTP_200_OK)
+
+    def test_conditional_list_request_on_a_miss(self):
+        url = reverse("dish-list")
+        response = self.client.get(url, {"is_vegetarian": "true"})
+        DishViewSet.cache.clear()
+
+        # the user and the version of the list
+        with patch.object(DishViewSet, "list", side_effect=AssertionError), self.assertNumQueries(2):
+            response = self.client.get(url, {"is_vegetarian": "true"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(reverse("dish-detail", kwargs={"pk": self.dish.id}), {"price": "12.00"}, format="json")
+        response = self.client.get(url, {"is_vegetarian": "true"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][0]["price"], "12.00")
+
+    def test_unauthenticated(self):
+        url = reverse("dish-list")
+        self.client.get(url)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["code"], "user_inactive")
+
+        self.client.credentials()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", response)
+
+    async def test_async_client(self):
+        url = reverse("dish-detail", kwargs={"pk": self.dish.id})
+        headers = {"authorization": f"Bearer {self.token}"}
+        self.assertEqual((await self.async_client.get(url, headers=headers)).status_code, status.HTTP_200_OK)
+        response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.json()["name"], "Test Dish 1")
+        self.assertEqual((await self.async_client.get(url)).status_code, status.HTTP_401_UNAUTHORIZED)
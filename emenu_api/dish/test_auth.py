@@ -1,9 +1,21 @@
+import json
+from base64 import b64encode
+from datetime import datetime, timezone
+from decimal import Decimal
+
 from dish.models import Dish
+from dish.views import DishViewSet
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from emenu_api.cache import DISH_LIST
+from emenu_api.renderers import ORJSONRenderer
+from menu.models import Menu
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
@@ -95,5 +107,278 @@ class DishTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["count"], filtered_count)
 
+    def test_list_dishes_after_create(self):
+        response = self.client.get(reverse("dish-list"))
+        self.assertEqual(response.data["count"], 25)
+
+        data = {"name": "New Dish", "price": 20.00, "description": "New Description", "preparation_time": 30, "is_vegetarian": True}
+        self.client.post(reverse("dish-list"), data)
+
+        response = self.client.get(reverse("dish-list"))
+        self.assertEqual(response.data["count"], 26)
+
+    def test_list_dishes_cache_key_is_canonical(self):
+        self.client.get(reverse("dish-list"), {"price__gte": "10", "ordering": "name"})
+        hits = DishViewSet.cache.get_stats(DISH_LIST)["hits"]
+
+        response = self.client.get(reverse("dish-list") + "?ordering=name&price__gte=10.00&utm_source=crawler&name=&page=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(DishViewSet.cache.get_stats(DISH_LIST)["hits"], hits + 1)
+
+    def test_list_dishes_cache_key_keeps_distinct_filters(self):
+        self.client.get(reverse("dish-list"), {"price__gte": "10"})
+        response = self.client.get(reverse("dish-list"), {"price__gte": "15"})
+        self.assertEqual(response.data["count"], Dish.objects.filter(price__gte=15).count())
+
+    def test_get_single_dish_renders_like_json_renderer(self):
+        dish = Dish.objects.first()
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        data = {
+            "price": Decimal("10.50"),
+            "created_at": datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            "name": gettext_lazy("Żurek\u2028z jajkiem\u2029"),
+            1: [None, True, 1.5, (2, 3)],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_create_dish_json(self):
+        data = {"name": "Żurek", "price": "20.00", "description": "Zupa", "preparation_time": 30, "is_vegetarian": False}
+        response = self.client.post(reverse("dish-list"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["price"], "20.00")
+
+        response = self.client.post(reverse("dish-list"), '{"name": NaN}', content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data["detail"].startswith("JSON parse error"))
+
+    def test_bulk_create_dishes(self):
+        self.client.get(reverse("dish-list"))
+        data = [
+            {"name": f"Bulk Dish {i}", "price": "12.50", "description": "Bulk", "preparation_time": 10 + i, "is_vegetarian": i % 2 == 0}
+            for i in range(50)
+        ]
+        # authentication and one INSERT for all dishes, wrapped in a savepoint
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse("dish-bulk"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([dish["name"] for dish in response.data], [item["name"] for item in data])
+        self.assertTrue(all(dish["id"] and dish["created_at"] for dish in response.data))
+
+        response = self.client.get(reverse("dish-list"))
+        self.assertEqual(response.data["count"], 75)
+
+    def test_bulk_create_dishes_errors(self):
+        data = [
+            {"name": "Valid Dish", "price": "12.50", "description": "Bulk", "preparation_time": 10},
+            {"name": "Invalid Dish", "price": "cheap", "description": "Bulk", "preparation_time": 10},
+            {"name": "Incomplete Dish"},
+        ]
+        response = self.client.post(reverse("dish-bulk"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(list(response.data[1]), ["price"])
+        self.assertEqual(set(response.data[2]), {"description", "price", "preparation_time"})
+        self.assertFalse(Dish.objects.filter(name="Valid Dish").exists())
+
+        response = self.client.post(reverse("dish-bulk"), [], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse("dish-bulk"), data[0], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_dishes(self):
+        dish1, dish2 = Dish.objects.filter(name__startswith="Test Dish").order_by("name")
+        menu = Menu.objects.create(name="Bulk Menu", description="Bulk")
+        menu.dishes.add(dish1)
+        self.client.get(reverse("menu-detail", kwargs={"pk": menu.id}))
+
+        data = [{"id": dish1.id, "name": "Renamed Dish"}, {"id": dish2.id, "price": "99.99", "is_vegetarian": True}]
+        response = self.client.patch(reverse("dish-bulk"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([dish["id"] for dish in response.data], [dish1.id, dish2.id])
+
+        dish1.refresh_from_db()
+        dish2.refresh_from_db()
+        self.assertEqual((dish1.name, dish1.price), ("Renamed Dish", Decimal("10.50")))
+        self.assertEqual((dish2.name, dish2.price, dish2.is_vegetarian), ("Test Dish 2", Decimal("99.99"), True))
+        self.assertGreater(dish1.updated_at, dish1.created_at)
+
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": menu.id}))
+        self.assertEqual(response.json()["dishes"][0]["name"], "Renamed Dish")
+
+    def test_bulk_update_dishes_errors(self):
+        dish = Dish.objects.get(name="Test Dish 1")
+        data = [{"id": dish.id, "name": "Renamed Dish"}, {"id": 0, "price": "cheap"}, {"name": "No Id"}]
+        response = self.client.patch(reverse("dish-bulk"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(set(response.data[1]), {"id", "price"})
+        self.assertEqual(list(response.data[2]), ["id"])
+        dish.refresh_from_db()
+        self.assertEqual(dish.name, "Test Dish 1")
+
+    def test_bulk_delete_dishes(self):
+        dishes = list(Dish.objects.filter(name__startswith="Test Dish"))
+        menu = Menu.objects.create(name="Bulk Menu", description="Bulk")
+        menu.dishes.add(*dishes)
+        updated_at = menu.updated_at
+
+        response = self.client.delete(reverse("dish-bulk"), {"ids": [dish.id for dish in dishes]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Dish.objects.count(), 23)
+        menu.refresh_from_db()
+        self.assertGreater(menu.updated_at, updated_at)
+
+    def test_bulk_delete_dishes_errors(self):
+        dish = Dish.objects.first()
+        response = self.client.delete(reverse("dish-bulk"), {"ids": [dish.id, 0]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data["ids"]), [1])
+        self.assertTrue(Dish.objects.filter(pk=dish.id).exists())
+
+        response = self.client.delete(reverse("dish-bulk"), {"ids": ["x"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_single_dish_fields(self):
+        dish = Dish.objects.first()
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}), {"fields": "id,price"})
+        self.assertEqual(response.data, {"id": dish.id, "price": str(dish.price)})
+
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.assertEqual(response.data["name"], dish.name)
+
+    def test_create_dish_ignores_fields(self):
+        data = {"name": "New Dish", "price": 20.00, "description": "New Description", "preparation_time": 30, "is_vegetarian": True}
+        response = self.client.post(reverse("dish-list") + "?fields=id", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["name"], "New Dish")
+
+    def test_get_single_dish_not_modified(self):
+        dish = Dish.objects.first()
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.assertIn("ETag", response)
+        self.assertIn("Last-Modified", response)
+
+        not_modified = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+        self.assertEqual(not_modified.content, b"")
+
+        not_modified = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}), HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_single_dish_modified(self):
+        dish = Dish.objects.first()
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"price": 30.00})
+
+        modified = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(modified["ETag"], response["ETag"])
+
+    def test_list_dishes_not_modified_without_cache_entry(self):
+        response = self.client.get(reverse("dish-list"), {"is_vegetarian": True})
+        DishViewSet.cache.clear()
+
+        # authentication plus the version query, nothing is serialized
+        with self.assertNumQueries(2):
+            not_modified = self.client.get(reverse("dish-list"), {"is_vegetarian": True}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def walk_cursor_pages(self, params):
+        response = self.client.get(reverse("dish-list"), {"pagination": "cursor", **params})
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        pages = [[dish["id"] for dish in response.data["results"]]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            pages.append([dish["id"] for dish in response.data["results"]])
+
+        previous_pages = [pages[-1]]
+        while response.data["previous"]:
+            response = self.client.get(response.data["previous"])
+            previous_pages.insert(0, [dish["id"] for dish in response.data["results"]])
+        self.assertEqual(previous_pages, pages)
+        return [dish_id for page in pages for dish_id in page]
+
+    def test_list_dishes_cursor_pagination(self):
+        dish_ids = self.walk_cursor_pages({})
+        self.assertEqual(dish_ids, list(Dish.objects.order_by("-updated_at", "-id").values_list("id", flat=True)))
+
+    def test_list_dishes_cursor_pagination_ties(self):
+        Dish.objects.bulk_create(Dish(name=f"Tie {i}", price=12.00, description="Tie", preparation_time=10, is_vegetarian=False) for i in range(15))
+
+        dish_ids = self.walk_cursor_pages({"ordering": "price"})
+        self.assertEqual(dish_ids, list(Dish.objects.order_by("price", "id").values_list("id", flat=True)))
+
+        dish_ids = self.walk_cursor_pages({"ordering": "-price", "is_vegetarian": False})
+        self.assertEqual(dish_ids, list(Dish.objects.filter(is_vegetarian=False).order_by("-price", "-id").values_list("id", flat=True)))
+
+    def test_list_dishes_invalid_cursor(self):
+        response = self.client.get(reverse("dish-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "LOCK_WAIT": 0.1})
+    def test_get_single_dish_reads_own_write_while_locked(self):
+        dish = Dish.objects.create(name="Test Dish", price=10.50, description="Test Description", preparation_time=15, is_vegetarian=True)
+        url = reverse("dish-detail", kwargs={"pk": dish.id})
+        self.client.get(url)
+        self.client.patch(url, {"name": "Renamed Dish"})
+
+        DishViewSet.cache.acquire_lock(f"dish_detail_{dish.id}", 10)
+        response = self.client.get(url)
+        self.assertEqual(response.data["name"], "Renamed Dish")
+
+    def test_list_dishes_tampered_cursor(self):
+        for ordering, value in [("-updated_at", "garbage"), ("price", "garbage"), ("name", None), ("price", [1])]:
+            cursor = b64encode(json.dumps({"v": value, "id": 1}).encode()).decode()
+            response = self.client.get(reverse("dish-list"), {"pagination": "cursor", "ordering": ordering, "cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, (ordering, value))
+
+    def test_list_dishes_cursor_multiple_orderings(self):
+        response = self.client.get(reverse("dish-list"), {"pagination": "cursor", "ordering": "price,name"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["ordering"][0].code, "invalid")
+
+        response = self.client.get(reverse("dish-list"), {"ordering": "price,name"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_search_dishes(self):
+        Dish.objects.create(name="Żurek", price=18.00, description="Zupa na zakwasie z kiełbasą", preparation_time=40, is_vegetarian=False)
+        Dish.objects.create(name="Kiełbasa z grilla", price=22.00, description="Podawana z musztardą", preparation_time=20, is_vegetarian=False)
+
+        response = self.client.get(reverse("dish-search"), {"q": "kiełbasa"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([dish["name"] for dish in response.data["results"]], ["Kiełbasa z grilla", "Żurek"])
+        self.assertNotIn("search_vector", response.data["results"][0])
+
+        response = self.client.get(reverse("dish-search"), {"q": "zurek"})
+        self.assertEqual([dish["name"] for dish in response.data["results"]], ["Żurek"])
+
+        response = self.client.get(reverse("dish-search"), {"q": "pomidor", "is_vegetarian": True})
+        self.assertIn("Margherita Pizza", [dish["name"] for dish in response.data["results"]])
+
+    def test_search_dishes_after_update(self):
+        dish = Dish.objects.get(name="Test Dish 1")
+        self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"description": "Pierogi ruskie"})
+
+        response = self.client.get(reverse("dish-search"), {"q": "pierogi ruskie"})
+        self.assertEqual([result["id"] for result in response.data["results"]], [dish.id])
+
+    def test_search_dishes_pagination(self):
+        Dish.objects.bulk_create(Dish(name=f"Pierogi {i}", price=12.00, description="Z kapustą", preparation_time=10, is_vegetarian=True) for i in range(15))
+
+        response = self.client.get(reverse("dish-search"), {"q": "z pierogi"})
+        dish_ids = [dish["id"] for dish in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            dish_ids += [dish["id"] for dish in response.data["results"]]
+        self.assertEqual(sorted(dish_ids), sorted(Dish.objects.filter(name__startswith="Pierogi").values_list("id", flat=True)))
+
+    def test_search_dishes_requires_query(self):
+        response = self.client.get(reverse("dish-search"), {"q": " "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def tearDown(self):
-        caches["data"].clear()
+        DishViewSet.cache.clear()
@@ -0,0 +1,172 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils import timezone
+from emenu_api.celery import app
+from kombu.exceptions import OperationalError
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Blob, BlobDeletion, Dish
+from .tasks import BLOB_DELETION_MAX_ATTEMPTS, collect_orphan_blobs, drain_blob_deletions
+
+RENDITIONS = {"thumbnail": {"webp": "dish_images/renditions/{}_thumbnail.webp"}, "medium": {"webp": "dish_images/renditions/{}_medium.webp"}}
+
+
+class BlobDeletionTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = FileSystemStorage(location=location, base_url="/media/")
+        storage = patch.object(Dish._meta.get_field("image"), "storage", self.storage)
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def store(self, name):
+        return self.storage.save(name, ContentFile(b"image"))
+
+    def create_dish(self, stem):
+        renditions = {size: {extension: self.store(name.format(stem)) for extension, name in names.items()} for size, names in RENDITIONS.items()}
+        return Dish.objects.create(
+            name=stem, price=10.50, description="Test Description", preparation_time=15, image=self.store(f"dish_images/{stem}.jpg"), renditions=renditions
+        )
+
+    def files(self, dish):
+        return {dish.image.name} | {name for names in dish.renditions.values() for name in names.values()}
+
+    def queued(self):
+        return set(BlobDeletion.objects.values_list("name", flat=True))
+
+    def test_delete_queues_files_after_commit(self):
+        dish = self.create_dish("dish_1")
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.queued(), self.files(dish))
+        # nothing is deleted inside the request
+        self.assertTrue(all(self.storage.exists(name) for name in self.files(dish)))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(self.storage.exists(name) for name in self.files(dish)))
+        self.assertEqual(self.queued(), set())
+
+    def test_delete_without_broker(self):
+        dish = self.create_dish("dish_1")
+        url = reverse("dish-detail", kwargs={"pk": dish.id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        with patch.object(drain_blob_deletions, "delay", side_effect=OperationalError), self.assertLogs("dish", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        # the periodic drain deletes the files, the cached dish is gone already
+        self.assertEqual(self.queued(), self.files(dish))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_delete_keeps_shared_files(self):
+        dishes = [self.create_dish(f"dish_{i}") for i in range(3)]
+        # a catalog import can point another dish at the same image
+        other = Dish.objects.create(name="Imported", price=10.50, description="Imported", preparation_time=15, image=dishes[0].image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("dish-bulk"), {"ids": [dish.id for dish in dishes]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(self.storage.exists(other.image.name))
+        self.assertFalse(any(self.storage.exists(name) for dish in dishes for name in self.files(dish) - {other.image.name}))
+        self.assertEqual(self.queued(), set())
+
+    def test_replaced_image_is_queued(self):
+        dish = self.create_dish("dish_1")
+        old = self.files(dish)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"image": ContentFile(b"new", name="new.jpg")}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        dish.refresh_from_db()
+        self.assertFalse(any(self.storage.exists(name) for name in old))
+        self.assertTrue(self.storage.exists(dish.image.name))
+
+        # other updates queue nothing
+        self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"price": "12.00"}, format="json")
+        Dish.objects.filter(pk=dish.pk).update(name="Renamed")
+        self.assertEqual(self.queued(), set())
+
+    def test_queued_file_is_kept_for_a_new_dish(self):
+        first = Dish.objects.create(name="First", price=10.50, description="First", preparation_time=15, image=ContentFile(b"photo", name="photo.jpg"))
+        name = first.image.name
+        first.delete()
+        self.assertEqual(self.queued(), {name})
+
+        # the same photo uploaded before the worker ran refers to the stored file and cancels its deletion
+        second = Dish.objects.create(name="Second", price=10.50, description="Second", preparation_time=15, image=ContentFile(b"photo", name="photo.jpg"))
+        self.assertEqual((second.image.name, self.queued()), (name, set()))
+        drain_blob_deletions()
+        self.assertTrue(self.storage.exists(name))
+
+        # deleted by the worker first, it is stored again under the same name
+        second.delete()
+        self.assertEqual(drain_blob_deletions(), 1)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+        third = Dish.objects.create(name="Third", price=10.50, description="Third", preparation_time=15, image=ContentFile(b"photo", name="photo.jpg"))
+        self.assertEqual(third.image.name, name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).reference_count, 1)
+
+    def test_failed_deletions_are_retried_with_backoff(self):
+        dish = self.create_dish("dish_1")
+        Dish.objects.filter(pk=dish.pk).delete()
+        delete = self.storage.delete
+        failing = dish.image.name
+
+        def flaky_delete(name):
+            if name == failing:
+                raise PermissionError(name)
+            delete(name)
+
+        with patch.object(self.storage, "delete", flaky_delete), self.assertLogs("dish", "WARNING") as logs:
+            self.assertEqual(drain_blob_deletions(), 2)
+            deletion = BlobDeletion.objects.get()
+            self.assertEqual((deletion.name, deletion.attempts), (failing, 1))
+            self.assertGreater(deletion.next_attempt_at, timezone.now())
+            # not due yet
+            self.assertEqual(drain_blob_deletions(), 0)
+            self.assertEqual(BlobDeletion.objects.get().attempts, 1)
+
+            for attempt in range(2, BLOB_DELETION_MAX_ATTEMPTS + 1):
+                BlobDeletion.objects.update(next_attempt_at=timezone.now())
+                drain_blob_deletions()
+        self.assertIn(f"ERROR:dish.tasks:Giving up deleting {failing}", logs.output)
+        # given up on, collect_orphan_blobs finds the file later
+        self.assertEqual(self.queued(), set())
+        self.assertTrue(self.storage.exists(failing))
+
+    def test_collect_orphan_blobs(self):
+        dish = self.create_dish("dish_1")
+        orphan = self.store("dish_images/dish_2.jpg")
+        rendition = self.store("dish_images/renditions/dish_2_thumbnail.webp")
+        recent = self.store("dish_images/dish_3.jpg")
+        old = time.time() - timedelta(days=2).total_seconds()
+        for name in self.files(dish) | {orphan, rendition}:
+            os.utime(self.storage.path(name), (old, old))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_orphan_blobs(), 2)
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(self.storage.exists(rendition))
+        self.assertTrue(all(self.storage.exists(name) for name in self.files(dish) | {recent}))
+        self.assertEqual(collect_orphan_blobs(), 0)
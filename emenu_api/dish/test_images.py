@@ -0,0 +1,160 @@
+import hashlib
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from emenu_api.celery import app
+from kombu.exceptions import OperationalError
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .images import RENDITION_SIZES, rendition_formats
+from .models import Blob, Dish
+from .tasks import process_dish_image, process_pending_dish_images
+
+
+def photo(width=3000, height=2000, image_format="JPEG"):
+    image = Image.new("RGB", (width, height), "orange")
+    exif = Image.Exif()
+    # rotated 90 degrees clockwise, with a GPS position
+    exif[0x0112] = 6
+    exif[0x8825] = {1: "N", 2: (52.0, 13.0, 0.0)}
+    buffer = BytesIO()
+    image.save(buffer, image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class DishImageTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = FileSystemStorage(location=location, base_url="/media/")
+        storage = patch.object(Dish._meta.get_field("image"), "storage", self.storage)
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def create_dish(self, content, name="photo.jpg"):
+        data = {"name": "Dish with Image", "price": 20.00, "description": "Description", "preparation_time": 30, "image": SimpleUploadedFile(name, content)}
+        return self.client.post(reverse("dish-list"), data)
+
+    def test_upload_returns_before_renditions(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create_dish(photo())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["renditions"], {})
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        dish = Dish.objects.get(pk=response.data["id"])
+        self.assertEqual(set(dish.renditions), set(RENDITION_SIZES))
+        self.assertEqual(set(dish.renditions["medium"]), set(rendition_formats()))
+
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
+        self.assertEqual(response.json()["renditions"]["thumbnail"]["webp"], f"http://testserver/media/{dish.renditions['thumbnail']['webp']}")
+
+    def test_upload_without_broker(self):
+        count = self.client.get(reverse("dish-list")).json()["count"]
+        with patch.object(process_dish_image, "delay", side_effect=OperationalError), self.assertLogs("dish", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.create_dish(photo(400, 300))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(reverse("dish-list")).json()["count"], count + 1)
+
+        # queued again once it has been waiting for a while
+        dish = Dish.objects.get(pk=response.data["id"])
+        self.assertEqual(process_pending_dish_images(), 0)
+        Dish.objects.filter(pk=dish.pk).update(updated_at=dish.updated_at - timedelta(hours=1))
+        self.assertEqual(process_pending_dish_images(), 1)
+        dish.refresh_from_db()
+        self.assertEqual(set(dish.renditions), set(RENDITION_SIZES))
+        self.assertEqual(process_pending_dish_images(), 0)
+
+    def test_renditions_are_resized_and_stripped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_dish(photo())
+        dish = Dish.objects.get(pk=response.data["id"])
+
+        for size, (width, height, crop) in RENDITION_SIZES.items():
+            with self.storage.open(dish.renditions[size]["webp"]) as file:
+                image = Image.open(file)
+                self.assertEqual(image.format, "WEBP")
+                # portrait once the EXIF orientation is applied
+                self.assertEqual(image.size, (width, height) if crop else (round(height * 2 / 3), height))
+                self.assertEqual(len(image.getexif()), 0)
+                self.assertNotIn("exif", image.info)
+
+    def test_small_png_keeps_transparency(self):
+        buffer = BytesIO()
+        Image.new("RGBA", (100, 50), (255, 0, 0, 0)).save(buffer, "PNG")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_dish(buffer.getvalue(), "logo.png")
+
+        dish = Dish.objects.get(pk=response.data["id"])
+        with self.storage.open(dish.renditions["large"]["webp"]) as file:
+            image = Image.open(file)
+            # never upscaled
+            self.assertEqual((image.size, image.mode), ((100, 50), "RGBA"))
+
+    def test_replaced_or_invalid_image(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create_dish(photo(400, 300))
+        dish = Dish.objects.get(pk=response.data["id"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"image": SimpleUploadedFile("notes.txt", b"not an image")})
+
+        # the upload before the last one finishes late, the dish keeps no renditions of it
+        callbacks[0]()
+        dish.refresh_from_db()
+        self.assertEqual(dish.renditions, {})
+        self.assertFalse(self.storage.exists("dish_images/renditions"))
+
+        # updating other fields leaves the image and its renditions alone
+        process_dish_image(dish.id, dish.image.name)
+        name = dish.image.name
+        self.client.patch(reverse("dish-detail", kwargs={"pk": dish.id}), {"price": "25.00"})
+        dish.refresh_from_db()
+        self.assertEqual(dish.image.name, name)
+
+    def test_identical_photos_are_stored_once(self):
+        content = photo(800, 600)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_dish(content)
+        first = Dish.objects.get(pk=response.data["id"])
+        self.assertEqual(first.image.name, f"dish_images/{hashlib.sha256(content).hexdigest()[:32]}.jpg")
+
+        with patch.object(self.storage, "save", wraps=self.storage.save) as save, self.captureOnCommitCallbacks(execute=True):
+            response = self.create_dish(content, "copy.JPG")
+        second = Dish.objects.get(pk=response.data["id"])
+        # neither the photo nor its renditions are stored again
+        save.assert_not_called()
+        self.assertEqual((second.image.name, second.renditions), (first.image.name, first.renditions))
+        self.assertEqual(Blob.objects.get(name=first.image.name).reference_count, 2)
+
+        # uploading the same photo again keeps the renditions
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("dish-detail", kwargs={"pk": first.id}), {"image": SimpleUploadedFile("again.jpg", content)})
+        first.refresh_from_db()
+        self.assertEqual((first.image.name, first.renditions), (second.image.name, second.renditions))
+
+        files = {second.image.name} | {name for names in second.renditions.values() for name in names.values()}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("dish-detail", kwargs={"pk": first.id}))
+        self.assertTrue(all(self.storage.exists(name) for name in files))
+        self.assertEqual(Blob.objects.get(name=second.image.name).reference_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("dish-detail", kwargs={"pk": second.id}))
+        self.assertFalse(any(self.storage.exists(name) for name in files))
+        self.assertFalse(Blob.objects.exists())
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from dish.filters import DishFilter
+from dish.models import Dish
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.db.models.functions import Now
+from emenu_api.testing import ExplainTestCase
+
+DISHES = 20000
+
+
+class DishIndexTestCase(ExplainTestCase):
+    analyze = [Dish._meta.db_table]
+
+    @classmethod
+    def setUpTestData(cls):
+        Dish.objects.bulk_create(
+            (
+                Dish(
+                    name=f"Zupa {i}" if i % 200 == 0 else f"Danie {i}",
+                    description="Opis dania",
+                    price=f"{(i * 7919) % 1000}.99",
+                    preparation_time=(i * 104729) % 240,
+                    is_vegetarian=i % 200 == 0,
+                )
+                for i in range(DISHES)
+            ),
+            batch_size=5000,
+        )
+        Dish.objects.update(
+            created_at=ExpressionWrapper(Now() - F("id") * timedelta(minutes=1), output_field=DateTimeField()),
+            updated_at=ExpressionWrapper(Now() - ((F("id") * 7919) % DISHES) * timedelta(minutes=1), output_field=DateTimeField()),
+        )
+        super().setUpTestData()
+
+    def filtered(self, **params):
+        return DishFilter(params, queryset=Dish.objects.all()).qs
+
+    def test_default_ordering(self):
+        self.assertUsesIndex(Dish.objects.all()[:10], "dish_updated_at_id_idx")
+
+    def test_filter_by_name(self):
+        self.assertUsesIndex(self.filtered(name="zupa"), "dish_name_trgm_idx")
+
+    def test_filter_by_name_exact(self):
+        self.assertUsesIndex(self.filtered(name__exact="Zupa 200"), "dish_name_id_idx")
+
+    def test_filter_by_price(self):
+        self.assertUsesIndex(self.filtered(price__gte=995), "dish_price_id_idx")
+        self.assertUsesIndex(self.filtered(price__lte=3), "dish_price_id_idx")
+        self.assertUsesIndex(self.filtered(price__exact="500.99"), "dish_price_id_idx")
+
+    def test_filter_by_preparation_time(self):
+        self.assertUsesIndex(self.filtered(preparation_time__gte=239), "dish_preparation_time_id_idx")
+        self.assertUsesIndex(self.filtered(preparation_time__lte=0), "dish_preparation_time_id_idx")
+        self.assertUsesIndex(self.filtered(preparation_time__exact=120), "dish_preparation_time_id_idx")
+
+    def test_filter_by_created_at(self):
+        oldest = Dish.objects.order_by("created_at").values_list("created_at", flat=True)[50]
+        self.assertUsesIndex(self.filtered(created_at__lte=oldest), "dish_created_at_idx")
+        self.assertUsesIndex(self.filtered(created_at__gte=oldest - timedelta(hours=1), created_at__lte=oldest), "dish_created_at_idx")
+
+    def test_filter_by_updated_at(self):
+        newest = Dish.objects.values_list("updated_at", flat=True)[50]
+        self.assertUsesIndex(self.filtered(updated_at__gte=newest), "dish_updated_at_id_idx")
+
+    def test_filter_vegetarian(self):
+        self.assertUsesIndex(self.filtered(is_vegetarian=True), "dish_vegetarian_updated_at_idx")
+
+    def test_filter_vegetarian_price_range(self):
+        self.assertNoSeqScan(self.filtered(is_vegetarian=True, price__gte=500), Dish._meta.db_table)
+
+    def test_filter_name_with_ordering(self):
+        self.assertUsesIndex(self.filtered(name="zupa").order_by("price"), "dish_name_trgm_idx")
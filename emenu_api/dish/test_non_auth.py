@@ -1,5 +1,5 @@
 from dish.models import Dish
-from django.core.cache import caches
+from dish.views import DishViewSet
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -19,6 +19,11 @@ class DishUnauthorizedTestCase(APITestCase):
         response = self.client.post(reverse("dish-list"), data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_bulk_create_dishes_unauthorized(self):
+        data = [{"name": "New Dish", "price": 20.00, "description": "New Description", "preparation_time": 30, "is_vegetarian": True}]
+        response = self.client.post(reverse("dish-bulk"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_get_single_dish_unauthorized(self):
         dish = Dish.objects.first()
         response = self.client.get(reverse("dish-detail", kwargs={"pk": dish.id}))
@@ -59,4 +64,4 @@ class DishUnauthorizedTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def tearDown(self):
-        caches["data"].clear()
+        DishViewSet.cache.clear()
@@ -0,0 +1,58 @@
+from dish.models import Dish
+from dish.views import DishViewSet
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class DishQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.access_token}")
+
+        self.dish = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+
+    def test_list_dishes(self):
+        # user, version, count, page
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("dish-list"), {"ordering": "price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse("dish-list"), {"ordering": "price"})
+
+    def test_get_single_dish(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("dish-detail", kwargs={"pk": self.dish.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse("dish-detail", kwargs={"pk": self.dish.id}))
+
+    def test_create_dish(self):
+        data = {"name": "New Dish", "price": 20.00, "description": "New Description", "preparation_time": 30, "is_vegetarian": True}
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse("dish-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_dish(self):
+        data = {"name": "Updated Dish", "price": 25.00, "description": "Updated Description", "preparation_time": 40, "is_vegetarian": False}
+        with self.assertNumQueries(3):
+            response = self.client.put(reverse("dish-detail", kwargs={"pk": self.dish.id}), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_partial_update_dish(self):
+        with self.assertNumQueries(3):
+            response = self.client.patch(reverse("dish-detail", kwargs={"pk": self.dish.id}), {"price": 30.00})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_dish(self):
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse("dish-detail", kwargs={"pk": self.dish.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def tearDown(self):
+        DishViewSet.cache.clear()
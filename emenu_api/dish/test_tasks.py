@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from unittest.mock import patch
+
+from celery.utils.time import get_exponential_backoff_interval
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from emenu_api.celery import app
+
+from .models import Dish
+from .tasks import REPORT_CHUNK_SIZE, REPORT_MAX_RETRIES, send_dish_report
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    # class attributes, send_dish_report_chunk opens a new backend for every attempt
+    connections = 0
+    fail_once = set()
+    fail_always = set()
+    refused = set()
+
+    def open(self):
+        FlakyEmailBackend.connections += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            recipient = message.to[0]
+            if recipient in self.refused:
+                raise SMTPRecipientsRefused({recipient: (550, b"No such user")})
+            if recipient in self.fail_always or recipient in self.fail_once:
+                self.fail_once.discard(recipient)
+                raise SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="dish.test_tasks.FlakyEmailBackend")
+class DishReportTestCase(TestCase):
+    users = 2 * REPORT_CHUNK_SIZE + 50
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+        FlakyEmailBackend.connections = 0
+        FlakyEmailBackend.fail_once, FlakyEmailBackend.fail_always, FlakyEmailBackend.refused = set(), set(), set()
+
+        User.objects.bulk_create([User(username=f"user{i}", email=f"user{i}@example.com") for i in range(self.users)])
+        User.objects.create(username="no_email")
+        self.dish = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+        Dish.objects.filter(pk=self.dish.pk).update(updated_at=self.dish.updated_at - timedelta(days=1))
+
+    def send_report(self):
+        start = time.perf_counter()
+        chunks = send_dish_report()
+        return chunks, time.perf_counter() - start
+
+    def recipients(self):
+        return [message.to[0] for message in mail.outbox]
+
+    def test_report_sent_once_per_connection_chunk(self):
+        chunks, elapsed = self.send_report()
+        self.assertEqual(chunks, 3)
+        self.assertEqual(FlakyEmailBackend.connections, 3)
+        self.assertEqual(sorted(self.recipients()), sorted(f"user{i}@example.com" for i in range(self.users)))
+        self.assertIn("Test Dish 1", mail.outbox[0].body)
+        self.assertLess(elapsed, 5)
+
+    def test_failed_chunk_retries_remaining_recipients(self):
+        FlakyEmailBackend.fail_once = {"user5@example.com", "user150@example.com"}
+        FlakyEmailBackend.refused = {"user7@example.com"}
+        with patch("dish.tasks.get_exponential_backoff_interval", wraps=get_exponential_backoff_interval) as backoff:
+            chunks, elapsed = self.send_report()
+
+        # nobody gets the report twice and the refused address does not hold up the rest
+        expected = sorted(f"user{i}@example.com" for i in range(self.users) if i != 7)
+        self.assertEqual(sorted(self.recipients()), expected)
+        self.assertEqual(FlakyEmailBackend.connections, chunks + 2)
+        self.assertEqual([call.args[1] for call in backoff.call_args_list], [0, 0])
+        # retries are scheduled with a countdown instead of sleeping in the worker
+        self.assertLess(elapsed, 3)
+
+    def test_persistent_failure_only_affects_its_recipient(self):
+        FlakyEmailBackend.fail_always = {"user10@example.com"}
+        with patch("dish.tasks.get_exponential_backoff_interval", wraps=get_exponential_backoff_interval) as backoff, self.assertLogs("dish", "ERROR") as logs:
+            self.send_report()
+
+        # the rest of the chunk is sent after the last retry
+        recipients = self.recipients()
+        self.assertEqual(sorted(recipients), sorted(f"user{i}@example.com" for i in range(self.users) if i != 10))
+        self.assertEqual([call.args[1] for call in backoff.call_args_list], list(range(REPORT_MAX_RETRIES)))
+        self.assertIn("user10@example.com", logs.output[0])
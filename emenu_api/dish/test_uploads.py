@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from emenu_api.celery import app
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from storages.backends.azure_storage import AzureStorage
+
+from .models import Dish, content_name
+from .uploads import UPLOAD_MAX_SIZE
+
+
+def jpeg():
+    buffer = BytesIO()
+    Image.new("RGB", (800, 600), "green").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class DishImageUploadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        self.dish = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = FileSystemStorage(location=location, base_url="/media/")
+        storage = patch.object(Dish._meta.get_field("image"), "storage", self.storage)
+        storage.start()
+        self.addCleanup(storage.stop)
+
+    def request_upload(self, dish=None, **data):
+        data = {"filename": "photo.JPG", "size": 1024 * 1024, **data}
+        return self.client.post(reverse("dish-image-upload", kwargs={"pk": (dish or self.dish).id}), data, format="json")
+
+    def put(self, upload, content):
+        # presigned, the upload carries no credentials
+        return self.client_class().put(urlsplit(upload["url"]).path, content, content_type="application/octet-stream")
+
+    def complete(self, token, dish=None):
+        return self.client.post(reverse("dish-complete-image-upload", kwargs={"pk": (dish or self.dish).id}), {"token": token}, format="json")
+
+    def test_upload_and_complete(self):
+        upload = self.request_upload().data
+        self.assertEqual((upload["method"], upload["headers"]), ("PUT", {}))
+        content = jpeg()
+        self.assertEqual(self.put(upload, content).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Dish.objects.get(pk=self.dish.pk).image.name, "")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.complete(upload["token"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        uploaded = urlsplit(response.data["image"]).path.removeprefix("/media/")
+        self.assertRegex(uploaded, r"^dish_images/dish_\d{14}_[0-9a-f]{16}\.jpg$")
+        # completing again, e.g. after a lost response, changes nothing
+        with self.captureOnCommitCallbacks() as repeated:
+            self.assertEqual(self.complete(upload["token"]).status_code, status.HTTP_200_OK)
+        self.assertEqual(repeated, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+        # moved to its content name by process_dish_image, the temporary upload is deleted
+        self.dish.refresh_from_db()
+        self.assertEqual(self.dish.image.name, f"dish_images/{content_name(ContentFile(content, 'photo.jpg'))}")
+        self.assertFalse(self.storage.exists(uploaded))
+        with self.storage.open(self.dish.image.name) as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(set(self.dish.renditions), {"thumbnail", "medium", "large"})
+
+        # the dish is served fresh, not from the cache
+        response = self.client.get(reverse("dish-detail", kwargs={"pk": self.dish.id}))
+        self.assertEqual(response.data["image"], f"http://testserver/media/{self.dish.image.name}")
+
+    def test_upload_url_is_single_use_and_bounded(self):
+        upload = self.request_upload(size=100).data
+        self.assertEqual(self.put(upload, b"x" * 101).status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.put(upload, b"x" * 100).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.put(upload, b"y" * 100).status_code, status.HTTP_409_CONFLICT)
+
+        upload["url"] = upload["url"].replace("/uploads/", "/uploads/x")
+        self.assertEqual(self.put(upload, b"x").status_code, status.HTTP_403_FORBIDDEN)
+        upload = self.request_upload().data
+        with patch("dish.uploads.UPLOAD_EXPIRY", -1):
+            self.assertEqual(self.put(upload, b"x").status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_completion(self):
+        other = Dish.objects.create(name="Test Dish 2", price=12.50, description="Test Description 2", preparation_time=20)
+        upload = self.request_upload().data
+
+        response = self.complete(upload["token"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["token"][0].code, "not_uploaded")
+
+        self.put(upload, jpeg())
+        for token, dish in [(upload["token"], other), (upload["token"] + "x", self.dish)]:
+            response = self.complete(token, dish)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data["token"][0].code, "invalid")
+        with patch("dish.uploads.UPLOAD_COMPLETE_WITHIN", -1):
+            self.assertEqual(self.complete(upload["token"]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        with patch("dish.views.UPLOAD_MAX_SIZE", 10):
+            response = self.complete(upload["token"])
+        self.assertEqual(response.data["token"][0].code, "too_large")
+        self.assertFalse(self.storage.listdir("dish_images")[1])
+        self.assertFalse(Dish.objects.get(pk=self.dish.pk).image)
+
+    def test_invalid_upload_request(self):
+        for data in [{"filename": "photo"}, {"filename": "../photo.jpg"}, {"size": UPLOAD_MAX_SIZE + 1}, {"size": 0}]:
+            response = self.request_upload(**data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+        self.assertEqual(self.client.post(reverse("dish-image-upload", kwargs={"pk": 0}), {}, format="json").status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.credentials()
+        self.assertEqual(self.request_upload().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_azure_upload_url(self):
+        storage = AzureStorage(account_name="emenu", account_key="a2V5", azure_container="media", expiration_secs=None)
+        with patch.object(Dish._meta.get_field("image"), "storage", storage):
+            upload = self.request_upload(content_type="image/jpeg").data
+
+        url = urlsplit(upload["url"])
+        self.assertEqual(url.netloc, "emenu.blob.core.windows.net")
+        self.assertRegex(url.path, r"^/media/dish_images/dish_\d{14}_[0-9a-f]{16}\.jpg$")
+        # create only, the SAS can not read or overwrite blobs
+        self.assertEqual(parse_qs(url.query)["sp"], ["c"])
+        self.assertEqual(upload["headers"], {"x-ms-blob-type": "BlockBlob", "x-ms-blob-content-type": "image/jpeg"})
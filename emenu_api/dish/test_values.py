@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from dish.models import Dish
+from dish.views import DishViewSet
+from django.contrib.auth.models import User
+from django.urls import reverse
+from emenu_api.testing import ValuesParityMixin
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class DishValuesParityTestCase(ValuesParityMixin, APITestCase):
+    viewset = DishViewSet
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.access_token}")
+
+        self.dish = Dish.objects.create(name="Żurek", price=10.5, description="Zupa \"na zakwasie\"\n", preparation_time=15, is_vegetarian=False)
+        Dish.objects.filter(pk=self.dish.id).update(image="dish_images/dish_20240101120000.jpg")
+        # Azure builds blob URLs from the account settings, which tests do not have
+        storage_url = patch.object(Dish._meta.get_field("image").storage, "url", lambda name: f"/media/{name}")
+        storage_url.start()
+        self.addCleanup(storage_url.stop)
+
+    def test_list_dishes(self):
+        self.assertSameResponse(reverse("dish-list"))
+        self.assertSameResponse(reverse("dish-list"), {"page": 2})
+
+    def test_list_dishes_filtered_and_ordered(self):
+        self.assertSameResponse(reverse("dish-list"), {"ordering": "-price", "is_vegetarian": True})
+        self.assertSameResponse(reverse("dish-list"), {"ordering": "name", "name": "pizza"})
+        self.assertSameResponse(reverse("dish-list"), {"price__gte": "10.50", "fields": "id,price,image"})
+
+    def test_list_dishes_cursor_pages(self):
+        response = self.assertSameResponse(reverse("dish-list"), {"pagination": "cursor", "ordering": "preparation_time"})
+        while response.data["next"]:
+            response = self.assertSameResponse(response.data["next"])
+
+    def test_get_single_dish(self):
+        response = self.assertSameResponse(reverse("dish-detail", kwargs={"pk": self.dish.id}))
+        self.assertEqual(response.data["price"], "10.50")
+        self.assertEqual(response.data["image"], "http://testserver/media/dish_images/dish_20240101120000.jpg")
+
+        self.assertSameResponse(reverse("dish-detail", kwargs={"pk": self.dish.id}), {"omit": "image,description"})
+        self.assertSameResponse(reverse("dish-detail", kwargs={"pk": Dish.objects.exclude(pk=self.dish.id).first().id}))
+
+    def test_get_missing_dish(self):
+        response = self.assertSameResponse(reverse("dish-detail", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
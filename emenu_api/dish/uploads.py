@@ -0,0 +1,110 @@
+import posixpath
+import secrets
+from datetime import timedelta
+
+from azure.storage.blob import BlobClient, BlobSasPermissions, generate_blob_sas
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from storages.backends.azure_storage import AzureStorage
+
+from .models import Dish
+
+# seconds a presigned upload URL stays valid, the client then has UPLOAD_COMPLETE_WITHIN to complete the upload
+UPLOAD_EXPIRY = 15 * 60
+UPLOAD_COMPLETE_WITHIN = 60 * 60
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_SALT = "dish.uploads.upload"
+LOCAL_UPLOAD_SALT = "dish.uploads.local"
+
+
+def image_storage():
+    return Dish._meta.get_field("image").storage
+
+
+def upload_name(filename):
+    """
+    A new, unguessable name in the dish image directory for a file called filename.
+    """
+    extension = posixpath.splitext(filename)[1].lower()
+    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    return Dish._meta.get_field("image").generate_filename(None, f"dish_{timestamp}_{secrets.token_hex(8)}{extension}")
+
+
+def azure_upload_url(storage, name, content_type):
+    # create only, a SAS for one upload can not overwrite an image that is already stored
+    name = storage._get_valid_path(name)
+    expiry = storage._expire_at(UPLOAD_EXPIRY)
+    sas_token = generate_blob_sas(
+        storage.account_name,
+        storage.azure_container,
+        name,
+        account_key=storage.account_key,
+        user_delegation_key=storage.get_user_delegation_key(expiry),
+        permission=BlobSasPermissions(create=True),
+        expiry=expiry,
+    )
+    # the blob endpoint itself, a custom domain may be a read only CDN
+    url = BlobClient.from_blob_url(storage.client.get_blob_client(name).url, credential=sas_token).url
+    return {"url": url, "method": "PUT", "headers": {"x-ms-blob-type": "BlockBlob", "x-ms-blob-content-type": content_type}}
+
+
+def local_upload_url(request, name, size):
+    token = signing.dumps({"name": name, "size": size}, salt=LOCAL_UPLOAD_SALT)
+    return {"url": request.build_absolute_uri(reverse("dish-local-upload", kwargs={"token": token})), "method": "PUT", "headers": {}}
+
+
+def presigned_upload(request, dish, filename, content_type, size):
+    """
+    Where and how the client uploads the image: a create-only SAS URL on Azure, a signed URL of LocalUploadView on
+    any other storage. The returned token identifies the upload when the client completes it
+    for the dish.
+    """
+    storage = image_storage()
+    name = upload_name(filename)
+    if isinstance(storage, AzureStorage):
+        upload = azure_upload_url(storage, name, content_type)
+    else:
+        upload = local_upload_url(request, name, size)
+    upload["token"] = signing.dumps({"dish": dish.id, "name": name}, salt=UPLOAD_SALT)
+    upload["expires_at"] = timezone.now() + timedelta(seconds=UPLOAD_EXPIRY)
+    return upload
+
+
+def uploaded_name(token, dish):
+    """
+    The name presigned_upload issued the token for, raises signing.BadSignature for an invalid or expired token
+    or a token issued for another dish.
+    """
+    upload = signing.loads(token, salt=UPLOAD_SALT, max_age=UPLOAD_COMPLETE_WITHIN)
+    if upload["dish"] != dish.id:
+        raise signing.BadSignature("The upload is for another dish.")
+    return upload["name"]
+
+
+class LocalUploadView(APIView):
+    """
+    Stands in for the blob service when the images are not stored on Azure: a PUT of the raw image to the signed
+    URL from presigned_upload stores it under the issued name, once, and only while the URL is valid.
+    """
+
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def put(self, request, token):
+        try:
+            upload = signing.loads(token, salt=LOCAL_UPLOAD_SALT, max_age=UPLOAD_EXPIRY)
+        except signing.BadSignature:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        storage = image_storage()
+        if storage.exists(upload["name"]):
+            return Response(status=status.HTTP_409_CONFLICT)
+        content = request.stream.read(upload["size"] + 1) if request.stream is not None else b""
+        if len(content) > upload["size"]:
+            return Response(status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        storage.save(upload["name"], ContentFile(content))
+        return Response(status=status.HTTP_201_CREATED)
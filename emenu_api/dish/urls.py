@@ -1,11 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .uploads import LocalUploadView
 from .views import DishViewSet
 
 router = DefaultRouter()
 router.register(r"", DishViewSet)
 
 urlpatterns = [
+    path("uploads/<str:token>/", LocalUploadView.as_view(), name="dish-local-upload"),
     path("", include(router.urls)),
 ]
@@ -1,61 +1,87 @@
+from functools import partial
+
 from dish.models import Dish
-from django.core.cache import caches
+from django.core import signing
 from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, status, viewsets
+from emenu_api.cache import DISH_DETAIL, DISH_LIST, MENU_LIST, CachedViewMixin, canonical_query, dish_tag, menu_tag, projection_suffix, version_etag
+from emenu_api.pagination import OptionalKeysetPagination
+from emenu_api.search import SearchViewMixin
+from emenu_api.values import ValuesReadMixin
+from menu.models import Menu
+from rest_framework import filters, permissions, serializers, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .filters import DishFilter
-from .serializers import DishSerializer
+from .serializers import DishImageCompleteSerializer, DishImageUploadSerializer, DishSerializer, DishValuesSerializer
+from .tasks import schedule_blob_deletions, schedule_dish_image
+from .uploads import UPLOAD_MAX_SIZE, image_storage, presigned_upload, uploaded_name
 
 
-class DishViewSet(viewsets.ModelViewSet):
-    queryset = Dish.objects.all()
+class DishViewSet(CachedViewMixin, SearchViewMixin, ValuesReadMixin, viewsets.ModelViewSet):
+    queryset = Dish.objects.defer("search_vector")
     serializer_class = DishSerializer
+    values_serializer_class = DishValuesSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = DishFilter
     ordering_fields = ["name", "price", "preparation_time"]
-    cache = caches["data"]
+    pagination_class = OptionalKeysetPagination
+    bulk_max_size = 1000
 
     def get_permissions(self):
         return [permissions.IsAuthenticated()]
 
     def get_cache_key(self, request, *args, **kwargs):
-        return f"dish_list_{request.query_params}"
+        return f"dish_list_{canonical_query(self, request)}"
+
+    def get_list_version(self, cache_key):
+        version = self.filter_queryset(self.get_queryset()).aggregate(last_modified=Max("updated_at"), count=Count("id"))
+        return version_etag(cache_key, version["last_modified"], version["count"]), None
+
+    def get_detail_version(self, cache_key, pk):
+        if not str(pk).isdigit():
+            return None, None
+        updated_at = Dish.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            return None, None
+        return version_etag(cache_key, updated_at), updated_at
+
+    def get_detail_cache_key(self, request, pk):
+        return f"dish_detail_{pk}{projection_suffix(self, request)}"
 
     def list(self, request, *args, **kwargs):
         cache_key = self.get_cache_key(request, *args, **kwargs)
-        cache_dishes = self.cache.get(cache_key)
-
-        if not cache_dishes:
-            response = super().list(request, *args, **kwargs)
-            self.cache.set(cache_key, response.data)
-            return response
-        return Response(cache_dishes)
+        cache_keys = self.cache.generation_keys(DISH_LIST, cache_key)
+        get_response = partial(super().list, request, *args, **kwargs)
+        get_version = partial(self.get_list_version, cache_key)
+        return self.cached_response(request, DISH_LIST, cache_keys, get_response, [DISH_LIST], get_version)
 
     def retrieve(self, request, *args, **kwargs):
-        cache_key = f'dish_detail_{kwargs["pk"]}'
-        cache_dish = self.cache.get(cache_key)
-        if not cache_dish:
-            response = super().retrieve(request, *args, **kwargs)
-            self.cache.set(cache_key, response.data)
-            return response
-        return Response(cache_dish)
-
-    def clear_cache(self, dish_id):
-        dish_detail_key = f"dish_detail_{dish_id}"
-        cache_patterns = [
-            "dish_list_*",
-            "menu_list_*",
-            "menu_detail_*",
-        ]  # if you want to optimise menu_detail you can take dish_id, where dish in mensu exists nd clean only few details
-        with transaction.atomic():
-            for pattern in cache_patterns:
-                self.cache.delete_pattern(pattern)
-
-            detail_to_delete = self.cache.get(dish_detail_key)
-            if detail_to_delete:
-                self.cache.delete(dish_detail_key)
+        cache_key = self.get_detail_cache_key(request, kwargs["pk"])
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        get_version = partial(self.get_detail_version, cache_key, kwargs["pk"])
+        return self.cached_response(request, DISH_DETAIL, [cache_key], get_response, [dish_tag(kwargs["pk"])], get_version)
+
+    def clear_cache(self, *dish_ids):
+        # menu lists and details embedding these dishes are tagged with them, unrelated menus stay cached
+        self.cache.bump_generation(DISH_LIST)
+        self.cache.invalidate(*[dish_tag(dish_id) for dish_id in dish_ids])
+
+    def touch_menus(self, dish_ids):
+        # menus listing the dishes change with them, keep their updated_at (and Last-Modified) honest
+        menu_ids = list(Menu.objects.filter(dishes__in=dish_ids).values_list("id", flat=True).distinct())
+        if menu_ids:
+            Menu.objects.filter(pk__in=menu_ids).update(updated_at=timezone.now())
+        return menu_ids
+
+    def clear_menu_cache(self, menu_ids):
+        # projections without the dishes (e.g. only dishes_count) are tagged with the menu alone
+        if menu_ids:
+            self.cache.bump_generation(MENU_LIST)
+            self.cache.invalidate(*[menu_tag(menu_id) for menu_id in menu_ids])
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -67,14 +93,120 @@ class DishViewSet(viewsets.ModelViewSet):
         self.clear_cache(response.data.get("id"))
         return response
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.process_image(serializer)
+
+    def perform_update(self, serializer):
+        replaced_image = "image" in serializer.validated_data and serializer.instance.image
+        super().perform_update(serializer)
+        self.process_image(serializer)
+        if replaced_image:
+            schedule_blob_deletions()
+
+    def process_image(self, serializer):
+        # the response does not wait for the renditions, a worker makes them once the upload is committed
+        dish = serializer.instance
+        if serializer.validated_data.get("image") and dish.image:
+            schedule_dish_image(dish.id, dish.image.name)
+
+    @action(detail=True, methods=["post"], url_path="image-upload")
+    def image_upload(self, request, pk=None):
+        """
+        Issues a short-lived URL the client uploads the image to directly, the image bytes never go through the API.
+        """
+        dish = self.get_object()
+        serializer = DishImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(presigned_upload(request, dish, **serializer.validated_data), status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"], url_path="image-upload/complete")
+    def complete_image_upload(self, request, pk=None):
+        """
+        Attaches the image uploaded with the token from image_upload to the dish.
+        """
+        dish = self.get_object()
+        serializer = DishImageCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            name = uploaded_name(serializer.validated_data["token"], dish)
+        except signing.BadSignature:
+            raise serializers.ValidationError({"token": ["Invalid or expired upload token."]}, code="invalid")
+        storage = image_storage()
+        if not storage.exists(name):
+            raise serializers.ValidationError({"token": ["The image has not been uploaded."]}, code="not_uploaded")
+        if storage.size(name) > UPLOAD_MAX_SIZE:
+            storage.delete(name)
+            raise serializers.ValidationError({"token": ["The image is too large."]}, code="too_large")
+
+        # completing the same upload again, e.g. after a lost response, changes nothing
+        if dish.image.name != name:
+            if dish.image:
+                schedule_blob_deletions()
+            dish.image, dish.renditions = name, {}
+            dish.save(update_fields=["image", "renditions", "updated_at"])
+            schedule_dish_image(dish.id, name)
+            self.clear_cache(dish.id)
+        return Response(self.get_serializer(dish).data)
+
+    def perform_destroy(self, instance):
+        menu_ids = self.touch_menus([instance.id])
+        super().perform_destroy(instance)
+        self.clear_menu_cache(menu_ids)
+        # the dish_blob_references trigger has queued the image unless other dishes show it, a worker deletes it
+        if instance.image:
+            schedule_blob_deletions()
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        return self.get_serializer(*args, many=True, allow_empty=False, max_length=self.bulk_max_size, **kwargs)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        serializer = self.get_bulk_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        # new dishes are in no menu yet, only dish lists change
+        self.cache.bump_generation(DISH_LIST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request):
+        items = request.data if isinstance(request.data, list) else []
+        ids = [item.get("id") for item in items if isinstance(item, dict) and str(item.get("id")).isdigit()]
+        serializer = self.get_bulk_serializer(Dish.objects.in_bulk(ids), data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            dishes = serializer.save()
+        self.clear_cache(*{dish.id for dish in dishes})
+        return Response(serializer.data)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request):
+        field = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=self.bulk_max_size)
+        try:
+            ids = field.run_validation(request.data.get("ids", serializers.empty) if isinstance(request.data, dict) else serializers.empty)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({"ids": exc.detail})
+        existing = dict(Dish.objects.filter(pk__in=ids).values_list("pk", "image"))
+        errors = {index: ["Not found."] for index, dish_id in enumerate(ids) if dish_id not in existing}
+        if errors:
+            raise serializers.ValidationError({"ids": errors})
+
+        with transaction.atomic():
+            menu_ids = self.touch_menus(existing)
+            Dish.objects.filter(pk__in=existing).delete()
+            if any(existing.values()):
+                schedule_blob_deletions()
+        self.clear_cache(*existing)
+        self.clear_menu_cache(menu_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance_id = instance.id
 
-        try:
-            response = super().destroy(request, *args, **kwargs)
-        except Exception:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        response = super().destroy(request, *args, **kwargs)
 
         self.clear_cache(instance_id)
 
@@ -10,7 +10,21 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emenu_api.settings')
 
+
+class AsyncReadRequest(ASGIRequest):
+    # the reads of menus and dishes go to the async views, every other request to the routes of emenu_api.urls
+    urlconf = "emenu_api.asgi_urls"
+
+
 application = get_asgi_application()
+
+# opt-in, uvicorn emenu_api.asgi:async_read_application. On one CPU against a local Redis it serves fewer cached
+# reads per second than application: Django 4.2 runs every middleware hook, and here the authenticators, in a
+# thread. It is kept for deployments where a cache hit waits on a remote Redis, which the event loop waits on
+# without a thread; measure it there with python -m benchmarks.asgi_wsgi before switching
+async_read_application = get_asgi_application()
+async_read_application.request_class = AsyncReadRequest
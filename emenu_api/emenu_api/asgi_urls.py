@@ -0,0 +1,22 @@
+from dish.urls import router as dish_router
+from django.urls import re_path
+from menu.urls import router as menu_router
+
+from . import urls
+from .async_views import AsyncCachedReadView
+from .cache import DISH_DETAIL, DISH_LIST, MENU_DETAIL, MENU_LIST
+
+
+def async_read_path(route, router, name, endpoint):
+    # the viewset views the router built for emenu_api.urls, other methods and cache misses are served by them
+    viewset_view = next(url.callback for url in router.urls if url.name == name)
+    return re_path(route, AsyncCachedReadView.as_view(viewset_view=viewset_view, endpoint=endpoint), name=name)
+
+
+# the URLconf of the ASGI application, emenu_api.urls with the cached reads of menus and dishes served async
+urlpatterns = [
+    async_read_path(r"^api/menu/$", menu_router, "menu-list", MENU_LIST),
+    async_read_path(r"^api/menu/(?P<pk>[^/.]+)/$", menu_router, "menu-detail", MENU_DETAIL),
+    async_read_path(r"^api/dish/$", dish_router, "dish-list", DISH_LIST),
+    async_read_path(r"^api/dish/(?P<pk>[^/.]+)/$", dish_router, "dish-detail", DISH_DETAIL),
+] + urls.urlpatterns
@@ -0,0 +1,111 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views import View
+from rest_framework.exceptions import APIException
+
+from .cache import conditional_response, serve_entry, should_refresh_early
+
+
+async def aauthenticate(request):
+    """
+    Runs the authenticators of the view on the DRF request in a thread, which sets request.user and request.auth.
+    Returns False when the credentials are not valid, the viewset then authenticates the request itself and
+    answers with its usual error.
+    """
+    try:
+        await sync_to_async(getattr)(request, "user")
+    except APIException:
+        return False
+    return True
+
+
+class AsyncCachedReadView(View):
+    """
+    Serves the list or detail route of a CachedViewMixin viewset on the event loop when the viewset is not needed:
+    fresh cache hits, read over the asyncio Redis client, and conditional requests matching the version of the
+    data, read in a single query. Misses, stale entries and every other method run viewset_view in a thread.
+    """
+
+    viewset_view = None
+    endpoint = None
+    # every method goes through dispatch(), there are no handlers for View to inspect
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # as for APIView, the viewset enforces CSRF for session authentication itself
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            response = await self.cached_response(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await sync_to_async(self.viewset_view)(request, *args, **kwargs)
+
+    def get_viewset(self, request, *args, **kwargs):
+        # what ViewSetMixin.as_view() and APIView.initial() do, short of authenticating
+        viewset = self.viewset_view.cls(**self.viewset_view.initkwargs)
+        viewset.action_map = self.viewset_view.actions
+        for method, action in viewset.action_map.items():
+            setattr(viewset, method, getattr(viewset, action))
+        viewset.args, viewset.kwargs = args, kwargs
+        viewset.request = request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        viewset.format_kwarg = viewset.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = viewset.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = viewset.determine_version(request, *args, **kwargs)
+        return viewset
+
+    async def cached_response(self, request, *args, **kwargs):
+        """
+        The response of viewset_view when it is served without building it, None otherwise.
+        """
+        if not settings.DATA_CACHE["RENDERED_RESPONSES"]:
+            return None
+        try:
+            viewset = self.get_viewset(request, *args, **kwargs)
+            request = viewset.request
+            if request.accepted_renderer.format != "json" or not await aauthenticate(request):
+                return None
+            viewset.check_permissions(request)
+            viewset.check_throttles(request)
+            response = await self.cached_entry_response(viewset, request, kwargs)
+        except APIException:
+            return None
+        if response is None:
+            return None
+        return viewset.finalize_response(request, response, *args, **kwargs)
+
+    async def cached_entry_response(self, viewset, request, kwargs):
+        cache = viewset.cache
+        if viewset.action == "list":
+            cache_key = viewset.get_cache_key(request)
+            cache_keys = await cache.ageneration_keys(self.endpoint, cache_key)
+        else:
+            cache_key = viewset.get_detail_cache_key(request, kwargs["pk"])
+            cache_keys = [cache_key]
+
+        cached = await cache.aget_entry(cache_keys[0])
+        if cached is None and cache_keys[1:]:
+            cached = await cache.aget_any_entry(cache_keys[1:])
+        if cached is not None:
+            if not cached["fresh"] or should_refresh_early(cached, settings.DATA_CACHE["XFETCH_BETA"]):
+                return None
+            await cache.arecord(self.endpoint, True)
+            return serve_entry(request, cached["value"])
+
+        # a miss is built by the viewset, unless the client holds the current version already
+        if "HTTP_IF_NONE_MATCH" not in request.META and "HTTP_IF_MODIFIED_SINCE" not in request.META:
+            return None
+        # the async ORM of Django 4.2 runs its queries in a thread all the same, the viewset's version query does too
+        if viewset.action == "list":
+            etag, last_modified = await sync_to_async(viewset.get_list_version)(cache_key)
+        else:
+            etag, last_modified = await sync_to_async(viewset.get_detail_version)(cache_key, kwargs["pk"])
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            await cache.arecord(self.endpoint, False)
+        return not_modified
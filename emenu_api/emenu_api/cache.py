@@ -0,0 +1,635 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import random
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django_redis import get_redis_connection
+from kombu.exceptions import OperationalError
+from redis import asyncio as aioredis
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
+
+from .pagination import OptionalKeysetPagination
+from .serializers import Projection
+from .tasks import refresh_cached_response
+
+logger = logging.getLogger(__name__)
+
+TAG_VERSION_KEY = "tag_version_{}"
+TAG_BUMPED_KEY = "tag_bumped_{}_{}"
+LOCK_KEY = "lock_{}"
+INVALIDATION_CHANNEL = "invalidation"
+STATS_KEY = "cache_stats_{}_{}"
+DISH_LIST = "dish_list"
+DISH_DETAIL = "dish_detail"
+MENU_LIST = "menu_list"
+MENU_DETAIL = "menu_detail"
+CACHED_ENDPOINTS = [DISH_LIST, DISH_DETAIL, MENU_LIST, MENU_DETAIL]
+
+
+def dish_tag(dish_id):
+    return f"dish_{dish_id}"
+
+
+def menu_tag(menu_id):
+    return f"menu_{menu_id}"
+
+
+def _normalize_query_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).isoformat()
+    if isinstance(value, (list, tuple)):
+        return ",".join(_normalize_query_value(item) for item in value)
+    return str(value)
+
+
+def canonical_query(view, request):
+    """
+    Reduces the query string of a list request to the parameters that can change its result: cleaned
+    filterset values, valid ordering terms, the page or cursor and the projection. Unknown or empty parameters
+    and the order in which they were sent do not produce separate cache entries.
+    """
+    params = {}
+
+    filterset = view.filterset_class(request.query_params)
+    form = filterset.form
+    form.is_valid()
+    for name in filterset.filters:
+        if name in form.cleaned_data:
+            value = form.cleaned_data[name]
+        else:
+            value = request.query_params.getlist(name)
+        if value not in (None, "", []):
+            params[name] = _normalize_query_value(value)
+
+    for backend in view.filter_backends:
+        if issubclass(backend, OrderingFilter):
+            ordering = backend().get_ordering(request, None, view)
+            if ordering:
+                params[backend.ordering_param] = ",".join(ordering)
+
+    paginator = view.paginator
+    if isinstance(paginator, OptionalKeysetPagination) and paginator.uses_keyset(request):
+        params[paginator.mode_query_param] = "cursor"
+        cursor = request.query_params.get(paginator.keyset_class.cursor_query_param)
+        if cursor:
+            params[paginator.keyset_class.cursor_query_param] = cursor
+    elif paginator is not None:
+        page = request.query_params.get(paginator.page_query_param, "1")
+        if page != "1":
+            params[paginator.page_query_param] = page
+        if paginator.page_size_query_param:
+            page_size = paginator.get_page_size(request)
+            if page_size != paginator.page_size:
+                params[paginator.page_size_query_param] = str(page_size)
+
+    params.update(Projection.from_request(request, view.get_serializer_class()).query_params())
+
+    return hashlib.sha256(urlencode(sorted(params.items())).encode()).hexdigest()[:32]
+
+
+def projection_suffix(view, request):
+    """
+    Distinguishes detail cache keys by the ?fields=, ?omit= and ?expand= projection, empty for full responses.
+    """
+    params = Projection.from_request(request, view.get_serializer_class()).query_params()
+    if not params:
+        return ""
+    return "_" + hashlib.sha256(urlencode(sorted(params.items())).encode()).hexdigest()[:16]
+
+
+LocalItem = namedtuple("LocalItem", ["value", "tags", "size", "expires"])
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU in front of the shared cache, sized by the pickled size of its items. Items are
+    dropped as soon as one of their tags is invalidated or after DATA_CACHE["LOCAL_TTL"] seconds, which bounds
+    staleness when an invalidation message from another worker is missed.
+    """
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.tag_index = defaultdict(set)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            if item.expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.items.move_to_end(key)
+            return item.value
+
+    def set(self, key, value, tags, size=None):
+        max_bytes = settings.DATA_CACHE["LOCAL_MAX_BYTES"]
+        if size is None:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > max_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.items[key] = LocalItem(value, tags, size, time.monotonic() + settings.DATA_CACHE["LOCAL_TTL"])
+            for tag in tags:
+                self.tag_index[tag].add(key)
+            self.size += size
+            while self.size > max_bytes:
+                self._remove(next(iter(self.items)))
+
+    def evict_tags(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tag_index.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.tag_index.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        item = self.items.pop(key, None)
+        if item is None:
+            return
+        self.size -= item.size
+        for tag in item.tags:
+            keys = self.tag_index[tag]
+            keys.discard(key)
+            if not keys:
+                del self.tag_index[tag]
+
+
+class TaggedCache:
+    """
+    Entries remember the version of every tag they were built from. Invalidating a tag only bumps
+    its version, so stale entries are detected on read instead of being searched for and deleted.
+    Fresh entries and tag versions are also kept in a per-process LocalCache, kept in sync across
+    workers by publishing invalidated tags over Redis pub/sub. The a-prefixed reads serve async views over an
+    asyncio Redis client, one per event loop.
+    """
+
+    def __init__(self, alias="data"):
+        self.alias = alias
+        self.cache = caches[alias]
+        self.local = LocalCache()
+        self.subscriber_pid = None
+        self.subscriber_lock = threading.Lock()
+        self.pending_stats = defaultdict(int)
+        self.stats_lock = threading.Lock()
+        self.stats_flushed_at = time.monotonic()
+        # an asyncio connection pool is bound to the event loop it was created on
+        self.async_clients = weakref.WeakKeyDictionary()
+
+    def _redis(self):
+        try:
+            return get_redis_connection(self.alias)
+        except NotImplementedError:
+            return None
+
+    def _async_redis(self):
+        if self._redis() is None:
+            return None
+        loop = asyncio.get_running_loop()
+        client = self.async_clients.get(loop)
+        if client is None:
+            location = settings.CACHES[self.alias]["LOCATION"]
+            client = self.async_clients[loop] = aioredis.Redis.from_url(location[0] if isinstance(location, (list, tuple)) else location)
+        return client
+
+    def _channel(self):
+        return self.cache.make_key(INVALIDATION_CHANNEL)
+
+    def _on_invalidation(self, message):
+        self.local.evict_tags(json.loads(message["data"]))
+
+    def subscribe(self):
+        # subscriber threads do not survive a fork, every worker process starts its own
+        if self.subscriber_pid == os.getpid():
+            return
+        with self.subscriber_lock:
+            if self.subscriber_pid == os.getpid():
+                return
+            self.local.clear()
+            client = self._redis()
+            if client is not None:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self._channel(): self._on_invalidation})
+                pubsub.run_in_thread(sleep_time=1, daemon=True)
+            self.subscriber_pid = os.getpid()
+
+    async def asubscribe(self):
+        if self.subscriber_pid != os.getpid():
+            await sync_to_async(self.subscribe, thread_sensitive=False)()
+
+    def clear(self):
+        self.cache.clear()
+        self.local.clear()
+        with self.stats_lock:
+            self.pending_stats.clear()
+
+    def _version_keys(self, tags):
+        return {tag: TAG_VERSION_KEY.format(tag) for tag in tags}
+
+    def get_versions(self, tags):
+        keys = self._version_keys(tags)
+        stored = self.cache.get_many(list(keys.values()))
+        return {tag: stored.get(key, 0) for tag, key in keys.items()}
+
+    async def aget_many(self, keys):
+        """
+        cache.get_many() over the asyncio Redis client, values are decoded by the django-redis client of the cache.
+        """
+        client = self._async_redis()
+        if client is None:
+            return await sync_to_async(self.cache.get_many)(keys)
+        values = await client.mget([self.cache.make_key(key) for key in keys])
+        return {key: self.cache.client.decode(value) for key, value in zip(keys, values) if value is not None}
+
+    async def aget_versions(self, tags):
+        keys = self._version_keys(tags)
+        stored = await self.aget_many(list(keys.values()))
+        return {tag: stored.get(key, 0) for tag, key in keys.items()}
+
+    def _stale_tags(self, entry, current):
+        tags = entry["tags"]
+        stale_tags = [tag for tag, version in tags.items() if current[tag] != version]
+        entry["fresh"] = not stale_tags
+        # the entry went stale when the first of its tags moved past the recorded version
+        return [TAG_BUMPED_KEY.format(tag, tags[tag] + 1) for tag in stale_tags]
+
+    def _inspect(self, entry):
+        if entry is None:
+            return None
+        bumped_keys = self._stale_tags(entry, self.get_versions(entry["tags"]) if entry["tags"] else {})
+        if bumped_keys:
+            bumped = self.cache.get_many(bumped_keys)
+            entry["stale_since"] = min(bumped.get(key, 0) for key in bumped_keys)
+        return entry
+
+    async def _ainspect(self, entry):
+        if entry is None:
+            return None
+        bumped_keys = self._stale_tags(entry, await self.aget_versions(entry["tags"]) if entry["tags"] else {})
+        if bumped_keys:
+            bumped = await self.aget_many(bumped_keys)
+            entry["stale_since"] = min(bumped.get(key, 0) for key in bumped_keys)
+        return entry
+
+    def get_entry(self, key):
+        self.subscribe()
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self._inspect(self.cache.get(key))
+            if entry is not None and entry["fresh"]:
+                self.local.set(key, entry, entry["tags"])
+        return entry
+
+    async def aget_entry(self, key):
+        await self.asubscribe()
+        entry = self.local.get(key)
+        if entry is None:
+            entry = await self._ainspect((await self.aget_many([key])).get(key))
+            if entry is not None and entry["fresh"]:
+                self.local.set(key, entry, entry["tags"])
+        return entry
+
+    def get_any_entry(self, keys):
+        entries = self.cache.get_many(keys)
+        return self._inspect(next((entries[key] for key in keys if key in entries), None))
+
+    async def aget_any_entry(self, keys):
+        entries = await self.aget_many(keys)
+        return await self._ainspect(next((entries[key] for key in keys if key in entries), None))
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is None or not entry["fresh"]:
+            return None
+        return entry["value"]
+
+    def set(self, key, value, tags=(), delta=0, versions=None, built_since=None):
+        """
+        versions are the tag versions read before value was built, a tag invalidated while it was built then leaves
+        the entry stale. Tags only known from the value are read now, when the version of one of them was bumped
+        after built_since (time.time() as building began) its previous version is recorded instead.
+        """
+        versions = dict(versions or {})
+        late = set(tags) - versions.keys()
+        if late:
+            current = self.get_versions(late)
+            if built_since is not None:
+                bumped_keys = {tag: TAG_BUMPED_KEY.format(tag, version) for tag, version in current.items() if version}
+                bumped = self.cache.get_many(list(bumped_keys.values()))
+                for tag, bumped_key in bumped_keys.items():
+                    if bumped.get(bumped_key, 0) >= built_since:
+                        current[tag] -= 1
+            versions.update(current)
+        timeout = self.cache.default_timeout
+        entry = {
+            "value": value,
+            "tags": versions,
+            "delta": delta,
+            "expiry": time.time() + timeout if timeout is not None else None,
+        }
+        self.cache.set(key, entry)
+        self.subscribe()
+        # an invalidation published before the entry reached the local cache would not evict it
+        self.local.set(key, {**entry, "fresh": True}, versions)
+        stale_tags = [tag for tag, version in self.get_versions(versions).items() if versions[tag] != version]
+        if stale_tags:
+            self.local.evict_tags(stale_tags)
+
+    def wait_for(self, key, wait, interval=0.05):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            entry = self.get_entry(key)
+            if entry is not None and entry["fresh"]:
+                return entry
+        return None
+
+    def acquire_lock(self, key, timeout):
+        token = uuid4().hex
+        return token if self.cache.add(LOCK_KEY.format(key), token, timeout) else None
+
+    def release_lock(self, key, token):
+        lock_key = LOCK_KEY.format(key)
+        if self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    def _bump(self, key, delta=1):
+        # counters never expire, otherwise an entry built before the first bump would look fresh again
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            if self.cache.add(key, delta, timeout=None):
+                return delta
+            return self.cache.incr(key, delta)
+
+    def invalidate(self, *tags):
+        now = time.time()
+        for tag, key in self._version_keys(tags).items():
+            version = self._bump(key)
+            self.cache.set(TAG_BUMPED_KEY.format(tag, version), now)
+        self.local.evict_tags(tags)
+        client = self._redis()
+        if client is not None:
+            client.publish(self._channel(), json.dumps(tags))
+
+    def get_generation(self, resource):
+        self.subscribe()
+        key = TAG_VERSION_KEY.format(resource)
+        generation = self.local.get(key)
+        if generation is None:
+            generation = self.get_versions([resource])[resource]
+            self.local.set(key, generation, [resource])
+        return generation
+
+    async def aget_generation(self, resource):
+        await self.asubscribe()
+        key = TAG_VERSION_KEY.format(resource)
+        generation = self.local.get(key)
+        if generation is None:
+            generation = (await self.aget_versions([resource]))[resource]
+            self.local.set(key, generation, [resource])
+        return generation
+
+    def bump_generation(self, resource):
+        """
+        List keys embed the generation of their resource, so a single INCR orphans every cached page.
+        Orphaned pages are never read again and age out through the cache TIMEOUT.
+        """
+        self.invalidate(resource)
+
+    def generation_keys(self, resource, key):
+        """
+        Returns the key for the current generation followed by the keys of the previous ones, which
+        may still hold a stale copy of the page.
+        """
+        return self._generation_keys(self.get_generation(resource), key)
+
+    async def ageneration_keys(self, resource, key):
+        return self._generation_keys(await self.aget_generation(resource), key)
+
+    def _generation_keys(self, generation, key):
+        oldest = max(generation - settings.DATA_CACHE["STALE_GENERATIONS"], 0)
+        return [f"{key}_gen{number}" for number in range(generation, oldest - 1, -1)]
+
+    def _count(self, endpoint, hit):
+        # counted in-process and flushed periodically, a local hit should not pay a round trip for its counter
+        with self.stats_lock:
+            self.pending_stats[STATS_KEY.format(endpoint, "hits" if hit else "misses")] += 1
+            return time.monotonic() - self.stats_flushed_at >= settings.DATA_CACHE["STATS_FLUSH_INTERVAL"]
+
+    def record(self, endpoint, hit):
+        if self._count(endpoint, hit):
+            self.flush_stats()
+
+    async def arecord(self, endpoint, hit):
+        if self._count(endpoint, hit):
+            await sync_to_async(self.flush_stats, thread_sensitive=False)()
+
+    def flush_stats(self):
+        with self.stats_lock:
+            pending, self.pending_stats = self.pending_stats, defaultdict(int)
+            self.stats_flushed_at = time.monotonic()
+        for key, delta in pending.items():
+            self._bump(key, delta)
+
+    def get_stats(self, endpoint):
+        self.flush_stats()
+        keys = {counter: STATS_KEY.format(endpoint, counter) for counter in ("hits", "misses")}
+        stored = self.cache.get_many(list(keys.values()))
+        return {counter: stored.get(key, 0) for counter, key in keys.items()}
+
+    def reset_stats(self, endpoint):
+        self.cache.delete_many([STATS_KEY.format(endpoint, counter) for counter in ("hits", "misses")])
+
+
+def render_response(view, request, response):
+    response.accepted_renderer = request.accepted_renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = view.get_renderer_context()
+    response.render()
+    return response
+
+
+def version_etag(*parts):
+    return quote_etag(hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def set_version_headers(response, etag, last_modified):
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def response_to_entry(view, request, response, etag, last_modified):
+    set_version_headers(response, etag, last_modified)
+    if not settings.DATA_CACHE["RENDERED_RESPONSES"]:
+        return {"data": response.data, "etag": etag, "last_modified": last_modified}
+
+    content = render_response(view, request, response).content
+    compress_min_size = settings.DATA_CACHE["COMPRESS_MIN_SIZE"]
+    compressed = compress_min_size is not None and len(content) >= compress_min_size
+    return {
+        "body": zlib.compress(content) if compressed else content,
+        "compressed": compressed,
+        "content_type": response["Content-Type"],
+        "etag": etag,
+        "last_modified": last_modified,
+    }
+
+
+def entry_to_response(entry):
+    if "data" in entry:
+        response = Response(entry["data"])
+    else:
+        content = zlib.decompress(entry["body"]) if entry["compressed"] else entry["body"]
+        response = HttpResponse(content, content_type=entry["content_type"])
+    return set_version_headers(response, entry.get("etag"), entry.get("last_modified"))
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    Returns a 304 (or 412 for a failed If-Match) when the conditional headers of the request match the
+    given version, None when the full response has to be sent.
+    """
+    if etag is None and last_modified is None:
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        return None
+    return set_version_headers(response, etag, last_modified)
+
+
+def serve_entry(request, entry):
+    not_modified = conditional_response(request, entry.get("etag"), entry.get("last_modified"))
+    if not_modified is not None:
+        return not_modified
+    return entry_to_response(entry)
+
+
+def should_refresh_early(entry, beta):
+    """
+    Probabilistic early expiration (XFetch): the closer an entry is to its expiry and the longer it took
+    to build, the more likely a single request refreshes it before it expires for everybody at once.
+    """
+    if not beta or entry["expiry"] is None:
+        return False
+    return time.time() - entry["delta"] * beta * math.log(1 - random.random()) >= entry["expiry"]
+
+
+class CachedViewMixin:
+    cache = TaggedCache("data")
+
+    def may_serve_stale(self, request, endpoint, cached):
+        # authenticated users edit the data, they always read their own writes
+        if request.user.is_authenticated:
+            return False
+        return time.time() - cached["stale_since"] <= settings.DATA_CACHE["MAX_STALENESS"].get(endpoint, 0)
+
+    def schedule_refresh(self, request, cache_key, token):
+        view_path = f"{type(self).__module__}.{type(self).__name__}"
+        try:
+            refresh_cached_response.delay(
+                view_path, self.action, self.kwargs, request.path_info, request.META.get("QUERY_STRING", ""), request.get_host(), request.scheme, token
+            )
+        except OperationalError:
+            logger.exception("Could not schedule refresh of %s", cache_key)
+            self.cache.release_lock(cache_key, token)
+
+    def cached_response(self, request, endpoint, cache_keys, get_response, tags, get_version, get_tags=None):
+        """
+        Serves the first of cache_keys, the remaining ones are older copies that may be served while
+        another worker rebuilds the entry. Only the worker holding the lock hits the database.
+        The entry is tagged with tags, known before building it, and the tags get_tags finds in the data.
+        get_version returns the ETag and Last-Modified of the current data (either may be None), it has to
+        be cheap: conditional requests that miss the cache are answered from it without serializing.
+        """
+        # rendered entries hold JSON bytes, other renderers (e.g. the browsable API) skip the cache
+        if request.accepted_renderer.format != "json":
+            return get_response()
+
+        options = settings.DATA_CACHE
+        cache_key, stale_keys = cache_keys[0], cache_keys[1:]
+        # set by refresh_cached_response, which already holds the lock
+        token = getattr(request._request, "cache_refresh_token", None)
+        if token is None:
+            cached = self.cache.get_entry(cache_key)
+            if cached is None and stale_keys:
+                cached = self.cache.get_any_entry(stale_keys)
+
+            if cached is not None and cached["fresh"] and not should_refresh_early(cached, options["XFETCH_BETA"]):
+                self.cache.record(endpoint, True)
+                return serve_entry(request, cached["value"])
+
+            if cached is not None and not cached["fresh"] and not self.may_serve_stale(request, endpoint, cached):
+                # not even while another worker holds the lock, the request waits for the rebuilt entry or builds it
+                cached = None
+
+            if cached is not None and not cached["fresh"]:
+                token = self.cache.acquire_lock(cache_key, options["LOCK_TIMEOUT"])
+                if token is not None:
+                    self.schedule_refresh(request, cache_key, token)
+                self.cache.record(endpoint, True)
+                return serve_entry(request, cached["value"])
+
+            token = self.cache.acquire_lock(cache_key, options["LOCK_TIMEOUT"])
+            if token is None:
+                if cached is None:
+                    cached = self.cache.wait_for(cache_key, options["LOCK_WAIT"])
+                if cached is not None:
+                    self.cache.record(endpoint, True)
+                    return serve_entry(request, cached["value"])
+            self.cache.record(endpoint, False)
+
+        try:
+            start, built_since = time.monotonic(), time.time()
+            # the version is read before the data, a concurrent write can only make the ETag older than the body
+            etag, last_modified = get_version()
+            not_modified = conditional_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            # as are the tag versions, a write while the response is built leaves the entry stale
+            versions = self.cache.get_versions(set(tags))
+            response = get_response()
+            entry = response_to_entry(self, request, response, etag, last_modified)
+            data_tags = get_tags(response.data) if get_tags is not None else []
+            self.cache.set(cache_key, entry, [*tags, *data_tags], time.monotonic() - start, versions, built_since)
+        finally:
+            if token is not None:
+                self.cache.release_lock(cache_key, token)
+        return response
@@ -0,0 +1,279 @@
+import csv
+from collections import defaultdict
+from itertools import islice
+
+import orjson
+from dish.models import Dish
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from menu.models import Menu
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .cache import DISH_LIST, MENU_LIST, CachedViewMixin, dish_tag, menu_tag
+
+CATALOG_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ["type", "name", "description", "price", "preparation_time", "is_vegetarian", "image", "dishes"]
+CHUNK_SIZE = 1000
+# bulk_update() builds a CASE WHEN per column over the whole batch, which gets slow well before CHUNK_SIZE rows
+UPDATE_BATCH_SIZE = 100
+# past this many changed dishes and menus an import clears the data cache instead of invalidating each of them
+INVALIDATE_MAX_TAGS = 10000
+
+
+class CatalogError(Exception):
+    def __init__(self, line, errors):
+        super().__init__(f"Line {line}: {errors}")
+        self.line = line
+        self.errors = errors
+
+
+class CatalogDishSerializer(serializers.ModelSerializer):
+    # the stored file name, as exported
+    image = serializers.CharField(max_length=100, allow_blank=True, allow_null=True, required=False, default="")
+
+    class Meta:
+        model = Dish
+        fields = ["name", "description", "price", "preparation_time", "is_vegetarian", "image"]
+
+
+class CatalogMenuSerializer(serializers.ModelSerializer):
+    dishes = serializers.ListField(child=serializers.CharField(max_length=100), required=False, default=list)
+
+    class Meta:
+        model = Menu
+        fields = ["name", "description", "dishes"]
+        # menus are upserted by name
+        extra_kwargs = {"name": {"validators": []}}
+
+
+RECORD_SERIALIZERS = {"dish": CatalogDishSerializer, "menu": CatalogMenuSerializer}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_records(chunk_size=CHUNK_SIZE):
+    """
+    Every dish, then every menu with the names of its dishes, read through server-side cursors.
+    """
+    dishes = Dish.objects.order_by("id").values(*CatalogDishSerializer.Meta.fields)
+    for dish in dishes.iterator(chunk_size=chunk_size):
+        yield {"type": "dish", **dish, "image": dish["image"] or ""}
+
+    menus = Menu.objects.order_by("id").values_list("id", "name", "description")
+    for chunk in chunked(menus.iterator(chunk_size=chunk_size), chunk_size):
+        dishes = defaultdict(list)
+        links = Menu.dishes.through.objects.filter(menu_id__in=[menu_id for menu_id, name, description in chunk]).order_by("dish_id")
+        for menu_id, dish_name in links.values_list("menu_id", "dish__name"):
+            dishes[menu_id].append(dish_name)
+        for menu_id, name, description in chunk:
+            yield {"type": "menu", "name": name, "description": description, "dishes": dishes[menu_id]}
+
+
+def write_ndjson(records):
+    for record in records:
+        yield orjson.dumps(record, default=str).decode() + "\n"
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def write_csv(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        if record["type"] == "dish":
+            is_vegetarian = "true" if record["is_vegetarian"] else "false"
+            yield writer.writerow(["dish", record["name"], record["description"], record["price"], record["preparation_time"], is_vegetarian, record["image"], ""])
+        else:
+            yield writer.writerow(["menu", record["name"], record["description"], "", "", "", "", "\n".join(record["dishes"])])
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, orjson.loads(line)
+        except orjson.JSONDecodeError:
+            raise CatalogError(line_number, {"non_field_errors": ["Invalid JSON."]})
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # one dish name per line of the cell
+        record["dishes"] = [name for name in (record.get("dishes") or "").split("\n") if name]
+        yield reader.line_num, record
+
+
+CATALOG_WRITERS = {"ndjson": write_ndjson, "csv": write_csv}
+CATALOG_READERS = {"ndjson": read_ndjson, "csv": read_csv}
+
+
+class CatalogImport:
+    """
+    Upserts a stream of dish and menu records, chunk_size records at a time: each chunk is written with one
+    bulk_create and one bulk_update of the dishes that changed, and a chunk of menus replaces the links to its
+    dishes with one DELETE and one bulk INSERT on the through table. Menus are matched by their unique name. Dish
+    names are not unique in the database, a name matches the oldest dish that has it. Menus list their dishes by
+    name and may only list dishes that exist or come earlier in the stream. The whole import is one transaction,
+    the first invalid record rolls it back.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.dishes = {}
+        self.menus = {}
+        self.tags = set()
+        # one serializer per record type, building the fields of a ModelSerializer costs more than validating
+        self.serializers = {record_type: serializer_class() for record_type, serializer_class in RECORD_SERIALIZERS.items()}
+        self.stats = dict.fromkeys(["dishes_created", "dishes_updated", "dishes_unchanged", "menus_created", "menus_updated", "menu_dishes"], 0)
+
+    def run(self, records):
+        with transaction.atomic():
+            for line, record in records:
+                self.add(line, record)
+            self.flush_menus()
+            self.analyze()
+            transaction.on_commit(self.clear_cache)
+        return self.stats
+
+    def add(self, line, record):
+        record_type = record.get("type") if isinstance(record, dict) else None
+        if record_type not in RECORD_SERIALIZERS:
+            raise CatalogError(line, {"type": ["Expected dish or menu."]})
+        try:
+            data = self.serializers[record_type].run_validation(record)
+        except serializers.ValidationError as exc:
+            raise CatalogError(line, exc.detail)
+
+        if record_type == "dish":
+            self.dishes[data["name"]] = data
+            if len(self.dishes) >= self.chunk_size:
+                self.flush_dishes()
+        else:
+            self.menus[data["name"]] = (line, data)
+            if len(self.menus) >= self.chunk_size:
+                self.flush_menus()
+
+    def analyze(self):
+        # the deferred foreign key checks on the new menu dishes run at commit, planned with the statistics of the
+        # tables before the import: on a (nearly) empty catalog they scan dish_dish once per link
+        if self.stats["dishes_created"] + self.stats["menus_created"] < self.chunk_size:
+            return
+        tables = [Dish._meta.db_table, Menu._meta.db_table, Menu.dishes.through._meta.db_table]
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {', '.join(connection.ops.quote_name(table) for table in tables)}")
+
+    def invalidate(self, tags):
+        if self.tags is not None:
+            self.tags.update(tags)
+            if len(self.tags) > INVALIDATE_MAX_TAGS:
+                self.tags = None
+
+    def clear_cache(self):
+        cache = CachedViewMixin.cache
+        if self.tags is None:
+            cache.clear()
+            return
+        cache.bump_generation(DISH_LIST)
+        cache.bump_generation(MENU_LIST)
+        if self.tags:
+            cache.invalidate(*self.tags)
+
+    def flush_dishes(self):
+        if not self.dishes:
+            return
+        existing = {}
+        # newest first, so the oldest dish with a name is the one kept
+        for dish in Dish.objects.filter(name__in=self.dishes).order_by("-id").defer("search_vector"):
+            existing[dish.name] = dish
+
+        now = timezone.now()
+        created, updated = [], []
+        for name, data in self.dishes.items():
+            dish = existing.get(name)
+            if dish is None:
+                created.append(Dish(**data))
+                continue
+            # re-importing an export leaves most dishes as they are, bulk_update() would still rewrite every row
+            changed = {attr: value for attr, value in data.items() if getattr(dish, attr) != value}
+            if not changed:
+                self.stats["dishes_unchanged"] += 1
+                continue
+            for attr, value in changed.items():
+                setattr(dish, attr, value)
+            # bulk_update() skips auto_now
+            dish.updated_at = now
+            updated.append(dish)
+
+        Dish.objects.bulk_create(created)
+        Dish.objects.bulk_update(updated, CatalogDishSerializer.Meta.fields + ["updated_at"], batch_size=UPDATE_BATCH_SIZE)
+        self.invalidate(dish_tag(dish.id) for dish in updated)
+        self.stats["dishes_created"] += len(created)
+        self.stats["dishes_updated"] += len(updated)
+        self.dishes = {}
+
+    def flush_menus(self):
+        self.flush_dishes()
+        if not self.menus:
+            return
+        dish_names = {dish_name for line, data in self.menus.values() for dish_name in data["dishes"]}
+        dish_ids = dict(Dish.objects.filter(name__in=dish_names).order_by("-id").values_list("name", "id"))
+        for line, data in self.menus.values():
+            missing = [dish_name for dish_name in data["dishes"] if dish_name not in dish_ids]
+            if missing:
+                raise CatalogError(line, {"dishes": [f"Unknown dish: {dish_name}" for dish_name in missing]})
+
+        existing = set(Menu.objects.filter(name__in=self.menus).values_list("name", flat=True))
+        menus = [Menu(name=name, description=data["description"]) for name, (line, data) in self.menus.items()]
+        Menu.objects.bulk_create(menus, update_conflicts=True, unique_fields=["name"], update_fields=["description", "updated_at"])
+        menu_ids = dict(Menu.objects.filter(name__in=self.menus).values_list("name", "id"))
+
+        through = Menu.dishes.through
+        links = dict.fromkeys((menu_ids[name], dish_ids[dish_name]) for name, (line, data) in self.menus.items() for dish_name in data["dishes"])
+        through.objects.filter(menu_id__in=menu_ids.values()).delete()
+        through.objects.bulk_create([through(menu_id=menu_id, dish_id=dish_id) for menu_id, dish_id in links])
+
+        self.invalidate(menu_tag(menu_ids[name]) for name in existing)
+        self.stats["menus_created"] += len(self.menus) - len(existing)
+        self.stats["menus_updated"] += len(existing)
+        self.stats["menu_dishes"] += len(links)
+        self.menus = {}
+
+
+class CatalogView(APIView):
+    """
+    GET streams the whole catalog, POST imports a catalog from the request body. Both read and write one
+    record at a time, the body is never loaded through request.data.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # exports are streamed as NDJSON or CSV whatever the Accept header says, it only picks how errors render
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, catalog_format):
+        response = StreamingHttpResponse(CATALOG_WRITERS[catalog_format](export_records()), content_type=CATALOG_CONTENT_TYPES[catalog_format])
+        response["Content-Disposition"] = f'attachment; filename="catalog.{catalog_format}"'
+        return response
+
+    def post(self, request, catalog_format):
+        lines = (line.decode() for line in request.stream) if request.stream is not None else iter(())
+        try:
+            stats = CatalogImport().run(CATALOG_READERS[catalog_format](lines))
+        except CatalogError as exc:
+            return Response({"line": exc.line, "errors": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"errors": {"non_field_errors": ["The catalog must be UTF-8 encoded."]}}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats)
@@ -13,11 +13,27 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "emenu_api.settings")
 app = Celery("emenu_api", broker=broker_url)
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
-app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+app.autodiscover_tasks(lambda: settings.INSTALLED_APPS + ["emenu_api"])
 
 app.conf.beat_schedule = {
     "send-dish-report-every-day-at-10am": {
         "task": "dish.tasks.send_dish_report",
         "schedule": crontab(hour=10, minute=0),
     },
+    "compact-changes-every-day-at-3am": {
+        "task": "changes.tasks.compact_changes",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "drain-blob-deletions-every-10-minutes": {
+        "task": "dish.tasks.drain_blob_deletions",
+        "schedule": crontab(minute="*/10"),
+    },
+    "process-pending-dish-images-every-hour": {
+        "task": "dish.tasks.process_pending_dish_images",
+        "schedule": crontab(minute=20),
+    },
+    "collect-orphan-blobs-every-day-at-4am": {
+        "task": "dish.tasks.collect_orphan_blobs",
+        "schedule": crontab(hour=4, minute=0),
+    },
 }
@@ -0,0 +1,160 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on the queryset's ordering term with the primary key as a tiebreaker. The cursor holds the
+    (value, id) of the row a page starts after, so every page is a range scan on a (field, id) index instead of
+    COUNT(*) plus OFFSET. Results carry next/previous links but no count. Orderings on more than one field are
+    rejected, the cursor could not keep their order.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+    invalid_ordering_message = "Cursor pagination orders by a single field."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.field, self.descending = self.get_ordering(queryset)
+        self.pk = queryset.model._meta.pk.attname
+        cursor = self.decode_cursor(request, queryset)
+        reverse = cursor is not None and cursor["reverse"]
+
+        direction = self.descending != reverse
+        order = "-" if direction else ""
+        queryset = queryset.order_by(f"{order}{self.field}", f"{order}pk")
+        if cursor is not None:
+            # (field, pk) < (value, id) spelled so the first condition bounds a range scan on the (field, id) index
+            lookup = "lt" if direction else "gt"
+            queryset = queryset.filter(**{f"{self.field}__{lookup}e": cursor["value"]})
+            queryset = queryset.filter(Q(**{f"{self.field}__{lookup}": cursor["value"]}) | Q(**{f"pk__{lookup}": cursor["id"]}))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = (has_more and not reverse) or (reverse and cursor is not None)
+        self.has_previous = (has_more and reverse) or (not reverse and cursor is not None)
+        return results
+
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or ["-pk"]
+        if any(str(term).lstrip("-") not in ("pk", queryset.model._meta.pk.attname) for term in ordering[1:]):
+            raise serializers.ValidationError({"ordering": [self.invalid_ordering_message]}, code="invalid")
+        term = ordering[0]
+        return term.lstrip("-"), term.startswith("-")
+
+    def get_ordering_field(self, queryset):
+        # the ordering may be on an annotation, e.g. dishes_count or the search rank
+        if self.field in queryset.query.annotations:
+            return queryset.query.annotations[self.field].output_field
+        return queryset.model._meta.get_field(self.field)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True))
+            # the value goes into a range lookup, a tampered one must not reach the database as a 500
+            value = self.get_ordering_field(queryset).to_python(cursor["v"])
+            if value is None:
+                raise ValueError("The cursor has no value.")
+            return {"value": value, "id": int(cursor["id"]), "reverse": bool(cursor.get("r"))}
+        except (TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        # pages hold model instances or, for ValuesSerializer reads, .values() rows
+        if isinstance(obj, dict):
+            cursor = {"v": obj[self.field], "id": obj[self.pk]}
+        else:
+            cursor = {"v": getattr(obj, self.field), "id": obj.pk}
+        if reverse:
+            cursor["r"] = 1
+        # str() keeps microseconds, which the keyset comparison on updated_at depends on
+        encoded = b64encode(json.dumps(cursor, default=str, separators=(",", ":")).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([("next", self.get_next_link()), ("previous", self.get_previous_link()), ("results", data)]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Page numbers by default. Clients opt into keyset pages with ?pagination=cursor, the next/previous links
+    keep the parameter and add the cursor.
+    """
+
+    mode_query_param = "pagination"
+    keyset_class = KeysetPagination
+    keyset = None
+
+    def uses_keyset(self, request):
+        return request.query_params.get(self.mode_query_param) == "cursor" or self.keyset_class.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to 'cursor' for keyset pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.keyset_class.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
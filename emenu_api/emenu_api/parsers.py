@@ -0,0 +1,25 @@
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser that decodes with orjson, which rejects NaN and Infinity like JSONParser does with STRICT_JSON.
+    Without STRICT_JSON parsing falls back to JSONParser.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if encoding.lower().replace("-", "") != "utf8":
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,70 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+
+class BulkManyRelatedField(ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        return self.child_relation.to_internal_values(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    With many=True, checks that every primary key exists with one IN query instead of one query per key. The
+    validated value is the list of primary keys, without duplicates, rather than model instances.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, value):
+        if self.pk_field is not None:
+            return self.pk_field.to_internal_value(value)
+        if isinstance(value, bool):
+            self.fail("incorrect_type", data_type=type(value).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(value)
+        except DjangoValidationError:
+            self.fail("incorrect_type", data_type=type(value).__name__)
+
+    def to_internal_values(self, data):
+        pks = list(dict.fromkeys(self.to_pk(value) for value in data))
+        if not pks:
+            return []
+        found = set(self.get_queryset().filter(pk__in=pks).order_by().values_list("pk", flat=True))
+        for pk in pks:
+            if pk not in found:
+                self.fail("does_not_exist", pk_value=pk)
+        return pks
+
+
+def update_many_to_many(instance, name, pks=None, add=(), remove=()):
+    """
+    Sets a many-to-many field of instance to pks, or adds and removes primary keys from it, inserting and
+    deleting only the through rows that change. Returns the number of related objects afterwards. Unlike
+    RelatedManager.set() it sends no m2m_changed signals.
+    """
+    field = instance._meta.get_field(name)
+    through = field.remote_field.through
+    source = through._meta.get_field(field.m2m_field_name()).attname
+    target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+
+    rows = through._default_manager.filter(**{source: instance.pk})
+    current = set(rows.values_list(target, flat=True))
+    pks = set(pks) if pks is not None else (current | set(add)) - set(remove)
+    removed, added = current - pks, pks - current
+    if removed:
+        rows.filter(**{f"{target}__in": removed}).delete()
+    if added:
+        # a concurrent request may have added the same rows
+        through._default_manager.bulk_create([through(**{source: instance.pk, target: pk}) for pk in sorted(added)], ignore_conflicts=True)
+    return len(pks)
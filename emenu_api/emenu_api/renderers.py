@@ -0,0 +1,24 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson. Types orjson does not handle natively (Decimal, datetimes, lazy
+    strings) go through DRF's JSONEncoder, so the bytes match JSONRenderer's compact UTF-8 output. Indented
+    responses, e.g. for the browsable API, and non-compact or ASCII settings fall back to JSONRenderer.
+    """
+
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not self.compact or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # JSONRenderer escapes these for JavaScript, orjson writes them as they are
+        return orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS).replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -0,0 +1,71 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .pagination import KeysetPagination
+
+# created by dish migration 0005 as a copy of "simple" with unaccent, PostgreSQL ships no Polish configuration
+SEARCH_CONFIG = "polish"
+SEARCH_QUERY_PARAM = "q"
+# ranking reads the stored vector of every match, very common terms only get their newest SEARCH_MAX_RANKED matches
+# ranked. Older matches can miss the results even when they would rank higher, but the candidates are the same on
+# every page request, so keyset pages over the rank neither skip nor repeat rows until a newer match is added.
+SEARCH_MAX_RANKED = 1000
+
+
+def search_terms(text):
+    """
+    Words under three letters are mostly prepositions ("z", "na") that would match most of the catalog and are
+    dropped unless nothing else is left.
+    """
+    terms = re.findall(r"[^\W_]+", text)
+    return [term for term in terms if len(term) >= 3] or terms
+
+
+def search_query(terms, prefix=False):
+    if prefix:
+        terms = terms[:-1] + [f"{terms[-1]}:*"]
+    return SearchQuery(" & ".join(terms), config=SEARCH_CONFIG, search_type="raw")
+
+
+def ranked_search(queryset, text):
+    """
+    Ranks the newest SEARCH_MAX_RANKED matches of the words. When the exact words do not fill a page, the last one is
+    also taken as a prefix, so "pomid" or "pomidor" find "pomidorami". Prefixes are a fallback only: GIN
+    materializes every row matching a prefix before intersecting, which for a common word costs a hundred times
+    more than an exact term.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+
+    query = search_query(terms)
+    candidates = list(queryset.filter(search_vector=query).order_by("-pk").values_list("pk", flat=True)[:SEARCH_MAX_RANKED])
+    if len(candidates) < api_settings.PAGE_SIZE:
+        query = search_query(terms, prefix=True)
+        matches = queryset.filter(search_vector=query).exclude(pk__in=candidates).order_by("-pk").values_list("pk", flat=True)
+        candidates += matches[: SEARCH_MAX_RANKED - len(candidates)]
+
+    # ts_rank returns real, as double precision the rank survives the round trip through a keyset cursor
+    rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+    return queryset.filter(pk__in=candidates).annotate(rank=rank).order_by("-rank", "-pk")
+
+
+class SearchViewMixin:
+    @action(detail=False)
+    def search(self, request):
+        text = request.query_params.get(SEARCH_QUERY_PARAM, "")
+        if not text.strip():
+            return Response({SEARCH_QUERY_PARAM: ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # keyset pages, a COUNT(*) over the matches of a common word costs more than ranking them
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(ranked_search(self.filter_queryset(self.get_queryset()), text), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,79 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+EXPAND_PARAM = "expand"
+
+
+def _names(request, param):
+    if param not in request.query_params:
+        return None
+    return frozenset(name.strip() for value in request.query_params.getlist(param) for name in value.split(",") if name.strip())
+
+
+@lru_cache(maxsize=None)
+def serializer_field_names(serializer_class):
+    return frozenset(serializer_class().fields)
+
+
+class Projection(namedtuple("Projection", ["fields", "omit", "expand"])):
+    """
+    The top-level fields a read asked for with ?fields= and ?omit=, and the relations ?expand= embeds. Without
+    ?expand= relations stay embedded, with it the ones not listed are rendered as primary keys. Unknown names are
+    ignored, ?fields= without a known one reads every field, and writes always get every field.
+    """
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        if request is None or request.method not in SAFE_METHODS:
+            return cls(None, frozenset(), None)
+        names = serializer_field_names(serializer_class)
+        fields, omit, expand = (_names(request, param) for param in (FIELDS_PARAM, OMIT_PARAM, EXPAND_PARAM))
+        return cls(
+            (fields & names or None) if fields is not None else None,
+            omit & names if omit is not None else frozenset(),
+            expand & names if expand is not None else None,
+        )
+
+    def includes(self, name):
+        return (self.fields is None or name in self.fields) and name not in self.omit
+
+    def expands(self, name):
+        return self.includes(name) and (self.expand is None or name in self.expand)
+
+    def query_params(self):
+        params = {}
+        if self.fields is not None:
+            params[FIELDS_PARAM] = ",".join(sorted(self.fields))
+        if self.omit:
+            params[OMIT_PARAM] = ",".join(sorted(self.omit))
+        if self.expand is not None:
+            params[EXPAND_PARAM] = ",".join(sorted(self.expand))
+        return params
+
+
+class SparseFieldsMixin:
+    """
+    Prunes the top-level fields of a serializer to the Projection of the request in its context. collapsed_fields
+    maps expandable relations to the field that replaces them when they are not expanded.
+    """
+
+    collapsed_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # nested serializers share the root's context, the projection only applies to the top level
+        if self.parent is not None and not (isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None):
+            return fields
+
+        projection = Projection.from_request(self.context.get("request"), type(self))
+        for name in list(fields):
+            if not projection.includes(name):
+                del fields[name]
+            elif name in self.collapsed_fields and not projection.expands(name):
+                fields[name] = self.collapsed_fields[name]()
+        return fields
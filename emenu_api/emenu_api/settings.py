@@ -42,18 +42,22 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "storages",
     "django_filters",
     "drf_spectacular",
     "menu",
     "dish",
+    "changes",
 ]
 
 AZURE_ACCOUNT_NAME = os.getenv("AZURE_ACCOUNT_NAME")
 AZURE_ACCOUNT_KEY = os.getenv("AZURE_ACCOUNT_KEY")
 AZURE_CUSTOM_DOMAIN = f"{AZURE_ACCOUNT_NAME}.blob.core.windows.net"
 AZURE_CONTAINER = os.getenv("AZURE_CONTAINER")
+# stored names are content hashes (dish.models.content_name), a stored file never changes
+AZURE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 DEFAULT_FILE_STORAGE = "storages.backends.azure_storage.AzureStorage"
 
 EMAIL_USE_TLS = True
@@ -92,9 +96,30 @@ CACHES = {
     },
 }
 
+DATA_CACHE = {
+    "RENDERED_RESPONSES": True,
+    "COMPRESS_MIN_SIZE": 4096,
+    "STALE_GENERATIONS": 3,
+    "LOCK_TIMEOUT": 10,
+    "LOCK_WAIT": 2,
+    "XFETCH_BETA": 1.0,
+    "LOCAL_MAX_BYTES": 64 * 1024 * 1024,
+    "LOCAL_TTL": 5,
+    "STATS_FLUSH_INTERVAL": 10,
+    # seconds an anonymous request may be served a stale copy while Celery rebuilds it, 0 disables; dish reads
+    # require authentication, so dishes are never served stale
+    "MAX_STALENESS": {
+        "menu_list": 300,
+        "menu_detail": 300,
+    },
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    # orjson with DRF's encoding rules for Decimal and datetimes, drop these to go back to the stdlib json classes
+    "DEFAULT_RENDERER_CLASSES": ["emenu_api.renderers.ORJSONRenderer", "rest_framework.renderers.BrowsableAPIRenderer"],
+    "DEFAULT_PARSER_CLASSES": ["emenu_api.parsers.ORJSONParser", "rest_framework.parsers.FormParser", "rest_framework.parsers.MultiPartParser"],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
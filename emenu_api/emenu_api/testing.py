@@ -0,0 +1,55 @@
+import re
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are PostgreSQL specific")
+class ExplainTestCase(TestCase):
+    """
+    Asserts which indexes PostgreSQL picks for a queryset. Subclasses load enough rows in setUpTestData for the
+    planner to prefer an index over a sequential scan on selective filters and list the tables to ANALYZE.
+    """
+
+    analyze = []
+
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            for table in cls.analyze:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+
+    def get_indexes(self, queryset):
+        plan = queryset.explain()
+        return set(re.findall(r"(?:Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)? (?:using|on) (\w+)", plan)), plan
+
+    def assertUsesIndex(self, queryset, index):
+        indexes, plan = self.get_indexes(queryset)
+        self.assertIn(index, indexes, f"{index} not used:\n{plan}")
+
+    def assertNoSeqScan(self, queryset, table):
+        plan = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table}", plan, plan)
+
+
+class ValuesParityMixin:
+    """
+    Requests a URL once through the viewset's ValuesSerializer and once through its ModelSerializer, with the
+    response cache cleared before each, and asserts that both render the same bytes.
+    """
+
+    viewset = None
+
+    def assertSameResponse(self, url, params=None):
+        self.viewset.cache.clear()
+        values_response = self.client.get(url, params)
+        self.viewset.cache.clear()
+        with patch.object(self.viewset, "values_serializer_class", None):
+            model_response = self.client.get(url, params)
+        self.viewset.cache.clear()
+
+        self.assertEqual(values_response.status_code, model_response.status_code)
+        self.assertEqual(values_response.content, model_response.content)
+        return values_response
@@ -0,0 +1,168 @@
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.relations import ManyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+# fields whose to_representation() returns database values unchanged
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+OWNER = "values_owner_id"
+
+
+def decimal_to_representation(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def to_representation(value):
+        # the database already returns the column's decimal places, quantize() would not change them
+        if value.as_tuple().exponent == exponent:
+            return f"{value:f}"
+        return field.to_representation(value)
+
+    return to_representation
+
+
+def datetime_to_representation(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def to_representation(value):
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return to_representation
+
+
+def file_to_representation(field, storage):
+    if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+        return lambda name: name or None
+    request = field.context.get("request")
+
+    def to_representation(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return to_representation
+
+
+class ValuesSerializer:
+    """
+    Renders what a ModelSerializer would render for reads, but from .values() rows instead of model instances.
+    The fields the serializer renders for the request (after SparseFieldsMixin pruning) are compiled once into
+    (name, column, converter) entries, common field types get converters without the per-value checks of
+    to_representation(). Many-to-many fields, nested or as primary keys, are loaded with one query per page.
+    """
+
+    # nested many=True ModelSerializer fields and the ValuesSerializer of their child
+    nested = {}
+    # SerializerMethodFields that return the queryset annotation of the same name
+    annotations = ()
+
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        self.columns = [self.pk]
+        self.fields = []
+        self.relations = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in self.annotations:
+                self.add_column(name)
+                self.fields.append((name, name, None))
+            elif isinstance(field, (serializers.ListSerializer, ManyRelatedField)):
+                child = self.nested[name](field.child) if isinstance(field, serializers.ListSerializer) else None
+                self.relations.append((name, self.model._meta.get_field(field.source), child))
+                self.fields.append((name, name, None))
+            else:
+                if "." in field.source or field.source == "*":
+                    raise ImproperlyConfigured(f"{type(self).__name__} cannot read {name} from source {field.source!r}.")
+                self.add_column(field.source)
+                self.fields.append((name, field.source, self.compile_field(field)))
+
+    def add_column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    def compile_field(self, field):
+        if isinstance(field, serializers.DecimalField):
+            return decimal_to_representation(field)
+        if isinstance(field, serializers.DateTimeField):
+            return datetime_to_representation(field)
+        if isinstance(field, serializers.FileField):
+            return file_to_representation(field, self.model._meta.get_field(field.source).storage)
+        if type(field) in PLAIN_FIELDS:
+            return None
+        return field.to_representation
+
+    def get_queryset(self, queryset):
+        # keyset pagination reads the ordering values back from the rows
+        ordering = [term.lstrip("-") for term in queryset.query.order_by or self.model._meta.ordering if isinstance(term, str)]
+        return queryset.prefetch_related(None).values(*self.columns, *[term for term in ordering if term not in self.columns])
+
+    def add_relations(self, rows):
+        ids = [row[self.pk] for row in rows]
+        for name, relation, child in self.relations:
+            lookup = relation.related_query_name()
+            columns = child.columns if child is not None else [relation.related_model._meta.pk.attname]
+            related = list(relation.related_model._default_manager.filter(**{f"{lookup}__in": ids}).values(*columns, **{OWNER: F(lookup)}))
+            items = child.serialize(related) if child is not None else [row[columns[0]] for row in related]
+            grouped = defaultdict(list)
+            for row, item in zip(related, items):
+                grouped[row[OWNER]].append(item)
+            for row in rows:
+                row[name] = grouped[row[self.pk]]
+
+    def serialize(self, rows):
+        if self.relations and rows:
+            self.add_relations(rows)
+        return [
+            {name: value if convert is None or value is None else convert(value) for name, column, convert in self.fields for value in (row[column],)}
+            for row in rows
+        ]
+
+
+class ValuesReadMixin:
+    """
+    Serves list and retrieve through values_serializer_class, a ValuesSerializer for the viewset's serializer.
+    Set it to None to render reads with the ModelSerializer again.
+    """
+
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        if self.values_serializer_class is None:
+            return None
+        return self.values_serializer_class(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        if serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = serializer.get_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(list(queryset)))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        if serializer is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        queryset = serializer.get_queryset(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(serializer.serialize([row])[0])
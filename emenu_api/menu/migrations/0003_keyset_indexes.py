@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_loading_menus_to_db'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['updated_at', 'id'], name='menu_updated_at_id_idx'),
+        ),
+    ]
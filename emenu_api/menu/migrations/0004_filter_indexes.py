@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 19:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0004_filter_indexes'),
+        ('menu', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['created_at'], name='menu_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), fastupdate=False, name='menu_name_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 19:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+TRIGGER_SQL = """
+CREATE FUNCTION menu_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('polish', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('polish', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER menu_search_vector_update BEFORE INSERT OR UPDATE OF name, description, search_vector ON menu_menu
+FOR EACH ROW EXECUTE FUNCTION menu_search_vector_update();
+
+-- fires the trigger for existing rows
+UPDATE menu_menu SET search_vector = NULL;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER menu_search_vector_update ON menu_menu;
+DROP FUNCTION menu_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish', '0005_search_vector'),
+        ('menu', '0004_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menu',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='menu_search_vector_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class Menu(models.Model):
@@ -7,6 +10,17 @@ class Menu(models.Model):
     dishes = models.ManyToManyField("dish.Dish")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # weighted name (A) and description (B), kept up to date by the menu_search_vector_update trigger
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
+
+    class Meta:
+        # name is unique, so its own index already serves keyset pages ordered by name
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="menu_updated_at_id_idx"),
+            models.Index(fields=["created_at"], name="menu_created_at_idx"),
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="menu_name_trgm_idx", fastupdate=False),
+            GinIndex(fields=["search_vector"], name="menu_search_vector_idx"),
+        ]
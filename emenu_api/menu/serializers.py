@@ -1,32 +1,70 @@
+from functools import partial
+
 from dish.models import Dish
-from dish.serializers import DishSerializer
+from dish.serializers import DishSerializer, DishValuesSerializer
+from emenu_api.relations import BulkPrimaryKeyRelatedField, update_many_to_many
+from emenu_api.serializers import SparseFieldsMixin
+from emenu_api.values import ValuesSerializer
 from rest_framework import serializers
 
 from .models import Menu
 from .utils import dishes_count
 
 
-class MenuSerializer(serializers.ModelSerializer):
+class MenuSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     dishes = DishSerializer(many=True, read_only=True)
-    dish_ids = serializers.PrimaryKeyRelatedField(many=True, write_only=True, queryset=Dish.objects.all(), source="dishes")
+    dish_ids = BulkPrimaryKeyRelatedField(many=True, write_only=True, queryset=Dish.objects.all(), source="dishes")
+    # edits the dishes of a large menu without sending all of them
+    dish_ids_add = BulkPrimaryKeyRelatedField(many=True, write_only=True, required=False, queryset=Dish.objects.all())
+    dish_ids_remove = BulkPrimaryKeyRelatedField(many=True, write_only=True, required=False, queryset=Dish.objects.all())
     dishes_count = serializers.SerializerMethodField()
+    collapsed_fields = {"dishes": partial(serializers.PrimaryKeyRelatedField, many=True, read_only=True)}
 
     class Meta:
         model = Menu
-        fields = ["id", "name", "description", "created_at", "updated_at", "dishes", "dish_ids", "dishes_count"]
+        fields = ["id", "name", "description", "created_at", "updated_at", "dishes", "dish_ids", "dish_ids_add", "dish_ids_remove", "dishes_count"]
 
     def get_dishes_count(self, obj):
         return dishes_count(obj)
 
+    def validate(self, attrs):
+        if "dishes" in attrs and (attrs.get("dish_ids_add") or attrs.get("dish_ids_remove")):
+            raise serializers.ValidationError("Send either dish_ids or dish_ids_add and dish_ids_remove.")
+        both = set(attrs.get("dish_ids_add", [])) & set(attrs.get("dish_ids_remove", []))
+        if both:
+            raise serializers.ValidationError({"dish_ids_remove": [f"Dish {pk} is also in dish_ids_add." for pk in sorted(both)]})
+        return attrs
+
+    def pop_dishes(self, validated_data):
+        return {key: validated_data.pop(key) for key in ["dishes", "dish_ids_add", "dish_ids_remove"] if key in validated_data}
+
+    def save_dishes(self, instance, dishes=None, dish_ids_add=(), dish_ids_remove=()):
+        if dishes is not None or dish_ids_add or dish_ids_remove:
+            # the count annotated by MenuViewSet no longer matches
+            instance.dishes_count = update_many_to_many(instance, "dishes", dishes, dish_ids_add, dish_ids_remove)
+
+    def create(self, validated_data):
+        dish_data = self.pop_dishes(validated_data)
+        instance = super().create(validated_data)
+        instance.dishes_count = 0
+        self.save_dishes(instance, **dish_data)
+        return instance
+
     def update(self, instance, validated_data):
+        dish_data = self.pop_dishes(validated_data)
         instance.name = validated_data.get("name", instance.name)
         instance.description = validated_data.get("description", instance.description)
-        if "dishes" in validated_data:
-            instance.dishes.set(validated_data["dishes"])
+        self.save_dishes(instance, **dish_data)
         instance.save()
         return instance
 
 
+class MenuValuesSerializer(ValuesSerializer):
+    nested = {"dishes": DishValuesSerializer}
+    # annotated by MenuViewSet.get_queryset
+    annotations = ("dishes_count",)
+
+
 """ Alternative - if we want to create not existing dishes with Menu POST request
 class MenuSerializer(serializers.ModelSerializer):
     dishes = DishSerializer(many=True)
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+from dish.models import Dish
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from emenu_api.cache import MENU_LIST
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Menu
+from .views import MenuViewSet
+
+
+@override_settings(ROOT_URLCONF="emenu_api.asgi_urls")
+class AsyncMenuReadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+        dish = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+        self.menu = Menu.objects.create(name="Test Menu 1", description="Test Description 1")
+        self.menu.dishes.add(dish)
+        MenuViewSet.cache.clear()
+        MenuViewSet.cache.reset_stats(MENU_LIST)
+
+    def test_cache_hits_are_served_without_the_viewset(self):
+        url = reverse("menu-list")
+        response = self.client.get(url, {"ordering": "name"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with patch.object(MenuViewSet, "list", side_effect=AssertionError), self.assertNumQueries(0):
+            cached = self.client.get(url, {"ordering": "name"})
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual((cached["ETag"], cached["Vary"], cached["Allow"]), (response["ETag"], response["Vary"], response["Allow"]))
+
+        # the user is loaded over the async ORM, authenticated users have their own entries
+        self.client.get(url, {"ordering": "name"}, **self.auth)
+        with patch.object(MenuViewSet, "list", side_effect=AssertionError), self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {"ordering": "name"}, **self.auth).status_code, status.HTTP_200_OK)
+        self.assertEqual(MenuViewSet.cache.get_stats(MENU_LIST), {"hits": 2, "misses": 2})
+
+    def test_conditional_request_on_a_miss(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu.id})
+        response = self.client.get(url)
+        MenuViewSet.cache.clear()
+
+        # answered from the version of the menu, nothing is serialized
+        with patch.object(MenuViewSet, "retrieve", side_effect=AssertionError), self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["name"], "Test Menu 1")
+
+    def test_writes_and_invalid_credentials_go_to_the_viewset(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu.id})
+        self.client.get(url)
+
+        response = self.client.patch(url, {"name": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+
+        response = self.client.patch(url, {"name": "Renamed"}, format="json", **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # users read their own writes, anonymous ones may get the stale copy while it is rebuilt
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.json()["name"], "Renamed")
+        self.assertEqual(self.client.get(reverse("menu-detail", kwargs={"pk": 0})).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.put(reverse("menu-list"), {}, format="json", **self.auth).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -1,6 +1,9 @@
+import json
+from base64 import b64encode
+
 from dish.models import Dish
 from django.contrib.auth.models import User
-from django.core.cache import caches
+from django.db.models import Count
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -8,6 +11,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import Menu
 from .serializers import MenuSerializer
+from .views import MenuViewSet
 
 
 class MenuTestCase(APITestCase):
@@ -53,6 +57,41 @@ class MenuTestCase(APITestCase):
         self.assertEqual(updated_menu.dishes.count(), 1)
         self.assertTrue(self.dish1 in updated_menu.dishes.all())
 
+    def test_partial_update_menu_dish_deltas(self):
+        menu = Menu.objects.get(name="Test Menu 1")
+        menu.dishes.add(self.dish1)
+        url = reverse("menu-detail", kwargs={"pk": menu.id})
+
+        response = self.client.patch(url, {"dish_ids_add": [self.dish2.id, self.dish1.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["dishes_count"], 2)
+        self.assertEqual(set(menu.dishes.values_list("id", flat=True)), {self.dish1.id, self.dish2.id})
+
+        response = self.client.patch(url, {"dish_ids_remove": [self.dish1.id]}, format="json")
+        self.assertEqual(response.data["dishes_count"], 1)
+        self.assertEqual(list(menu.dishes.values_list("id", flat=True)), [self.dish2.id])
+
+    def test_update_menu_invalid_dish_ids(self):
+        menu = Menu.objects.get(name="Test Menu 1")
+        menu.dishes.add(self.dish1)
+        url = reverse("menu-detail", kwargs={"pk": menu.id})
+        missing_id = Dish.objects.order_by("-id").first().id + 1
+
+        response = self.client.patch(url, {"dish_ids": [self.dish2.id, missing_id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error.code for error in response.data["dish_ids"]], ["does_not_exist"])
+        self.assertIn(str(missing_id), response.data["dish_ids"][0])
+
+        response = self.client.patch(url, {"dish_ids_add": ["one"]}, format="json")
+        self.assertEqual([error.code for error in response.data["dish_ids_add"]], ["incorrect_type"])
+
+        response = self.client.patch(url, {"dish_ids_add": [self.dish2.id], "dish_ids_remove": [self.dish2.id]}, format="json")
+        self.assertEqual(response.data["dish_ids_remove"], [f"Dish {self.dish2.id} is also in dish_ids_add."])
+
+        response = self.client.patch(url, {"dish_ids": [self.dish2.id], "dish_ids_add": [self.dish1.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(menu.dishes.values_list("id", flat=True)), [self.dish1.id])
+
     def test_list_menus(self):
         response = self.client.get(reverse("menu-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -145,5 +184,68 @@ class MenuTestCase(APITestCase):
         serializer = MenuSerializer(instance=new_menu)
         self.assertEqual(serializer.data["dishes_count"], 2)
 
+    def test_dish_update_keeps_unrelated_menu_detail_cached(self):
+        related_menu = Menu.objects.get(name="Test Menu 1")
+        related_menu.dishes.add(self.dish1)
+        unrelated_menu = Menu.objects.get(name="Test Menu 2")
+        unrelated_menu.dishes.add(self.dish2)
+        for menu in (related_menu, unrelated_menu):
+            response = self.client.get(reverse("menu-detail", kwargs={"pk": menu.id}))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = {"name": "Updated Dish", "price": 25.00, "description": "Updated Description", "preparation_time": 40, "is_vegetarian": False}
+        response = self.client.put(reverse("dish-detail", kwargs={"pk": self.dish1.id}), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(MenuViewSet.cache.get(f"menu_detail_auth_{related_menu.id}"))
+        self.assertIsNotNone(MenuViewSet.cache.get(f"menu_detail_auth_{unrelated_menu.id}"))
+
+    def test_menu_detail_reflects_dish_update(self):
+        menu = Menu.objects.get(name="Test Menu 1")
+        menu.dishes.add(self.dish1)
+        self.client.get(reverse("menu-detail", kwargs={"pk": menu.id}))
+
+        response = self.client.patch(reverse("dish-detail", kwargs={"pk": self.dish1.id}), {"name": "Renamed Dish"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": menu.id}))
+        self.assertEqual(response.data["dishes"][0]["name"], "Renamed Dish")
+
+    def test_dish_delete_updates_projection_without_dishes(self):
+        menu = Menu.objects.get(name="Test Menu 1")
+        extra = Dish.objects.create(name="Test Dish 3", price=12.00, description="Test Description 3", preparation_time=10, is_vegetarian=True)
+        menu.dishes.add(self.dish1, self.dish2, extra)
+        detail_url = reverse("menu-detail", kwargs={"pk": menu.id})
+        fields = {"fields": "id,name,dishes_count", "name__exact": "Test Menu 1"}
+        self.assertEqual(self.client.get(detail_url, fields).json()["dishes_count"], 3)
+        self.assertEqual(self.client.get(reverse("menu-list"), fields).json()["results"][0]["dishes_count"], 3)
+
+        response = self.client.delete(reverse("dish-detail", kwargs={"pk": self.dish1.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(detail_url, fields).json()["dishes_count"], 2)
+        self.assertEqual(self.client.get(reverse("menu-list"), fields).json()["results"][0]["dishes_count"], 2)
+
+        response = self.client.delete(reverse("dish-bulk"), {"ids": [self.dish2.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(detail_url, fields).json()["dishes_count"], 1)
+        self.assertEqual(self.client.get(reverse("menu-list"), fields).json()["results"][0]["dishes_count"], 1)
+
+    def test_list_menus_cursor_pagination(self):
+        Menu.objects.get(name="Test Menu 1").dishes.add(self.dish1, self.dish2)
+        response = self.client.get(reverse("menu-list"), {"pagination": "cursor", "ordering": "-dishes_count"})
+        menu_ids = [menu["id"] for menu in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            menu_ids += [menu["id"] for menu in response.data["results"]]
+
+        expected = Menu.objects.annotate(dishes_count=Count("dishes")).order_by("-dishes_count", "-id").values_list("id", flat=True)
+        self.assertEqual(menu_ids, list(expected))
+
+    def test_list_menus_tampered_cursor(self):
+        for ordering, value in [("name", None), ("-dishes_count", "garbage")]:
+            cursor = b64encode(json.dumps({"v": value, "id": 1}).encode()).decode()
+            response = self.client.get(reverse("menu-list"), {"pagination": "cursor", "ordering": ordering, "cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, (ordering, value))
+
     def tearDown(self):
-        caches["data"].clear()
+        MenuViewSet.cache.clear()
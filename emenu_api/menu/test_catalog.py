@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from dish.models import Dish
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Menu
+from .views import MenuViewSet
+
+
+def catalog_snapshot():
+    dishes = sorted(Dish.objects.values_list("name", "description", "price", "preparation_time", "is_vegetarian"))
+    menus = sorted((menu.name, menu.description, sorted(menu.dishes.values_list("name", flat=True))) for menu in Menu.objects.all())
+    return dishes, menus
+
+
+class CatalogTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.access_token}")
+
+        self.dish = Dish.objects.create(name="Pierogi, \"ruskie\"", price=10.50, description="Z serem\ni ziemniakami", preparation_time=15, is_vegetarian=True)
+        self.menu = Menu.objects.create(name="Test Menu 1", description="Test Description 1")
+        self.menu.dishes.add(self.dish)
+
+    def export(self, catalog_format):
+        response = self.client.get(reverse("catalog", kwargs={"catalog_format": catalog_format}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content)
+
+    def import_catalog(self, catalog_format, content):
+        content_type = "application/x-ndjson" if catalog_format == "ndjson" else "text/csv"
+        return self.client.post(reverse("catalog", kwargs={"catalog_format": catalog_format}), content, content_type=content_type)
+
+    def test_export_ndjson(self):
+        records = [json.loads(line) for line in self.export("ndjson").decode().splitlines()]
+        self.assertEqual(len([record for record in records if record["type"] == "dish"]), Dish.objects.count())
+        self.assertIn(
+            {"type": "dish", "name": self.dish.name, "description": self.dish.description, "price": "10.50", "preparation_time": 15, "is_vegetarian": True, "image": ""},
+            records,
+        )
+        self.assertIn({"type": "menu", "name": "Test Menu 1", "description": "Test Description 1", "dishes": [self.dish.name]}, records)
+        self.assertEqual(records[-1]["type"], "menu")
+
+    def test_round_trip(self):
+        for catalog_format in ["ndjson", "csv"]:
+            snapshot = catalog_snapshot()
+            content = self.export(catalog_format)
+            Menu.objects.all().delete()
+            Dish.objects.all().delete()
+
+            response = self.import_catalog(catalog_format, content)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["dishes_created"], len(snapshot[0]))
+            self.assertEqual(response.data["menus_created"], len(snapshot[1]))
+            self.assertEqual(catalog_snapshot(), snapshot)
+
+            response = self.import_catalog(catalog_format, content)
+            self.assertEqual((response.data["dishes_updated"], response.data["dishes_unchanged"]), (0, len(snapshot[0])))
+
+    def test_import_upserts(self):
+        self.client.get(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        records = [
+            {"type": "dish", "name": self.dish.name, "description": "Nowy opis", "price": "12.00", "preparation_time": 20, "is_vegetarian": True},
+            {"type": "dish", "name": "Barszcz", "description": "Czerwony", "price": "9.00", "preparation_time": 30, "is_vegetarian": True},
+            {"type": "menu", "name": "Test Menu 1", "description": "Nowe menu", "dishes": ["Barszcz", "Barszcz"]},
+            {"type": "menu", "name": "Menu Wigilijne", "description": "Na święta", "dishes": [self.dish.name, "Barszcz"]},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.import_catalog("ndjson", "\n".join(json.dumps(record) for record in records))
+        self.assertEqual(
+            response.data, {"dishes_created": 1, "dishes_updated": 1, "dishes_unchanged": 0, "menus_created": 1, "menus_updated": 1, "menu_dishes": 3}
+        )
+
+        self.dish.refresh_from_db()
+        self.assertEqual((self.dish.description, self.dish.price), ("Nowy opis", Decimal("12.00")))
+        self.assertEqual(list(Menu.objects.get(name="Menu Wigilijne").dishes.order_by("name").values_list("name", flat=True)), ["Barszcz", self.dish.name])
+
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        self.assertEqual(response.json()["description"], "Nowe menu")
+        self.assertEqual([dish["name"] for dish in response.json()["dishes"]], ["Barszcz"])
+
+    def test_import_errors_roll_back(self):
+        content = "\n".join(
+            [
+                json.dumps({"type": "dish", "name": "Barszcz", "description": "Czerwony", "price": "9.00", "preparation_time": 30}),
+                "",
+                json.dumps({"type": "menu", "name": "Menu Wigilijne", "description": "Na święta", "dishes": ["Barszcz", "Karp"]}),
+            ]
+        )
+        response = self.import_catalog("ndjson", content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"line": 3, "errors": {"dishes": ["Unknown dish: Karp"]}})
+        self.assertFalse(Dish.objects.filter(name="Barszcz").exists())
+
+        response = self.import_catalog("csv", "type,name,description,price,preparation_time\ndish,Barszcz,Czerwony,tanio,30\n")
+        self.assertEqual(response.data["line"], 2)
+        self.assertEqual(list(response.data["errors"]), ["price"])
+
+        response = self.import_catalog("ndjson", '{"type": "drink"}\n{not json')
+        self.assertEqual(response.data, {"line": 1, "errors": {"type": ["Expected dish or menu."]}})
+
+    def test_catalog_commands(self):
+        snapshot = catalog_snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.csv")
+            call_command("export_catalog", path, chunk_size=2)
+            Menu.objects.all().delete()
+            Dish.objects.filter(pk=self.dish.id).delete()
+
+            call_command("import_catalog", path, chunk_size=2, stdout=open(os.devnull, "w"))
+            self.assertEqual(catalog_snapshot(), snapshot)
+
+            with open(path, "a", encoding="utf-8") as catalog:
+                catalog.write("menu,Broken Menu,Opis,,,,,Karp\n")
+            with self.assertRaisesMessage(CommandError, "Unknown dish: Karp"):
+                call_command("import_catalog", path)
+
+    def test_catalog_unauthorized(self):
+        self.client.credentials()
+        response = self.client.get(reverse("catalog", kwargs={"catalog_format": "csv"}))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.import_catalog("ndjson", "")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def tearDown(self):
+        MenuViewSet.cache.clear()
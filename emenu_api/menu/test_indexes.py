@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.db.models.functions import Now
+from emenu_api.testing import ExplainTestCase
+
+from .filters import MenuFilter
+from .models import Menu
+
+MENUS = 10000
+
+
+class MenuIndexTestCase(ExplainTestCase):
+    analyze = [Menu._meta.db_table]
+
+    @classmethod
+    def setUpTestData(cls):
+        Menu.objects.bulk_create(
+            (Menu(name=f"Menu Wegetarianskie {i}" if i % 200 == 0 else f"Menu {i}", description="Opis menu") for i in range(MENUS)), batch_size=5000
+        )
+        Menu.objects.update(
+            created_at=ExpressionWrapper(Now() - F("id") * timedelta(minutes=1), output_field=DateTimeField()),
+            updated_at=ExpressionWrapper(Now() - ((F("id") * 7919) % MENUS) * timedelta(minutes=1), output_field=DateTimeField()),
+        )
+        super().setUpTestData()
+
+    def filtered(self, **params):
+        return MenuFilter(params, queryset=Menu.objects.order_by("-updated_at")).qs
+
+    def test_default_ordering(self):
+        self.assertUsesIndex(Menu.objects.order_by("-updated_at", "-id")[:10], "menu_updated_at_id_idx")
+
+    def test_filter_by_name(self):
+        self.assertUsesIndex(self.filtered(name="wegetarian"), "menu_name_trgm_idx")
+
+    def test_filter_by_name_exact(self):
+        self.assertNoSeqScan(self.filtered(name__exact="Menu 201"), Menu._meta.db_table)
+
+    def test_filter_by_created_at(self):
+        oldest = Menu.objects.order_by("created_at").values_list("created_at", flat=True)[50]
+        self.assertUsesIndex(self.filtered(created_at__lte=oldest), "menu_created_at_idx")
+        self.assertUsesIndex(self.filtered(created_at__exact=oldest), "menu_created_at_idx")
+
+    def test_filter_by_updated_at(self):
+        newest = Menu.objects.order_by("-updated_at").values_list("updated_at", flat=True)[50]
+        self.assertUsesIndex(self.filtered(updated_at__gte=newest), "menu_updated_at_id_idx")
+        self.assertUsesIndex(self.filtered(updated_at__exact=newest), "menu_updated_at_id_idx")
@@ -1,11 +1,21 @@
+import hashlib
+import json
+from unittest.mock import patch
+
 from dish.models import Dish
+from django.conf import settings
 from django.core.cache import caches
 from django.db.models import Count
+from django.test import override_settings
 from django.urls import reverse
+from emenu_api.cache import MENU_LIST, dish_tag, menu_tag, response_to_entry
+from emenu_api.tasks import refresh_cached_response
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from .models import Menu
+from .utils import menu_cache_tags
+from .views import MenuViewSet
 
 
 class UnauthenticatedMenuTestCase(APITestCase):
@@ -38,6 +48,185 @@ class UnauthenticatedMenuTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], menu.name)
 
+    def test_get_single_menu_cached_bytes(self):
+        first = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}))
+        second = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}))
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second["Content-Type"], "application/json")
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "RENDERED_RESPONSES": True, "COMPRESS_MIN_SIZE": 0})
+    def test_list_menus_cached_compressed_bytes(self):
+        first = self.client.get(reverse("menu-list"))
+        second = self.client.get(reverse("menu-list"))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.json()["count"], first.data["count"])
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "RENDERED_RESPONSES": False})
+    def test_list_menus_cached_data(self):
+        first = self.client.get(reverse("menu-list"))
+        second = self.client.get(reverse("menu-list"))
+        self.assertEqual(second.data, first.data)
+
+    def test_get_single_menu_serves_stale_while_locked(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        MenuViewSet.cache.invalidate(menu_tag(self.menu1.id))
+
+        cache_key = f"menu_detail_anon_{self.menu1.id}"
+        MenuViewSet.cache.acquire_lock(cache_key, 10)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["name"], "Test Menu 1")
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "MAX_STALENESS": {}, "LOCK_WAIT": 0.1})
+    def test_get_single_menu_too_stale_while_locked(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        MenuViewSet.cache.invalidate(menu_tag(self.menu1.id))
+
+        # the worker holding the lock does not answer in time, the request builds the menu itself
+        MenuViewSet.cache.acquire_lock(f"menu_detail_anon_{self.menu1.id}", 10)
+        response = self.client.get(url)
+        self.assertEqual(response.data["name"], "Renamed Menu")
+
+    def test_get_single_menu_stale_while_revalidate(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        MenuViewSet.cache.invalidate(menu_tag(self.menu1.id))
+
+        with patch("emenu_api.cache.refresh_cached_response.delay") as delay:
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.json()["name"], "Test Menu 1")
+            self.client.get(url)
+        delay.assert_called_once()
+
+        refresh_cached_response(*delay.call_args.args)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["name"], "Renamed Menu")
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "MAX_STALENESS": {"menu_detail": 0}})
+    def test_get_single_menu_too_stale(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        MenuViewSet.cache.invalidate(menu_tag(self.menu1.id))
+
+        with patch("emenu_api.cache.refresh_cached_response.delay") as delay:
+            response = self.client.get(url)
+        delay.assert_not_called()
+        self.assertEqual(response.data["name"], "Renamed Menu")
+
+    def test_list_menus_stale_while_revalidate(self):
+        self.client.get(reverse("menu-list"), {"name": "Test Menu"})
+        self.menu2.dishes.add(self.dish1)
+        MenuViewSet.cache.bump_generation(MENU_LIST)
+
+        with patch("emenu_api.cache.refresh_cached_response.delay") as delay:
+            response = self.client.get(reverse("menu-list"), {"name": "Test Menu"})
+        self.assertNotIn("Test Menu 2", [menu["name"] for menu in response.json()["results"]])
+
+        refresh_cached_response(*delay.call_args.args)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("menu-list"), {"name": "Test Menu"})
+        self.assertIn("Test Menu 2", [menu["name"] for menu in response.json()["results"]])
+
+    def test_get_single_menu_from_local_cache(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        first = self.client.get(url)
+        caches["data"].delete(f"menu_detail_anon_{self.menu1.id}")
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+    def test_local_cache_evicted_by_invalidation_message(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        cache_key = f"menu_detail_anon_{self.menu1.id}"
+        self.assertIsNotNone(MenuViewSet.cache.local.get(cache_key))
+
+        MenuViewSet.cache._on_invalidation({"data": json.dumps([dish_tag(self.dish2.id)])})
+        self.assertIsNone(MenuViewSet.cache.local.get(cache_key))
+
+    def test_invalidation_while_building_leaves_entry_stale(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        cache_key = f"menu_detail_anon_{self.menu1.id}"
+        # the menu tag is known before the menu is read, the dish tags only from the serialized dishes
+        for tag in [menu_tag(self.menu1.id), dish_tag(self.dish2.id)]:
+            MenuViewSet.cache.clear()
+
+            def write_while_building(*args, tag=tag):
+                MenuViewSet.cache.invalidate(tag)
+                return response_to_entry(*args)
+
+            with patch("emenu_api.cache.response_to_entry", write_while_building):
+                self.client.get(url)
+            self.assertFalse(MenuViewSet.cache.get_entry(cache_key)["fresh"], tag)
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "LOCAL_MAX_BYTES": 4096})
+    def test_local_cache_size_bound(self):
+        for i in range(10):
+            MenuViewSet.cache.local.set(f"key_{i}", b"x" * 1000, [], size=1000)
+        self.assertEqual(MenuViewSet.cache.local.size, 4000)
+        self.assertIsNone(MenuViewSet.cache.local.get("key_0"))
+        self.assertIsNotNone(MenuViewSet.cache.local.get("key_9"))
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "LOCK_WAIT": 0.1})
+    def test_get_single_menu_rebuilds_after_lock_wait(self):
+        cache_key = f"menu_detail_anon_{self.menu1.id}"
+        MenuViewSet.cache.acquire_lock(cache_key, 10)
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["name"], "Test Menu 1")
+
+    def test_list_menus_serves_previous_generation_while_locked(self):
+        self.client.get(reverse("menu-list"))
+        MenuViewSet.cache.bump_generation(MENU_LIST)
+
+        cache_key = MenuViewSet.cache.generation_keys(MENU_LIST, f"menu_list_anon_{hashlib.sha256(b'').hexdigest()[:32]}")[0]
+        MenuViewSet.cache.acquire_lock(cache_key, 10)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("menu-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(DATA_CACHE={**settings.DATA_CACHE, "XFETCH_BETA": 10**9})
+    def test_get_single_menu_refreshes_early(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        response = self.client.get(url)
+        self.assertEqual(response.data["name"], "Renamed Menu")
+
+    def test_get_single_menu_not_modified(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        response = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        MenuViewSet.cache.clear()
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_single_menu_modified_by_dish_delete(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id})
+        response = self.client.get(url)
+        self.dish2.delete()
+        MenuViewSet.cache.clear()
+
+        modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(modified.data["dishes"]), 1)
+
     def test_filter_menus_by_name(self):
         response = self.client.get(reverse("menu-list"), {"name__exact": "Test Menu 1"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -76,6 +265,14 @@ class UnauthenticatedMenuTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["count"], filtered_count)
 
+    def test_list_menus_cache_key_normalizes_datetimes(self):
+        self.client.get(reverse("menu-list"), {"created_at__gte": "2023-01-01T00:00:00Z", "ordering": "-name"})
+        hits = MenuViewSet.cache.get_stats(MENU_LIST)["hits"]
+
+        response = self.client.get(reverse("menu-list"), {"ordering": "-name,unknown", "created_at__gte": "2023-01-01T01:00:00+01:00"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(MenuViewSet.cache.get_stats(MENU_LIST)["hits"], hits + 1)
+
     def test_create_menu_with_dishes(self):
         data = {"name": "New Menu with Dishes", "description": "New Description", "dish_ids": [self.dish1.id, self.dish2.id]}
         response = self.client.post(reverse("menu-list"), data)
@@ -115,5 +312,69 @@ class UnauthenticatedMenuTestCase(APITestCase):
         response = self.client.patch(reverse("menu-detail", kwargs={"pk": menu.id}), data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_search_menus(self):
+        self.menu2.description = "Dania wegetariańskie"
+        self.menu2.save()
+        self.menu1.description = "Dania wegetariańskie i rybne"
+        self.menu1.save()
+
+        response = self.client.get(reverse("menu-search"), {"q": "wegetarianskie"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([menu["id"] for menu in response.data["results"]], [self.menu1.id])
+
+    def test_list_menus_fields(self):
+        response = self.client.get(reverse("menu-list"), {"fields": "id,name,dishes_count,unknown"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(set(menu) == {"id", "name", "dishes_count"} for menu in response.data["results"]))
+        self.assertIn({"id": self.menu1.id, "name": self.menu1.name, "dishes_count": 2}, response.data["results"])
+
+        # only unknown names read the full menus, from the same cache entry
+        full = self.client.get(reverse("menu-list"))
+        response = self.client.get(reverse("menu-list"), {"fields": "unknown"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, full.content)
+
+    def test_get_single_menu_omit(self):
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}), {"omit": "dishes,description"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("dishes", response.data)
+        self.assertNotIn("description", response.data)
+        self.assertEqual(response.data["dishes_count"], 2)
+
+    def test_get_single_menu_collapsed_dishes(self):
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}), {"expand": ""})
+        self.assertEqual(sorted(response.data["dishes"]), [self.dish1.id, self.dish2.id])
+
+        response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}), {"expand": "dishes"})
+        self.assertEqual(sorted(dish["name"] for dish in response.data["dishes"]), [self.dish1.name, self.dish2.name])
+
+    def test_projections_cached_separately(self):
+        full = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}))
+        pruned = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id}), {"fields": "name"})
+        self.assertEqual(pruned.data, {"name": self.menu1.name})
+        self.assertNotEqual(pruned["ETag"], full["ETag"])
+        self.assertIn("dishes", json.loads(self.client.get(reverse("menu-detail", kwargs={"pk": self.menu1.id})).content))
+
+        self.client.get(reverse("menu-list"))
+        pruned = self.client.get(reverse("menu-list"), {"fields": "name"})
+        self.assertTrue(all(set(menu) == {"name"} for menu in json.loads(pruned.content)["results"]))
+
+    def test_pruned_menu_refreshed_after_update(self):
+        url = reverse("menu-detail", kwargs={"pk": self.menu1.id}) + "?fields=name"
+        self.client.get(url)
+        Menu.objects.filter(pk=self.menu1.id).update(name="Renamed Menu")
+        MenuViewSet.cache.invalidate(menu_tag(self.menu1.id))
+
+        with patch("emenu_api.cache.refresh_cached_response.delay") as delay:
+            self.assertEqual(self.client.get(url).json(), {"name": "Test Menu 1"})
+        refresh_cached_response(*delay.call_args.args)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {"name": "Renamed Menu"})
+
+    def test_pruned_menu_cache_tags(self):
+        self.assertEqual(menu_cache_tags({"name": "Menu"}, menu_id=1), [menu_tag(1)])
+        self.assertEqual(menu_cache_tags({"id": 1, "dishes": [2, 3]}), [menu_tag(1), dish_tag(2), dish_tag(3)])
+
     def tearDown(self):
-        caches["data"].clear()
+        MenuViewSet.cache.clear()
@@ -0,0 +1,131 @@
+from dish.models import Dish
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Menu
+from .views import MenuViewSet
+
+
+class MenuQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user)
+
+        self.dish1 = Dish.objects.create(name="Test Dish 1", price=10.50, description="Test Description 1", preparation_time=15, is_vegetarian=True)
+        self.dish2 = Dish.objects.create(name="Test Dish 2", price=15.00, description="Test Description 2", preparation_time=20, is_vegetarian=False)
+
+        self.menu = Menu.objects.create(name="Test Menu 1", description="Test Description 1")
+        self.menu.dishes.add(self.dish1, self.dish2)
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.access_token}")
+
+    def test_list_menus_anonymous(self):
+        # version, count, page, prefetched dishes
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("menu-list"), {"ordering": "dishes_count"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for menu in response.data["results"]:
+            self.assertEqual(menu["dishes_count"], len(menu["dishes"]))
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("menu-list"), {"ordering": "dishes_count"})
+
+    def test_list_menus_authenticated(self):
+        self.authenticate()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("menu-list"), {"ordering": "-dishes_count"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = [menu["dishes_count"] for menu in response.data["results"]]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse("menu-list"), {"ordering": "-dishes_count"})
+
+    def test_list_menus_does_not_grow_with_menus(self):
+        Menu.objects.all().delete()
+        with self.assertNumQueries(2):
+            self.client.get(reverse("menu-list"))
+
+        for i in range(5):
+            menu = Menu.objects.create(name=f"Extra Menu {i}", description="Extra Description")
+            menu.dishes.add(self.dish1, self.dish2)
+        MenuViewSet.cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("menu-list"))
+        self.assertEqual([menu["dishes_count"] for menu in response.data["results"]], [2] * 5)
+
+    def test_list_menus_without_dishes(self):
+        # version, count, page and no dish prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("menu-list"), {"fields": "id,name,dishes_count"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "dishes_count"})
+
+    def test_get_single_menu_anonymous(self):
+        # version, menu, prefetched dishes
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        self.assertEqual(response.data["dishes_count"], 2)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+
+    def test_get_single_menu_authenticated(self):
+        self.authenticate()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        self.assertEqual(response.data["dishes_count"], 2)
+
+    def test_create_menu(self):
+        self.authenticate()
+        data = {"name": "New Menu", "description": "New Description", "dish_ids": [self.dish1.id, self.dish2.id]}
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse("menu-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["dishes_count"], 2)
+
+    def test_update_menu(self):
+        self.authenticate()
+        data = {"name": "Updated Menu", "description": "Updated Description", "dish_ids": [self.dish1.id]}
+        with self.assertNumQueries(9):
+            response = self.client.put(reverse("menu-detail", kwargs={"pk": self.menu.id}), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["dishes_count"], 1)
+
+    def test_update_menu_dishes_does_not_grow_with_dishes(self):
+        self.authenticate()
+        dishes = Dish.objects.bulk_create(
+            [Dish(name=f"Extra Dish {i}", price=10, description="Extra Description", preparation_time=10, is_vegetarian=False) for i in range(50)]
+        )
+        # user, menu, prefetched dishes, dish ids, current dishes, delete, insert, update, rendered dishes
+        with self.assertNumQueries(9):
+            response = self.client.patch(reverse("menu-detail", kwargs={"pk": self.menu.id}), {"dish_ids": [dish.id for dish in dishes]})
+        self.assertEqual(response.data["dishes_count"], 50)
+
+        # the same with one more query to check the ids to remove, only the changed rows are written
+        with self.assertNumQueries(10):
+            response = self.client.patch(
+                reverse("menu-detail", kwargs={"pk": self.menu.id}),
+                {"dish_ids_add": [self.dish1.id, self.dish2.id], "dish_ids_remove": [dish.id for dish in dishes[:25]]},
+            )
+        self.assertEqual(response.data["dishes_count"], 27)
+
+    def test_partial_update_menu(self):
+        self.authenticate()
+        with self.assertNumQueries(5):
+            response = self.client.patch(reverse("menu-detail", kwargs={"pk": self.menu.id}), {"description": "Updated Description"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["dishes_count"], 2)
+
+    def test_delete_menu(self):
+        self.authenticate()
+        with self.assertNumQueries(5):
+            response = self.client.delete(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def tearDown(self):
+        MenuViewSet.cache.clear()
@@ -0,0 +1,59 @@
+from dish.models import Dish
+from django.contrib.auth.models import User
+from django.urls import reverse
+from emenu_api.testing import ValuesParityMixin
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Menu
+from .views import MenuViewSet
+
+
+class MenuValuesParityTestCase(ValuesParityMixin, APITestCase):
+    viewset = MenuViewSet
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password123")
+        self.token = RefreshToken.for_user(self.user)
+
+        dishes = Dish.objects.bulk_create(
+            Dish(name=f"Dish {i}", description="Opis", price=f"{10 + i}.{i % 10}0", preparation_time=15, is_vegetarian=i % 2 == 0) for i in range(30)
+        )
+        self.menu = Menu.objects.create(name="Large Menu", description="Menu with many dishes")
+        self.menu.dishes.set(dishes)
+        self.empty_menu = Menu.objects.create(name="Empty Menu", description="Menu without dishes")
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token.access_token}")
+
+    def test_list_menus(self):
+        self.assertSameResponse(reverse("menu-list"))
+        self.assertSameResponse(reverse("menu-list"), {"ordering": "-dishes_count", "page": 2})
+        self.assertSameResponse(reverse("menu-list"), {"name": "menu", "is_vegetarian": True})
+
+        self.authenticate()
+        self.assertSameResponse(reverse("menu-list"))
+        self.assertSameResponse(reverse("menu-list"), {"ordering": "name"})
+
+    def test_list_menus_projections(self):
+        self.assertSameResponse(reverse("menu-list"), {"fields": "id,name,dishes_count"})
+        self.assertSameResponse(reverse("menu-list"), {"omit": "dishes"})
+        self.assertSameResponse(reverse("menu-list"), {"expand": ""})
+
+    def test_list_menus_cursor_pages(self):
+        response = self.assertSameResponse(reverse("menu-list"), {"pagination": "cursor", "ordering": "dishes_count"})
+        while response.data["next"]:
+            response = self.assertSameResponse(response.data["next"])
+
+    def test_get_single_menu(self):
+        response = self.assertSameResponse(reverse("menu-detail", kwargs={"pk": self.menu.id}))
+        self.assertEqual(len(response.data["dishes"]), 30)
+        self.assertSameResponse(reverse("menu-detail", kwargs={"pk": self.menu.id}), {"expand": "", "fields": "dishes,updated_at"})
+
+        self.authenticate()
+        self.assertSameResponse(reverse("menu-detail", kwargs={"pk": self.empty_menu.id}))
+
+    def test_get_missing_menu(self):
+        response = self.assertSameResponse(reverse("menu-detail", kwargs={"pk": self.empty_menu.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
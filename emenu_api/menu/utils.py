@@ -1,2 +1,21 @@
+from emenu_api.cache import MENU_LIST, dish_tag, menu_tag
+
+
 def dishes_count(menu):
+    # MenuViewSet annotates the count, prefetched dishes are the next best thing before asking the database
+    if hasattr(menu, "dishes_count"):
+        return menu.dishes_count
+    if "dishes" in getattr(menu, "_prefetched_objects_cache", {}):
+        return len(menu._prefetched_objects_cache["dishes"])
     return menu.dishes.count()
+
+
+def menu_cache_tags(menu_data, menu_id=None):
+    # a projection may leave out the id or the dishes, or collapse the dishes to their ids
+    menu_id = menu_data.get("id", menu_id)
+    dish_ids = [dish["id"] if isinstance(dish, dict) else dish for dish in menu_data.get("dishes", [])]
+    return ([menu_tag(menu_id)] if menu_id is not None else []) + [dish_tag(dish_id) for dish_id in dish_ids]
+
+
+def menu_list_cache_tags(menu_list_data):
+    return [MENU_LIST] + [tag for menu_data in menu_list_data["results"] for tag in menu_cache_tags(menu_data)]
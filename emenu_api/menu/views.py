@@ -1,72 +1,86 @@
+from functools import partial
+
 from dish.models import Dish
-from django.core.cache import caches
-from django.db import transaction
-from django.db.models import Count, Prefetch
+from django.db.models import Count, Max, Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
+from emenu_api.cache import MENU_DETAIL, MENU_LIST, CachedViewMixin, canonical_query, menu_tag, projection_suffix, version_etag
+from emenu_api.pagination import OptionalKeysetPagination
+from emenu_api.search import SearchViewMixin
+from emenu_api.serializers import Projection
+from emenu_api.values import ValuesReadMixin
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.response import Response
 
 from .filters import MenuFilter
 from .models import Menu
-from .serializers import MenuSerializer
+from .serializers import MenuSerializer, MenuValuesSerializer
+from .utils import menu_cache_tags, menu_list_cache_tags
 
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(CachedViewMixin, SearchViewMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = MenuSerializer
+    values_serializer_class = MenuValuesSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = MenuFilter
     ordering_fields = ["name", "dishes_count"]
-    cache = caches["data"]
+    pagination_class = OptionalKeysetPagination
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "search"]:
             return [permissions.AllowAny()]
         return [permissions.IsAuthenticated()]
 
     def get_queryset(self):
-        dishes_prefetch = Prefetch("dishes", queryset=Dish.objects.all())
-        queryset = Menu.objects.prefetch_related(dishes_prefetch)
+        queryset = Menu.objects.defer("search_vector").annotate(dishes_count=Count("dishes"))
+        projection = Projection.from_request(self.request, self.get_serializer_class())
+        if projection.expands("dishes"):
+            queryset = queryset.prefetch_related(Prefetch("dishes", queryset=Dish.objects.defer("search_vector")))
+        elif projection.includes("dishes"):
+            queryset = queryset.prefetch_related(Prefetch("dishes", queryset=Dish.objects.only("id")))
         if not self.request.user.is_authenticated:
-            queryset = queryset.annotate(dishes_count=Count("dishes")).filter(dishes_count__gt=0)
+            queryset = queryset.filter(dishes_count__gt=0)
         return queryset.order_by("-updated_at")
 
     def clear_cache(self, menu_id):
-        menu_detail_key_auth = f"menu_detail_auth_{menu_id}"
-        menu_detail_key_non_auth = f"menu_detail_anon_{menu_id}"
-        with transaction.atomic():
-            self.cache.delete_pattern("menu_list_*")
-
-            detail_to_delete = self.cache.get(menu_detail_key_auth)
-            if detail_to_delete:
-                self.cache.delete(menu_detail_key_auth)
-
-            detail_to_delete = self.cache.get(menu_detail_key_non_auth)
-            if detail_to_delete:
-                self.cache.delete(menu_detail_key_non_auth)
+        self.cache.bump_generation(MENU_LIST)
+        self.cache.invalidate(menu_tag(menu_id))
 
     def get_cache_key(self, request, *args, **kwargs):
         is_authenticated = "auth" if request.user.is_authenticated else "anon"
-        return f"menu_list_{is_authenticated}_{request.query_params}"
+        return f"menu_list_{is_authenticated}_{canonical_query(self, request)}"
+
+    def get_list_version(self, cache_key):
+        version = self.filter_queryset(self.get_queryset()).aggregate(
+            last_modified=Max("updated_at"), dishes_modified=Max("dishes__updated_at"), count=Count("id", distinct=True), dishes=Count("dishes")
+        )
+        return version_etag(cache_key, *version.values()), None
+
+    def get_detail_version(self, cache_key, pk):
+        if not str(pk).isdigit():
+            return None, None
+        version = Menu.objects.filter(pk=pk).aggregate(updated_at=Max("updated_at"), dishes_modified=Max("dishes__updated_at"), dishes=Count("dishes"))
+        if version["updated_at"] is None:
+            return None, None
+        last_modified = max(filter(None, [version["updated_at"], version["dishes_modified"]]))
+        return version_etag(cache_key, *version.values()), last_modified
+
+    def get_detail_cache_key(self, request, pk):
+        is_authenticated = "auth" if request.user.is_authenticated else "anon"
+        return f"menu_detail_{is_authenticated}_{pk}{projection_suffix(self, request)}"
 
     def list(self, request, *args, **kwargs):
         cache_key = self.get_cache_key(request, *args, **kwargs)
-        cache_menus = self.cache.get(cache_key)
-
-        if not cache_menus:
-            response = super().list(request, *args, **kwargs)
-            self.cache.set(cache_key, response.data)
-            return response
-        return Response(cache_menus)
+        cache_keys = self.cache.generation_keys(MENU_LIST, cache_key)
+        get_response = partial(super().list, request, *args, **kwargs)
+        get_version = partial(self.get_list_version, cache_key)
+        return self.cached_response(request, MENU_LIST, cache_keys, get_response, [MENU_LIST], get_version, menu_list_cache_tags)
 
     def retrieve(self, request, *args, **kwargs):
-        is_authenticated = "auth" if request.user.is_authenticated else "anon"
-        cache_key = f'menu_detail_{is_authenticated}_{kwargs["pk"]}'
-        cache_menu = self.cache.get(cache_key)
-        if not cache_menu:
-            response = super().retrieve(request, *args, **kwargs)
-            self.cache.set(cache_key, response.data)
-            return response
-        return Response(cache_menu)
+        cache_key = self.get_detail_cache_key(request, kwargs["pk"])
+        get_response = partial(super().retrieve, request, *args, **kwargs)
+        get_version = partial(self.get_detail_version, cache_key, kwargs["pk"])
+        get_tags = partial(menu_cache_tags, menu_id=kwargs["pk"])
+        return self.cached_response(request, MENU_DETAIL, [cache_key], get_response, [menu_tag(kwargs["pk"])], get_version, get_tags)
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -83,7 +97,8 @@ class MenuViewSet(viewsets.ModelViewSet):
         instance_id = instance.id
 
         try:
-            response = super().destroy(request, *args, **kwargs)
+            self.perform_destroy(instance)
+            response = Response(status=status.HTTP_204_NO_CONTENT)
         except Exception:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 